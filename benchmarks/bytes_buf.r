@@ -0,0 +1,34 @@
+import time
+import irods_types
+
+def timed(function, repetitions):
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        function()
+    return (time.perf_counter() - start) / repetitions
+
+def main(rule_args, callback, rei):
+    size = int(irods_rule_vars['*Size'][1:-1])
+    repetitions = int(irods_rule_vars['*Repetitions'][1:-1])
+
+    data = bytes(size)
+    octets = list(data)
+    buf = irods_types.BytesBuf()
+    buf.set_buffer(data)
+
+    results = [
+        ('set_buffer(list)', timed(lambda: buf.set_buffer(octets), repetitions)),
+        ('set_buffer(bytes)', timed(lambda: buf.set_buffer(data), repetitions)),
+        ('BorrowedBytesBuf(bytes)', timed(lambda: irods_types.BorrowedBytesBuf(data), repetitions)),
+        ('get_bytes()', timed(lambda: buf.get_bytes(), repetitions)),
+        ('bytes(buf)', timed(lambda: bytes(buf), repetitions)),
+        ('memoryview(buf)', timed(lambda: memoryview(buf).release(), repetitions)),
+    ]
+    buf.clear_buffer()
+
+    callback.writeLine('stdout', 'size (bytes):               {}'.format(size))
+    for label, seconds in results:
+        callback.writeLine('stdout', '{:<28}{:.1f}'.format(label + ' (MiB/s):', size / seconds / (1 << 20)))
+
+INPUT *Size="33554432", *Repetitions="3"
+OUTPUT ruleExecOut
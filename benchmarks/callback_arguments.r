@@ -0,0 +1,28 @@
+import time
+import irods_types
+
+def main(rule_args, callback, rei):
+    rule_name = irods_rule_vars['*RuleName'][1:-1]
+    iterations = int(irods_rule_vars['*Iterations'][1:-1])
+    rule = getattr(callback, rule_name)
+
+    # Each argument which is not a str is marshalled into an msParam_t by RuleCallWrapper::call, and
+    # converted back into a Python object when the call returns.
+    argument_sets = [
+        ('str', ('a', 'b', 'c')),
+        ('int', (1, 2, 3)),
+        ('float', (1.5, 2.5, 3.5)),
+        ('KeyValPair', (irods_types.KeyValPair(), irods_types.KeyValPair(), irods_types.KeyValPair())),
+        ('mixed', ('a', 1, 2.5)),
+    ]
+
+    callback.writeLine('stdout', 'iterations:                 {}'.format(iterations))
+    for label, arguments in argument_sets:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            rule(*arguments)
+        seconds = time.perf_counter() - start
+        callback.writeLine('stdout', '{:<28}{:.2f}'.format(label + ' arguments (us):', seconds / iterations * 1e6))
+
+INPUT *RuleName="python_rule_engine_benchmark_noop", *Iterations="10000"
+OUTPUT ruleExecOut
@@ -0,0 +1,28 @@
+import time
+import irods_types
+from callback_batch import Batch
+
+def main(rule_args, callback, rei):
+    calls = int(irods_rule_vars['*Calls'][1:-1])
+
+    # One call into the plugin per microservice call, as a rule setting many AVUs would make.
+    kvp = irods_types.KeyValPair()
+    start = time.perf_counter()
+    for i in range(calls):
+        callback.msiAddKeyVal(kvp, 'key_{}'.format(i), 'value')
+    loop_seconds = time.perf_counter() - start
+
+    # The same calls, made through a single call into the plugin.
+    kvp = irods_types.KeyValPair()
+    start = time.perf_counter()
+    with Batch(callback) as batch:
+        for i in range(calls):
+            batch.msiAddKeyVal(kvp, 'key_{}'.format(i), 'value')
+    batch_seconds = time.perf_counter() - start
+
+    callback.writeLine('stdout', 'calls:                      {}'.format(calls))
+    callback.writeLine('stdout', 'callback loop (us/call):    {:.2f}'.format(loop_seconds / calls * 1e6))
+    callback.writeLine('stdout', 'Batch (us/call):            {:.2f}'.format(batch_seconds / calls * 1e6))
+
+INPUT *Calls="1000"
+OUTPUT ruleExecOut
@@ -0,0 +1,23 @@
+#!/bin/sh
+# Times connections which each run a single Python rule. Every irule connects anew, so each
+# run pays for starting an agent, starting the plugin in it, and the agent's first Python rule.
+#
+#   sh benchmarks/first_request.sh [runs]
+set -e
+
+runs=${1:-20}
+instance=irods_rule_engine_plugin-irods_rule_language-instance
+
+for i in $(seq "$runs"); do
+    start=$(date +%s%N)
+    irule -r "$instance" 'python_rule_engine_benchmark_noop()' null null
+    end=$(date +%s%N)
+    echo $(( (end - start) / 1000 ))
+done | awk '
+    { total += $1; if (NR == 1 || $1 < min) min = $1; if ($1 > max) max = $1 }
+    END {
+        printf "runs:                       %d\n", NR
+        printf "mean (ms):                  %.2f\n", total / NR / 1000
+        printf "min (ms):                   %.2f\n", min / 1000
+        printf "max (ms):                   %.2f\n", max / 1000
+    }'
@@ -0,0 +1,48 @@
+import time
+import irods_types
+from genquery import Query, AS_COLUMNS, Parser
+
+def scan(callback, columns, conditions, read_page):
+    gqi = callback.msiMakeGenQuery(columns, conditions, irods_types.GenQueryInp())['arguments'][2]
+    gqo = callback.msiExecGenQuery(gqi, irods_types.GenQueryOut())['arguments'][1]
+    rows = 0
+    while True:
+        rows += read_page(gqo)
+        if gqo.continueInx <= 0:
+            return rows
+        ret = callback.msiGetMoreRows(gqi, gqo, 0)
+        gqo = ret['arguments'][1]
+
+def read_cells(gqo):
+    # One call into the plugin per cell, as Query did before GenQueryOut.rows() existed.
+    column_count = gqo.attriCnt
+    for r in range(gqo.rowCnt):
+        row = [gqo.sqlResult[c].row(r) for c in range(column_count)]
+    return gqo.rowCnt
+
+def read_rows(gqo):
+    return len(gqo.rows())
+
+def read_columns(gqo):
+    return len(gqo.columns()[0]) if gqo.rowCnt > 0 else 0
+
+def timed(callback, label, function):
+    start = time.perf_counter()
+    rows = function()
+    seconds = time.perf_counter() - start
+    rate = rows / seconds if seconds > 0 else 0
+    callback.writeLine('stdout', '{:<28}{:>10} rows {:>10.3f} s {:>12.0f} rows/s'.format(label, rows, seconds, rate))
+
+def main(rule_args, callback, rei):
+    columns = irods_rule_vars['*Columns'][1:-1]
+    conditions = irods_rule_vars['*Conditions'][1:-1]
+
+    timed(callback, 'per cell (sqlResult.row)', lambda: scan(callback, columns, conditions, read_cells))
+    timed(callback, 'per page (rows())', lambda: scan(callback, columns, conditions, read_rows))
+    timed(callback, 'per page (columns())', lambda: scan(callback, columns, conditions, read_columns))
+    timed(callback, 'Query, AS_TUPLE', lambda: sum(1 for _ in Query(callback, columns, conditions)))
+    timed(callback, 'Query, AS_COLUMNS', lambda: sum(len(page[0]) for page in Query(callback, columns, conditions, output=AS_COLUMNS)))
+    timed(callback, 'Query, GenQuery2', lambda: sum(1 for _ in Query(callback, columns, conditions, parser=Parser.GENQUERY2)))
+
+INPUT *Columns="COLL_NAME, DATA_NAME, DATA_SIZE, DATA_OWNER_NAME", *Conditions=""
+OUTPUT ruleExecOut
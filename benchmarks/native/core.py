@@ -0,0 +1,9 @@
+# Rulebase loaded by the benchmark host in place of /etc/irods/core.py.
+
+
+def python_rule_engine_benchmark_noop(rule_args, callback, rei):
+    pass
+
+
+def python_rule_engine_benchmark_echo(rule_args, callback, rei):
+    rule_args[1] = rule_args[0]
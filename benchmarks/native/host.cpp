@@ -0,0 +1,273 @@
+// Benchmark host for the Python rule engine plugin.
+//
+// Loads the plugin the way the server does, starts it on a rulebase of its own (benchmarks/native/core.py),
+// and times rule_exists, exec_rule and exec_rule_expression round trips through the plugin's operations,
+// without a catalog or a running server. The callback handed to the plugin is backed by a rule engine
+// context manager with no other rule engines, so calls made by the rules through it only reach the
+// microservice table (and "unsafe_ms_ctx", which returns the host's rei).
+//
+//     irods_rule_engine_plugin-python-benchmark-host [--iterations N] [--repeat N] [--json] [NAME ...]
+
+#include <irods/irods_error.hpp>
+#include <irods/irods_re_plugin.hpp>
+#include <irods/irods_re_structs.hpp>
+#include <irods/irods_server_properties.hpp>
+#include <irods/msParam.h>
+#include <irods/rodsErrorTable.h>
+
+#include <boost/any.hpp>
+#include <nlohmann/json.hpp>
+
+#include <dlfcn.h>
+#include <unistd.h>
+
+#include <algorithm>
+#include <chrono>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <fstream>
+#include <functional>
+#include <iostream>
+#include <list>
+#include <string>
+#include <vector>
+
+namespace
+{
+	const std::string instance_name = "irods_rule_engine_plugin-python-instance";
+
+	using plugin_type = irods::pluggable_rule_engine<irods::default_re_ctx>;
+	using plugin_factory_type = plugin_type* (*) (const std::string&, const std::string&);
+
+	struct options
+	{
+		std::string plugin_path = BENCHMARK_HOST_PLUGIN_PATH;
+		std::string rulebase_directory = BENCHMARK_HOST_RULEBASE_DIRECTORY;
+		int iterations = 100000;
+		int repeat = 5;
+		bool json = false;
+		std::vector<std::string> names;
+	}; // struct options
+
+	struct benchmark
+	{
+		std::string name;
+		std::function<irods::error()> operation;
+	}; // struct benchmark
+
+	[[noreturn]] void fail(const std::string& _what, const irods::error& _error = SUCCESS())
+	{
+		std::cerr << "benchmark host: " << _what;
+		if (!_error.ok()) {
+			std::cerr << ": [" << _error.code() << "] " << _error.result();
+		}
+		std::cerr << '\n';
+		std::exit(1);
+	}
+
+	options parse_options(int _argc, char** _argv)
+	{
+		options opts;
+		for (int i = 1; i < _argc; ++i) {
+			const std::string arg = _argv[i];
+			const auto value = [&] {
+				if (++i == _argc) {
+					fail("missing value for " + arg);
+				}
+				return std::string{_argv[i]};
+			};
+
+			if (arg == "--plugin") {
+				opts.plugin_path = value();
+			}
+			else if (arg == "--rulebase-directory") {
+				opts.rulebase_directory = value();
+			}
+			else if (arg == "--iterations") {
+				opts.iterations = std::max(1, std::stoi(value()));
+			}
+			else if (arg == "--repeat") {
+				opts.repeat = std::max(1, std::stoi(value()));
+			}
+			else if (arg == "--json") {
+				opts.json = true;
+			}
+			else if (arg == "--help") {
+				std::cout << "usage: " << _argv[0]
+				          << " [--plugin PATH] [--rulebase-directory DIR] [--iterations N] [--repeat N] [--json]"
+				             " [NAME ...]\n";
+				std::exit(0);
+			}
+			else {
+				opts.names.push_back(arg);
+			}
+		}
+		return opts;
+	}
+
+	// Writes a server configuration holding only what the plugin reads, and loads it
+	void load_server_properties()
+	{
+		// clang-format off
+		const nlohmann::json config{
+			{"log_level", {{"rule_engine", "warn"}}},
+			{"plugin_configuration", {
+				{"rule_engines", nlohmann::json::array({{
+					{"instance_name", instance_name},
+					{"plugin_name", "irods_rule_engine_plugin-python"},
+					{"plugin_specific_configuration", nlohmann::json::object()},
+				}})},
+			}},
+		};
+		// clang-format on
+
+		char path[] = "/tmp/irods_rule_engine_plugin-python-benchmark-host.XXXXXX";
+		const int fd = mkstemp(path);
+		if (fd < 0) {
+			fail("cannot create a temporary server configuration");
+		}
+		close(fd);
+		std::ofstream{path} << config.dump();
+		irods::server_properties::instance().init(path);
+		std::remove(path);
+	}
+
+	plugin_type* load_plugin(const std::string& _path)
+	{
+		// The server loads rule engine plugins with RTLD_GLOBAL, which libpython needs
+		void* handle = dlopen(_path.c_str(), RTLD_NOW | RTLD_GLOBAL);
+		if (!handle) {
+			fail(std::string{"cannot load the plugin: "} + dlerror());
+		}
+		auto factory = reinterpret_cast<plugin_factory_type>(dlsym(handle, "plugin_factory"));
+		if (!factory) {
+			fail("the plugin has no plugin_factory");
+		}
+		return factory(instance_name, "");
+	}
+
+	// Runs _benchmark _opts.repeat times, and returns the result of the run with the median latency
+	nlohmann::json run(const benchmark& _benchmark, const options& _opts)
+	{
+		std::vector<double> latencies;
+		for (int r = 0; r < _opts.repeat; ++r) {
+			const auto start = std::chrono::steady_clock::now();
+			for (int i = 0; i < _opts.iterations; ++i) {
+				if (const auto err = _benchmark.operation(); !err.ok()) {
+					fail(_benchmark.name + " failed", err);
+				}
+			}
+			const std::chrono::duration<double> seconds = std::chrono::steady_clock::now() - start;
+			latencies.push_back(seconds.count() / _opts.iterations);
+		}
+
+		std::sort(latencies.begin(), latencies.end());
+		const double median = latencies[latencies.size() / 2];
+		return {
+			{"name", _benchmark.name},
+			{"operations", _opts.iterations},
+			{"operations_per_second", 1 / median},
+			{"latency_us", median * 1e6},
+			{"min_latency_us", latencies.front() * 1e6},
+			{"max_latency_us", latencies.back() * 1e6},
+		};
+	}
+} // namespace
+
+int main(int _argc, char** _argv)
+{
+	const auto opts = parse_options(_argc, _argv);
+
+	// The plugin imports core from the Python path, where this comes before the configuration directory
+	setenv("PYTHONPATH", opts.rulebase_directory.c_str(), 1);
+	load_server_properties();
+
+	auto* plugin = load_plugin(opts.plugin_path);
+	irods::default_re_ctx re_ctx{};
+
+	// The stand-in for the server's rule engine manager: no other rule engines, and the microservice table
+	std::vector<irods::re_pack_inp<irods::default_re_ctx>> re_packs;
+	irods::rule_engine_plugin_manager<irods::default_re_ctx> re_plugin_manager{irods::KW_CFG_PLUGIN_TYPE_RULE_ENGINE};
+	irods::microservice_manager<irods::default_ms_ctx> ms_manager;
+	irods::rule_engine_manager<irods::default_re_ctx, irods::default_ms_ctx> re_manager{
+		re_plugin_manager, re_packs, ms_manager};
+	ruleExecInfo_t rei{};
+	irods::rule_engine_context_manager<irods::unit, ruleExecInfo_t*, irods::AUDIT_RULE> re_ctx_manager{re_manager,
+	                                                                                                   &rei};
+	irods::callback effect_handler{re_ctx_manager};
+
+	for (const char* operation : {"setup", "start"}) {
+		if (const auto err = plugin->call<const std::string&>(operation, re_ctx, instance_name); !err.ok()) {
+			fail(std::string{operation} + " failed", err);
+		}
+	}
+
+	std::string argument = "value";
+	std::string result;
+	msParamArray_t ms_params{};
+
+	// clang-format off
+	const std::vector<benchmark> benchmarks{
+		{"rule_exists_hit", [&] {
+			bool exists = false;
+			auto err = plugin->call<const std::string&, bool&>(
+				"rule_exists", re_ctx, "python_rule_engine_benchmark_noop", exists);
+			return err.ok() && !exists ? ERROR(SYS_INTERNAL_ERR, "rule not found") : err;
+		}},
+		{"rule_exists_miss", [&] {
+			bool exists = true;
+			auto err = plugin->call<const std::string&, bool&>(
+				"rule_exists", re_ctx, "pep_api_benchmark_host_missing_pre", exists);
+			return err.ok() && exists ? ERROR(SYS_INTERNAL_ERR, "missing rule found") : err;
+		}},
+		{"exec_rule_noop", [&] {
+			std::list<boost::any> arguments;
+			return plugin->call<const std::string&, std::list<boost::any>&, irods::callback>(
+				"exec_rule", re_ctx, "python_rule_engine_benchmark_noop", arguments, effect_handler);
+		}},
+		{"exec_rule_two_arguments", [&] {
+			std::list<boost::any> arguments{&argument, &result};
+			return plugin->call<const std::string&, std::list<boost::any>&, irods::callback>(
+				"exec_rule", re_ctx, "python_rule_engine_benchmark_echo", arguments, effect_handler);
+		}},
+		{"exec_rule_expression", [&] {
+			return plugin->call<const std::string&, msParamArray_t*, irods::callback>(
+				"exec_rule_expression", re_ctx, "pass", &ms_params, effect_handler);
+		}},
+	};
+	// clang-format on
+
+	nlohmann::json results = nlohmann::json::array();
+	for (const auto& b : benchmarks) {
+		const auto selected = opts.names.empty() || std::any_of(opts.names.begin(), opts.names.end(), [&b](auto& _n) {
+			return b.name.find(_n) != std::string::npos;
+		});
+		if (!selected) {
+			continue;
+		}
+
+		auto measurement = run(b, opts);
+		if (!opts.json) {
+			std::printf("%-28s%9d ops %12.0f ops/s %10.3f us/op [%.3f .. %.3f]\n",
+			            b.name.c_str(),
+			            measurement["operations"].get<int>(),
+			            measurement["operations_per_second"].get<double>(),
+			            measurement["latency_us"].get<double>(),
+			            measurement["min_latency_us"].get<double>(),
+			            measurement["max_latency_us"].get<double>());
+		}
+		results.push_back(std::move(measurement));
+	}
+
+	if (opts.json) {
+		std::cout << results.dump(2) << '\n';
+	}
+
+	for (const char* operation : {"stop", "teardown"}) {
+		if (const auto err = plugin->call<const std::string&>(operation, re_ctx, instance_name); !err.ok()) {
+			fail(std::string{operation} + " failed", err);
+		}
+	}
+	return 0;
+}
@@ -0,0 +1,339 @@
+"""Stand-ins for the parts of the plugin and the server used by the Python modules, so that the
+modules can be benchmarked without an iRODS server.
+
+install() provides the irods_types, irods_errors and irods_log modules (normally built into the
+plugin) when they cannot be imported. FakeCallback answers the GenQuery1 and GenQuery2 microservices
+from an in-memory table, and the data object microservices from in-memory data objects, and make_rei()
+builds an object shaped like the rei passed to rules.
+"""
+import itertools
+import re
+import sys
+import time
+import types
+
+END_OF_RESULTSET = -408000
+CAT_NO_ROWS_FOUND = -808000
+
+# genquery.Option values used by the fake GenQuery1 implementation
+_RETURN_TOTAL_ROW_COUNT = 0x020
+_AUTO_CLOSE = 0x100
+
+MAX_SQL_ROWS = 256
+
+# The shape of the queries genquery builds for GenQuery2: columns or functions of columns (e.g. MIN), then
+# the optional where, order by, offset and limit clauses. Quoted values hold single quotes doubled.
+_GENQUERY2_COLUMN = r'[A-Z][A-Z0-9_]*'
+_GENQUERY2_SELECTED = r'(?:[A-Za-z_]+\(\s*{0}\s*\)|{0})'.format(_GENQUERY2_COLUMN)
+_GENQUERY2_VALUE = r"'(?:[^']|'')*'"
+_GENQUERY2_OPERATOR = r'(?:=|!=|<>|<=|>=|<|>|(?:not\s+)?like)'
+_GENQUERY2_CONDITION = r'{}\s*{}\s*{}'.format(_GENQUERY2_SELECTED, _GENQUERY2_OPERATOR, _GENQUERY2_VALUE)
+_GENQUERY2_QUERY = re.compile(
+    r'select\s+{s}(?:\s*,\s*{s})*'
+    r'(?:\s+where\s+{c}(?:\s+(?:and|or)\s+{c})*)?'
+    r'(?:\s+order\s+by\s+{s}(?:\s+(?:asc|desc))?(?:\s*,\s*{s}(?:\s+(?:asc|desc))?)*)?'
+    r'(?:\s+offset\s+\d+)?(?:\s+limit\s+\d+)?$'.format(s=_GENQUERY2_SELECTED, c=_GENQUERY2_CONDITION),
+    re.IGNORECASE)
+
+
+class CallbackError(RuntimeError):
+    """Stand-in for irods_errors.CallbackError."""
+
+    code = -1
+
+    def __init__(self, code, message=''):
+        super(CallbackError, self).__init__('[iRods__Error__Code:{}] {}'.format(code, message))
+        self.code = code
+
+
+class InxValPair(object):
+    def __init__(self, values=()):
+        self.value = list(values)
+        self.len = len(self.value)
+
+    def set_value(self, index, value):
+        self.value[index] = value
+
+
+class GenQueryInp(object):
+    def __init__(self):
+        self.maxRows = MAX_SQL_ROWS
+        self.continueInx = 0
+        self.rowOffset = 0
+        self.options = 0
+        self.sqlCondInp = InxValPair()
+
+
+class BytesBuf(bytearray):
+    """Stand-in for irods_types.BytesBuf: a buffer of bytes with a len."""
+
+    @property
+    def len(self):
+        return len(self)
+
+    def clear_buffer(self):
+        del self[:]
+
+
+class BorrowedBytesBuf(BytesBuf):
+    """Stand-in for irods_types.BorrowedBytesBuf. The fake copies the bytes instead of borrowing them."""
+
+
+class FileLseekOut(object):
+    def __init__(self, offset=0):
+        self.offset = offset
+
+
+class GenQueryOut(object):
+    def __init__(self, page=(), continue_index=0, total_row_count=0, column_count=0):
+        self._page = [list(row) for row in page]
+        self.rowCnt = len(self._page)
+        self.attriCnt = column_count
+        self.continueInx = continue_index
+        self.totalRowCount = total_row_count
+
+    def rows(self):
+        return [list(row) for row in self._page]
+
+    def columns(self):
+        if not self._page:
+            return []
+        return [list(column) for column in zip(*self._page)]
+
+
+def _discard_log_entry(message, *args, **fields):
+    pass
+
+
+def install():
+    """Registers fake irods_types, irods_errors and irods_log modules, unless the real ones can be
+    imported. The fake irods_log discards every entry."""
+    try:
+        import irods_types
+        import irods_errors
+        import irods_log
+        return False
+    except ImportError:
+        pass
+
+    irods_types = types.ModuleType('irods_types')
+    irods_types.GenQueryInp = GenQueryInp
+    irods_types.InxValPair = InxValPair
+    irods_types.GenQueryOut = GenQueryOut
+    irods_types.BytesBuf = BytesBuf
+    irods_types.BorrowedBytesBuf = BorrowedBytesBuf
+    irods_types.FileLseekOut_t = FileLseekOut
+    sys.modules['irods_types'] = irods_types
+
+    irods_errors = types.ModuleType('irods_errors')
+    irods_errors.END_OF_RESULTSET = END_OF_RESULTSET
+    irods_errors.CAT_NO_ROWS_FOUND = CAT_NO_ROWS_FOUND
+    irods_errors.CallbackError = CallbackError
+    sys.modules['irods_errors'] = irods_errors
+
+    irods_log = types.ModuleType('irods_log')
+    for level, name in enumerate(('trace', 'debug', 'info', 'warn', 'error', 'critical')):
+        setattr(irods_log, name, _discard_log_entry)
+        setattr(irods_log, name.upper(), level)
+    irods_log.warning = _discard_log_entry
+    irods_log.is_enabled = lambda level: False
+    sys.modules['irods_log'] = irods_log
+    return True
+
+
+def parse_genquery2(query_string):
+    """Raises CallbackError, as msi_genquery2_execute does, if query_string is not shaped like the GenQuery2
+    queries genquery builds."""
+    if not _GENQUERY2_QUERY.match(query_string.strip()):
+        raise CallbackError(-1, 'GenQuery2 cannot parse query: ' + query_string)
+
+
+def make_rows(row_count, column_count):
+    """Returns row_count rows of column_count strings, shaped like catalog query results."""
+    return [tuple('{}_{}'.format(c, r) if c else str(r) for c in range(column_count)) for r in range(row_count)]
+
+
+class FakeCallback(object):
+    """Callback object answering GenQuery microservices from `rows`, whatever the query, and data object
+    microservices from `data_objects`.
+
+    Every call returns a dict with the same shape as the plugin's ('code', 'status', 'arguments').
+    Calls to microservices the fake does not know fail with a CallbackError.
+
+    :param rows: The resultset of every query, as a sequence of equal-length tuples of strings.
+    :param call_latency: Seconds spent busy-waiting in every call, to model the cost of a round
+                         trip through the plugin and the server's effect handler.
+
+    The GenQuery2 query strings it was given are kept in queries, after checking their shape with
+    parse_genquery2.
+
+    data_objects holds the content of each data object, as a bytearray by logical path. The keyword
+    strings msiDataObjOpen was given are kept in opened, and the descriptors not closed yet in
+    descriptors, as [path, offset, openFlags] lists by descriptor.
+    """
+
+    def __init__(self, rows=(), call_latency=0.0):
+        self.rows = rows
+        self.call_latency = call_latency
+        self.calls = 0
+        self.queries = []
+        self.data_objects = {}
+        self.opened = []
+        self.descriptors = {}
+        self._cursors = {}
+        self._handles = {}
+        self._next_id = itertools.count(1)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        method = getattr(self, '_msi_' + name, None)
+        if method is None:
+            def method(*arguments):
+                raise CallbackError(-1, 'no fake for microservice ' + name)
+
+        def call(*arguments):
+            self.calls += 1
+            if self.call_latency:
+                deadline = time.perf_counter() + self.call_latency
+                while time.perf_counter() < deadline:
+                    pass
+            return {'code': 0, 'status': True, 'arguments': method(*arguments)}
+        return call
+
+    def _msi_writeLine(self, stream, message):
+        return [stream, message]
+
+    # GenQuery1
+
+    def _msi_msiMakeGenQuery(self, columns, conditions, gqi):
+        # Keeps what follows the column name of each condition, as msiMakeGenQuery does
+        conditions = [c.strip() for c in re.split(r'\s+and\s+', conditions, flags=re.IGNORECASE) if c.strip()]
+        gqi.sqlCondInp = InxValPair(c.split(None, 1)[1] if ' ' in c else '' for c in conditions)
+        return [columns, conditions, gqi]
+
+    def _msi_msiExecGenQuery(self, gqi, gqo):
+        cursor = next(self._next_id)
+        self._cursors[cursor] = gqi.rowOffset
+        return [gqi, self._page(gqi, cursor), 0]
+
+    def _msi_msiGetMoreRows(self, gqi, gqo, _):
+        cursor = gqo.continueInx
+        if cursor <= 0 or cursor not in self._cursors:
+            raise CallbackError(-1, 'invalid continuation index')
+        gqo = self._page(gqi, cursor)
+        return [gqi, gqo, gqo.continueInx]
+
+    def _page(self, gqi, cursor):
+        start = self._cursors[cursor]
+        page = self.rows[start:start + min(gqi.maxRows, MAX_SQL_ROWS)]
+        end = start + len(page)
+        if end >= len(self.rows) or gqi.options & _AUTO_CLOSE:
+            del self._cursors[cursor]
+            cursor = 0
+        else:
+            self._cursors[cursor] = end
+        total = len(self.rows) if gqi.options & _RETURN_TOTAL_ROW_COUNT else 0
+        column_count = len(self.rows[0]) if self.rows else 0
+        return GenQueryOut(page, cursor, total, column_count)
+
+    # Data objects
+
+    def _msi_msiDataObjOpen(self, keywords, descriptor):
+        self.opened.append(keywords)
+        options = dict(keyword.split('=', 1) for keyword in keywords.split('++++'))
+        path, flags = options['objPath'], options.get('openFlags', 'O_RDONLY')
+        if path not in self.data_objects:
+            if 'O_CREAT' not in flags:
+                raise CallbackError(-1, 'data object does not exist: ' + path)
+            self.data_objects[path] = bytearray()
+        if 'O_TRUNC' in flags:
+            del self.data_objects[path][:]
+        descriptor = next(self._next_id)
+        self.descriptors[descriptor] = [path, 0, flags]
+        return [keywords, descriptor]
+
+    def _msi_msiDataObjRead(self, descriptor, size, buf):
+        state = self.descriptors[descriptor]
+        if state[2].startswith('O_WRONLY'):
+            raise CallbackError(-1, 'descriptor not open for reading')
+        data = self.data_objects[state[0]][state[1]:state[1] + int(size)]
+        state[1] += len(data)
+        return [descriptor, size, BytesBuf(data)]
+
+    def _msi_msiDataObjWrite(self, descriptor, buf, written):
+        state = self.descriptors[descriptor]
+        if state[2].startswith('O_RDONLY'):
+            raise CallbackError(-1, 'descriptor not open for writing')
+        content = self.data_objects[state[0]]
+        if state[1] > len(content):
+            content.extend(bytes(state[1] - len(content)))
+        content[state[1]:state[1] + len(buf)] = buf
+        state[1] += len(buf)
+        return [descriptor, buf, len(buf)]
+
+    def _msi_msiDataObjLseek(self, descriptor, offset, whence, out):
+        state = self.descriptors[descriptor]
+        base = {'SEEK_SET': 0, 'SEEK_CUR': state[1], 'SEEK_END': len(self.data_objects[state[0]])}[whence]
+        if base + int(offset) < 0:
+            raise CallbackError(-1, 'negative offset')
+        state[1] = base + int(offset)
+        return [descriptor, offset, whence, FileLseekOut(state[1])]
+
+    def _msi_msiDataObjClose(self, descriptor, status):
+        del self.descriptors[descriptor]
+        return [descriptor, 0]
+
+    # GenQuery2
+
+    def _msi_msi_genquery2_execute(self, handle, query_string):
+        parse_genquery2(query_string)
+        self.queries.append(query_string)
+        handle = str(next(self._next_id))
+        self._handles[handle] = [-1, self.rows]
+        return [handle, query_string]
+
+    def _msi_msi_genquery2_next_row(self, handle):
+        state = self._handles[handle]
+        state[0] += 1
+        if state[0] >= len(state[1]):
+            raise CallbackError(END_OF_RESULTSET, 'no more rows')
+        return [handle]
+
+    def _msi_msi_genquery2_column(self, handle, index, value):
+        position, rows = self._handles[handle]
+        return [handle, index, rows[position][int(index)]]
+
+    def _msi_msi_genquery2_free(self, handle):
+        del self._handles[handle]
+        return [handle]
+
+
+def _struct(**fields):
+    return types.SimpleNamespace(**fields)
+
+
+def make_rei():
+    """Returns an object with the attributes of a rei read by session_vars."""
+    def user(name):
+        return _struct(userName=name, rodsZone='tempZone', userType='rodsuser', sysUid=0,
+                       authInfo=_struct(authScheme='native', authFlag=1, flag=0, ppid=0, host='', authStr=''),
+                       userOtherInfo=_struct(userInfo='', userComments='', userCreate='01700000000',
+                                             userModify='01700000000'))
+
+    data_object_info = _struct(objPath='/tempZone/home/alice/file.txt', dataSize=1024, dataType='generic',
+                               chksum='', filePath='/var/lib/irods/Vault/home/alice/file.txt', replNum=0,
+                               replStatus=1, writeFlag=0, dataOwnerName='alice', dataOwnerZone='tempZone',
+                               dataExpiry='', dataComments='', dataCreate='01700000000', dataModify='01700000000',
+                               dataAccess='', dataId=10010, collId=10009, statusString='',
+                               destRescName='demoResc', backupRescName='', rescName='demoResc')
+    collection_info = _struct(collId=10009, collName='/tempZone/home/alice', collParentName='/tempZone/home',
+                              collOwnerName='alice', collExpiry='', collComments='', collCreate='01700000000',
+                              collModify='01700000000', collAccess='', collInheritance='')
+    connection = _struct(clientAddr='127.0.0.1', connectCnt=1, sock=5, option='', status=0, apiInx=606,
+                         clientUser=user('alice'), proxyUser=user('alice'))
+    key_value_pairs = _struct(len=2, key=['dataType', 'forceFlag'], value=['generic', ''])
+
+    return _struct(pluginInstanceName='irods_rule_engine_plugin-python-instance', status=0,
+                   rsComm=connection, doi=data_object_info, doinp=_struct(oprType=1), coi=collection_info,
+                   uoic=None, uoip=None, uoio=None, condInputData=key_value_pairs)
@@ -0,0 +1,576 @@
+"""Benchmarks of the plugin's Python modules that run without an iRODS server.
+
+    python3 benchmarks/offline/run.py [--rows N] [--repeat N] [--call-latency US] [--json] [NAME ...]
+    python3 benchmarks/offline/run.py --check
+
+Each benchmark is run --repeat times. For each, the number of operations (rows, or maps) per run,
+the throughput and the mean latency per operation of the median run, and the spread of the
+per-operation latency across runs are printed. With --json, the results are printed as a JSON
+list instead, for comparison between builds. With --check, the checks of the behaviour the
+benchmarks rely on are run instead, and the exit status is non-zero if any fails.
+"""
+import argparse
+import copy
+import functools
+import io
+import itertools
+import json
+import os
+import pickle
+import statistics
+import sys
+import threading
+import time
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [_HERE, os.path.dirname(os.path.dirname(_HERE))]
+
+import fakes
+
+fakes.install()
+
+import data_object_io
+import deferred_work
+import genquery
+import session_vars
+from genquery import AS_COLUMNS, AS_DICT, AS_LIST, Parser, Query, paged_iterator
+
+COLUMNS = ['DATA_ID', 'COLL_NAME', 'DATA_NAME', 'DATA_SIZE', 'DATA_OWNER_NAME', 'DATA_MODIFY_TIME']
+
+BENCHMARKS = []
+CHECKS = []
+
+
+def benchmark(function):
+    """Registers function(options) as a benchmark. It returns the number of operations it made."""
+    BENCHMARKS.append(function)
+    return function
+
+
+def check(function):
+    """Registers function() as a check. It raises AssertionError if the check fails."""
+    CHECKS.append(function)
+    return function
+
+
+@functools.lru_cache(maxsize=None)
+def _rows(row_count, column_count):
+    return fakes.make_rows(row_count, column_count)
+
+
+def _query_callback(options):
+    # The rows are made before the first run, so that runs only time the queries.
+    return fakes.FakeCallback(_rows(options.rows, options.columns), options.call_latency)
+
+
+@benchmark
+def genquery1_as_tuple(options):
+    callback = _query_callback(options)
+    return sum(1 for _ in Query(callback, COLUMNS[:options.columns]))
+
+
+@benchmark
+def genquery1_as_dict(options):
+    callback = _query_callback(options)
+    return sum(1 for _ in Query(callback, COLUMNS[:options.columns], output=AS_DICT))
+
+
+@benchmark
+def genquery1_as_columns(options):
+    callback = _query_callback(options)
+    return sum(len(page[0]) for page in Query(callback, COLUMNS[:options.columns], output=AS_COLUMNS))
+
+
+@benchmark
+def genquery1_limit(options):
+    # Stops after a page and a half, so that the query has to be closed early.
+    callback = _query_callback(options)
+    return sum(1 for _ in Query(callback, COLUMNS[:options.columns], limit=genquery.MAX_SQL_ROWS * 3 // 2))
+
+
+@benchmark
+def genquery2_rows(options):
+    callback = _query_callback(options)
+    return sum(1 for _ in Query(callback, COLUMNS[:options.columns], parser=Parser.GENQUERY2))
+
+
+@benchmark
+def paged_iterator_pages(options):
+    callback = _query_callback(options)
+    return sum(len(page) for page in paged_iterator(COLUMNS[:options.columns], '', AS_LIST, callback))
+
+
+def _lookup_callback(options):
+    # Lookups of a single row, each a separate query
+    return fakes.FakeCallback(_rows(1, options.columns), options.call_latency)
+
+
+@benchmark
+def genquery1_lookups(options):
+    callback = _lookup_callback(options)
+    for i in range(options.iterations):
+        Query(callback, COLUMNS[:options.columns], "DATA_NAME = 'file_{}.txt'".format(i)).first()
+    return options.iterations
+
+
+@benchmark
+def genquery1_prepared_lookups(options):
+    callback = _lookup_callback(options)
+    prepared = genquery.PreparedQuery(COLUMNS[:options.columns], 'DATA_NAME = ?')
+    for i in range(options.iterations):
+        prepared.query(callback, 'file_{}.txt'.format(i)).first()
+    return options.iterations
+
+
+@benchmark
+def session_vars_full_map(options):
+    rei = fakes.make_rei()
+    for _ in range(options.iterations):
+        session_vars._new_map(rei).to_dict()
+    return options.iterations
+
+
+@benchmark
+def session_vars_two_fields(options):
+    rei = fakes.make_rei()
+    for _ in range(options.iterations):
+        var_map = session_vars._new_map(rei)
+        var_map['client_user']['user_name']
+        var_map['plugin_instance_name']
+    return options.iterations
+
+
+@benchmark
+def session_vars_memoized(options):
+    rei = fakes.make_rei()
+    for _ in range(options.iterations):
+        var_map = session_vars.get_map(rei)
+        var_map['client_user']['user_name']
+        var_map['plugin_instance_name']
+    return options.iterations
+
+
+def _eager_session_map(rei):
+    # session_vars.get_map as it was before maps were built lazily, as the reference for LazyMap
+    def user_map(user_struct):
+        if user_struct is None:
+            return None
+        auth = user_struct.authInfo
+        other = user_struct.userOtherInfo
+        return {
+            'user_name': str(user_struct.userName),
+            'irods_zone': str(user_struct.rodsZone),
+            'user_type': str(user_struct.userType),
+            'system_uid': user_struct.sysUid,
+            'authentication_info': {
+                'authentication_scheme': str(auth.authScheme),
+                'privilege_level': auth.authFlag,
+                'flag': auth.flag,
+                'ppid': auth.ppid,
+                'host': str(auth.host),
+                'authentication_string': str(auth.authStr),
+            },
+            'info': str(other.userInfo),
+            'comments': str(other.userComments),
+            'create_time': str(other.userCreate),
+            'modify_time': str(other.userModify),
+        }
+
+    def session_user(user_struct, rs_comm_attribute):
+        if user_struct is None and rei.rsComm is not None:
+            user_struct = getattr(rei.rsComm, rs_comm_attribute)
+        return user_map(user_struct)
+
+    doi, doinp, coi, comm, kvp = rei.doi, rei.doinp, rei.coi, rei.rsComm, rei.condInputData
+
+    def info(name, convert=lambda value: value):
+        return convert(getattr(doi, name)) if doi is not None else None
+
+    data_object = {
+        'object_path': str(doi.objPath if doi is not None else doinp.objPath),
+        'size': doi.dataSize if doi is not None else doinp.dataSize,
+        'type': info('dataType', str),
+        'checksum': info('chksum', str),
+        'file_path': info('filePath', str),
+        'replica_number': info('replNum'),
+        'replication_status': info('replStatus'),
+        'write_flag': info('writeFlag'),
+        'owner': info('dataOwnerName', str),
+        'owner_zone': info('dataOwnerZone', str),
+        'expiry': info('dataExpiry', str),
+        'comments': info('dataComments', str),
+        'create_time': info('dataCreate', str),
+        'modify_time': info('dataModify', str),
+        'access_time': info('dataAccess', str),
+        'id': info('dataId'),
+        'collection_id': info('collId'),
+        'status_string': info('statusString', str),
+        'destination_resource_name': info('destRescName', str),
+        'backup_resource_name': info('backupRescName', str),
+        'resource_name': info('rescName', str),
+    } if doi is not None or doinp is not None else None
+
+    return {
+        'plugin_instance_name': str(rei.pluginInstanceName),
+        'status': rei.status,
+        'operation_type': doinp.oprType if doinp is not None else None,
+        'connection': {
+            'client_address': str(comm.clientAddr),
+            'connection_count': comm.connectCnt,
+            'socket': comm.sock,
+            'option': str(comm.option),
+            'status': comm.status,
+            'api_number': comm.apiInx,
+        } if comm is not None else None,
+        'data_object': data_object,
+        'collection': {
+            'id': coi.collId,
+            'name': str(coi.collName),
+            'parent_collection_name': str(coi.collParentName),
+            'owner': str(coi.collOwnerName),
+            'expiry': str(coi.collExpiry),
+            'comments': str(coi.collComments),
+            'create_time': str(coi.collCreate),
+            'modify_time': str(coi.collModify),
+            'access_time': str(coi.collAccess),
+            'inheritance': str(coi.collInheritance),
+        } if coi is not None else None,
+        'client_user': session_user(rei.uoic, 'clientUser'),
+        'proxy_user': session_user(rei.uoip, 'proxyUser'),
+        'other_user': user_map(rei.uoio),
+        'key_value_pairs': dict(zip(kvp.key[:kvp.len], kvp.value[:kvp.len])) if kvp is not None else None,
+    }
+
+
+@check
+def session_vars_json_round_trip():
+    var_map = session_vars.get_map(fakes.make_rei())
+    assert isinstance(var_map, dict) and isinstance(var_map['client_user'], dict)
+    assert json.loads(json.dumps(var_map)) == var_map.to_dict()
+
+    var_map = session_vars._new_map(fakes.make_rei())
+    assert json.loads(json.dumps(dict(var_map))) == var_map.to_dict()
+    assert type(dict(var_map)['client_user']) is session_vars.LazyMap
+
+
+@check
+def session_vars_match_eager_map():
+    reis = [fakes.make_rei() for _ in range(4)]
+    reis[1].uoic = reis[1].uoio = reis[1].rsComm.proxyUser
+    reis[1].rsComm.clientUser = None
+    reis[2].doi = reis[2].coi = reis[2].condInputData = None
+    reis[2].doinp = fakes.make_rei().doinp
+    reis[2].doinp.objPath, reis[2].doinp.dataSize = '/tempZone/home/alice/new.txt', 0
+    reis[3].doi = reis[3].doinp = reis[3].rsComm = None
+
+    for rei in reis:
+        expected = _eager_session_map(rei)
+        var_map = session_vars._new_map(rei)
+        assert list(var_map) == list(expected) and len(var_map) == len(expected)
+        # Every way of reading the map, each on a map none of whose values were read yet
+        for read in (lambda m: m, dict, lambda m: m.copy(), lambda m: dict(m.items()), lambda m: m.to_dict(),
+                     lambda m: {key: m.get(key) for key in m}, lambda m: dict(zip(m.keys(), m.values())),
+                     lambda m: {**m}, copy.deepcopy, lambda m: pickle.loads(pickle.dumps(m)),
+                     lambda m: json.loads(json.dumps(m))):
+            assert read(session_vars._new_map(rei)) == expected
+            assert expected == read(session_vars._new_map(rei))
+        assert repr(session_vars._new_map(rei)) == repr(expected)
+        assert not var_map != expected and var_map.get('missing', 1) == 1
+
+
+@check
+def query_cache_keyed_by_user():
+    cache = genquery.QueryCache()
+    alice, bob = fakes.make_rei(), fakes.make_rei()
+    bob.rsComm.clientUser = bob.rsComm.proxyUser = fakes.make_rei().rsComm.clientUser
+    bob.rsComm.clientUser.userName = bob.rsComm.proxyUser.userName = 'bob'
+
+    alice_rows = cache.fetch(Query(fakes.FakeCallback(fakes.make_rows(2, 1)), COLUMNS[0]),
+                             cache.session_user(alice))
+    bob_rows = cache.fetch(Query(fakes.FakeCallback(fakes.make_rows(3, 1)), COLUMNS[0]), cache.session_user(bob))
+    assert len(alice_rows) == 2 and len(bob_rows) == 3
+    assert cache.stats()['misses'] == 2 and cache.stats()['hits'] == 0
+
+
+@check
+def query_cache_keys_and_expiry():
+    cache = genquery.QueryCache()
+    user = cache.session_user(fakes.make_rei())
+    callback = fakes.FakeCallback(fakes.make_rows(2, 1))
+
+    # Whitespace outside quoted values does not change the key, but quoted values and options do
+    cache.fetch(Query(callback, COLUMNS[0], "DATA_NAME = 'a  b'"), user)
+    cache.fetch(Query(callback, COLUMNS[0], "DATA_NAME  =  'a  b'"), user)
+    assert cache.stats()['hits'] == 1
+    cache.fetch(Query(callback, COLUMNS[0], "DATA_NAME = 'a b'"), user)
+    cache.fetch(Query(callback, COLUMNS[0], "DATA_NAME = 'a  b'", output=AS_DICT), user)
+    assert cache.stats()['misses'] == 3
+
+    calls = callback.calls
+    cache.fetch(Query(callback, COLUMNS[0]), None)
+    cache.fetch(Query(callback, COLUMNS[0]), None)
+    assert cache.stats()['uncached'] == 2 and callback.calls > calls
+
+    # A result cached with no time to live is expired by the next fetch, and run again
+    cache.fetch(Query(callback, COLUMNS[1]), user, ttl=0)
+    calls = callback.calls
+    assert len(cache.fetch(Query(callback, COLUMNS[1]), user)) == 2
+    assert cache.stats()['expirations'] == 1 and callback.calls > calls
+    calls = callback.calls
+    cache.fetch(Query(callback, COLUMNS[1]), user)
+    assert cache.stats()['hits'] == 2 and callback.calls == calls
+
+
+@check
+def key_ranges_genquery2_query_shape():
+    callback = fakes.FakeCallback([('5', '20')])
+    assert genquery.key_ranges(callback, partitions=3, parser=Parser.GENQUERY2) == [(None, 10), (10, 16), (16, None)]
+    assert callback.queries == ['select MIN(DATA_ID), MAX(DATA_ID)']
+
+    callback = fakes.FakeCallback([])
+    assert genquery.key_ranges(callback, 'DATA_NAME', "COLL_NAME = '/a'", parser=Parser.GENQUERY2) == []
+    assert callback.queries == ["select MIN(DATA_NAME), MAX(DATA_NAME) where COLL_NAME = '/a'"]
+
+
+@check
+def keyset_iterator_quotes_keys():
+    # The fake answers every page with the same rows, so the iterator never ends by itself
+    callback = fakes.FakeCallback([('a', 'x'), ("it's", 'x')])
+    iterator = genquery.keyset_iterator(callback, 'DATA_NAME, COLL_NAME', key_column='DATA_NAME',
+                                        rows_per_page=2, key_range=("a\\b'c", None), parser=Parser.GENQUERY2)
+    assert len(list(itertools.islice(iterator, 3))) == 3
+    assert "DATA_NAME > 'a\\x5cb''c'" in callback.queries[0]
+    assert "DATA_NAME > 'it''s'" in callback.queries[1]
+
+    iterator = genquery.keyset_iterator(callback, 'DATA_NAME', key_column='DATA_NAME', key_range=("it's", None))
+    try:
+        list(iterator)
+        assert False, 'a GenQuery1 key holding a single quote was accepted'
+    except ValueError:
+        pass
+
+
+@check
+def prepared_query_binding():
+    callback = fakes.FakeCallback([('1',)])
+    prepared = genquery.PreparedQuery('DATA_ID', "DATA_NAME = ? and COLL_NAME = '/a?'")
+    assert prepared.placeholder_count == 1
+    try:
+        prepared.query(callback)
+        assert False, 'a query was made without a value for its placeholder'
+    except ValueError:
+        pass
+    try:
+        prepared.query(callback, "it's")
+        assert False, 'a GenQuery1 value holding a single quote was accepted'
+    except ValueError:
+        pass
+
+    # The GenQueryInp parsed for the first value is reused for the second, with only its values replaced
+    for value in ('a.txt', 'b.txt'):
+        assert prepared.query(callback, value).first() == '1'
+        assert prepared._free[0].sqlCondInp.value == ["= '{}'".format(value), "= '/a?'"]
+    assert prepared.stats() == {'executions': 2, 'parses': 1, 'free': 1}
+
+    prepared = genquery.PreparedQuery('DATA_ID', 'DATA_NAME = ?', case_sensitive=False)
+    prepared.query(callback, 'Mixed.txt').first()
+    assert prepared._free[0].sqlCondInp.value == ["= 'MIXED.TXT'"]
+
+    callback = fakes.FakeCallback([('1',)])
+    prepared = genquery.PreparedQuery('DATA_ID', 'DATA_NAME = ? and COLL_NAME = ?', parser=Parser.GENQUERY2)
+    prepared.query(callback, "it's", 'a\\b').first()
+    assert callback.queries == ["select DATA_ID where DATA_NAME = 'it''s' and COLL_NAME = 'a\\x5cb'"]
+
+
+@check
+def data_object_io_modes_and_seeks():
+    callback = fakes.FakeCallback()
+    path = '/tempZone/home/alice/file.txt'
+
+    for mode in ('rt', 'x', 'rw'):
+        try:
+            data_object_io.DataObjectIO(callback, path, mode)
+            assert False, 'mode {!r} was accepted'.format(mode)
+        except ValueError:
+            pass
+
+    with data_object_io.DataObjectIO(callback, path, 'wb', resource='demoResc', replica_number=0) as data_object:
+        assert data_object.writable() and not data_object.readable()
+        assert data_object.write(b'hello world') == 11 and data_object.write(b'') == 0
+        try:
+            data_object.read(1)
+            assert False, 'a data object opened with w was read'
+        except io.UnsupportedOperation:
+            pass
+    assert callback.opened[-1] == ('objPath={}++++rescName=demoResc++++replNum=0'
+                                   '++++openFlags=O_WRONLYO_CREATO_TRUNC'.format(path))
+    assert not callback.descriptors
+
+    with data_object_io.DataObjectIO(callback, path) as data_object:
+        assert callback.opened[-1].endswith('openFlags=O_RDONLY')
+        assert data_object.read(5) == b'hello' and data_object.tell() == 5
+        assert data_object.seek(-5, io.SEEK_END) == 6 and data_object.read() == b'world'
+        assert data_object.seek(-11, io.SEEK_CUR) == 0
+        target = bytearray(5)
+        assert data_object.readinto(target) == 5 and target == b'hello'
+        try:
+            data_object.write(b'x')
+            assert False, 'a data object opened with r was written'
+        except io.UnsupportedOperation:
+            pass
+        try:
+            data_object.seek(0, 3)
+            assert False, 'an invalid whence was accepted'
+        except ValueError:
+            pass
+    try:
+        data_object.read()
+        assert False, 'a closed data object was read'
+    except ValueError:
+        pass
+
+    # Appends go to the end, wherever the object was moved to
+    with data_object_io.DataObjectIO(callback, path, 'a+') as data_object:
+        assert callback.opened[-1].endswith('openFlags=O_RDWRO_CREAT') and data_object.tell() == 11
+        data_object.seek(0)
+        data_object.write(b'!')
+        assert data_object.seek(0) == 0 and data_object.read() == b'hello world!'
+
+    with data_object_io.DataObjectIO(callback, path, 'r+') as data_object:
+        data_object.seek(6)
+        data_object.write(b'WORLD')
+    assert callback.data_objects[path] == b'hello WORLD!'
+
+    for mode, kind in (('r', io.BufferedReader), ('a', io.BufferedWriter), ('r+', io.BufferedRandom)):
+        with data_object_io.open_data_object(callback, path, mode, buffer_size=4) as data_object:
+            assert type(data_object) is kind
+    assert not callback.descriptors
+
+    # Buffered reads and writes are made a buffer at a time
+    with data_object_io.open_data_object(callback, path, 'w', buffer_size=4) as data_object:
+        calls = callback.calls
+        for byte in b'abcdefgh':
+            data_object.write(bytes((byte,)))
+    # Two writes and the close
+    assert callback.calls - calls == 3
+    with data_object_io.open_data_object(callback, path, buffer_size=4) as data_object:
+        calls = callback.calls
+        assert [data_object.read(1) for _ in range(4)] == [b'a', b'b', b'c', b'd']
+        assert callback.calls - calls == 1
+
+    assert list(data_object_io.read_chunks(callback, path, chunk_size=3, offset=2)) == [b'cde', b'fgh']
+    assert not callback.descriptors
+
+
+@check
+def deferred_work_draining():
+    # Starts from a fresh queue, as a queue inherited from another process is replaced when next used
+    deferred_work._queue.pid = -1
+    started, release = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    # The worker holds the first item, so that the others wait until drain() runs them
+    assert deferred_work.enqueue(block) and started.wait(5)
+    deferred_work.configure(max_queued=4)
+    calls = []
+    assert deferred_work.enqueue(calls.append, 1) and deferred_work.enqueue(calls.append, 1)
+    assert deferred_work.enqueue(calls.append, [2]) and deferred_work.enqueue(calls.append, [2], key=None)
+    assert deferred_work.enqueue(calls.append, 'old', key='k') and deferred_work.enqueue(calls.append, 'new', key='k')
+    assert not deferred_work.enqueue(int, 'x')
+    stats = deferred_work.stats()
+    assert (stats['queued'], stats['running'], stats['coalesced'], stats['rejected']) == (4, 1, 2, 1)
+
+    release.set()
+    assert deferred_work.drain(5)
+    assert calls == [1, [2], [2], 'new']
+    assert deferred_work.enqueue(int, 'x') and deferred_work.drain(5)
+    stats = deferred_work.stats()
+    assert (stats['enqueued'], stats['completed'], stats['failed'], stats['max_queued_seen']) == (6, 5, 1, 4)
+    assert stats['queued'] == stats['running'] == 0 and 'ValueError' in stats['last_error']
+
+    assert deferred_work.shutdown(5) and not deferred_work.enqueue(calls.append, 3)
+    assert deferred_work.stats()['rejected'] == 2
+    deferred_work._queue.pid = -1
+    deferred_work.configure()
+
+
+def run_checks():
+    failures = 0
+    for function in CHECKS:
+        try:
+            function()
+            print('{:<40}ok'.format(function.__name__))
+        except AssertionError as e:
+            failures += 1
+            print('{:<40}FAILED {!r}'.format(function.__name__, e))
+    return 1 if failures else 0
+
+
+def run(function, options):
+    _rows(options.rows, options.columns)
+
+    operations = 0
+    latencies = []
+    for _ in range(options.repeat):
+        start = time.perf_counter()
+        operations = function(options)
+        seconds = time.perf_counter() - start
+        latencies.append(seconds / operations if operations else 0.0)
+
+    median = statistics.median(latencies)
+    return {
+        'name': function.__name__,
+        'operations': operations,
+        'operations_per_second': 1 / median if median else 0.0,
+        'latency_us': median * 1e6,
+        'min_latency_us': min(latencies) * 1e6,
+        'max_latency_us': max(latencies) * 1e6,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('names', nargs='*', help='benchmarks to run (all if none), matched as substrings')
+    parser.add_argument('--rows', type=int, default=10000, help='rows in the result of each query')
+    parser.add_argument('--columns', type=int, default=4, choices=range(1, len(COLUMNS) + 1),
+                        help='columns in each query')
+    parser.add_argument('--iterations', type=int, default=10000,
+                        help='maps built by the session_vars benchmarks, and queries made by the lookup benchmarks')
+    parser.add_argument('--repeat', type=int, default=5, help='runs of each benchmark')
+    parser.add_argument('--call-latency', type=float, default=0.0,
+                        help='microseconds added to every callback call, to model a round trip through the server')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    parser.add_argument('--list', action='store_true', help='list the benchmarks and exit')
+    parser.add_argument('--check', action='store_true', help='run the checks instead of the benchmarks')
+    options = parser.parse_args(argv)
+    options.call_latency /= 1e6
+
+    if options.list:
+        print('\n'.join(function.__name__ for function in BENCHMARKS))
+        return 0
+
+    if options.check:
+        return run_checks()
+
+    selected = [function for function in BENCHMARKS
+                if not options.names or any(name in function.__name__ for name in options.names)]
+
+    results = []
+    for function in selected:
+        result = run(function, options)
+        results.append(result)
+        if not options.json:
+            print('{name:<28}{operations:>9} ops {operations_per_second:>12.0f} ops/s {latency_us:>10.3f} us/op '
+                  '[{min_latency_us:.3f} .. {max_latency_us:.3f}]'.format(**result))
+
+    if options.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
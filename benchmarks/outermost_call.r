@@ -0,0 +1,20 @@
+# Run with the iRODS Rule Language rule engine plugin:
+#   irule -r irods_rule_engine_plugin-irods_rule_language-instance -F benchmarks/outermost_call.r
+outermostCallBenchmark {
+    *iterations = int(*Iterations);
+
+    *start = "";
+    python_rule_engine_benchmark_clock(*start);
+    for (*i = 0; *i < *iterations; *i = *i + 1) {
+        python_rule_engine_benchmark_noop();
+    }
+    *end = "";
+    python_rule_engine_benchmark_clock(*end);
+
+    *per_call = (double(*end) - double(*start)) / *iterations * 1000000;
+    writeLine("stdout", "iterations:                 *iterations");
+    writeLine("stdout", "python rule call (us):      *per_call");
+}
+
+INPUT *Iterations="10000"
+OUTPUT ruleExecOut
@@ -0,0 +1,20 @@
+import time
+import irods_types
+
+def main(rule_args, callback, rei):
+    path = irods_rule_vars['*Path'][1:-1]
+    iterations = int(irods_rule_vars['*Iterations'][1:-1])
+
+    # Each msiObjStat call runs the API's PEPs, which receive the RsComm and DataObjInp of the
+    # request as arguments. With pep_api_obj_stat_pre defined in core.py, the difference from a
+    # run without it is the cost of dispatching the PEP, most of it spent on its arguments.
+    start = time.perf_counter()
+    for _ in range(iterations):
+        callback.msiObjStat(path, irods_types.RodsObjStat())
+    seconds = time.perf_counter() - start
+
+    callback.writeLine('stdout', 'iterations:                 {}'.format(iterations))
+    callback.writeLine('stdout', 'msiObjStat (us):            {:.2f}'.format(seconds / iterations * 1e6))
+
+INPUT *Path="/tempZone/home", *Iterations="10000"
+OUTPUT ruleExecOut
@@ -0,0 +1,26 @@
+import time
+
+def main(rule_args, callback, rei):
+    rule_name = irods_rule_vars['*RuleName'][1:-1]
+    iterations = int(irods_rule_vars['*Iterations'][1:-1])
+
+    # Baseline: a callback round trip to a microservice, which never enters exec_rule.
+    start = time.perf_counter()
+    for _ in range(iterations):
+        callback.msiStrlen('x', '')
+    msvc_seconds = time.perf_counter() - start
+
+    # The same round trip, but dispatched to a Python rule through exec_rule.
+    rule = getattr(callback, rule_name)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        rule()
+    rule_seconds = time.perf_counter() - start
+
+    callback.writeLine('stdout', 'iterations:                 {}'.format(iterations))
+    callback.writeLine('stdout', 'microservice call (us):     {:.2f}'.format(msvc_seconds / iterations * 1e6))
+    callback.writeLine('stdout', 'python rule call (us):      {:.2f}'.format(rule_seconds / iterations * 1e6))
+    callback.writeLine('stdout', 'exec_rule overhead (us):    {:.2f}'.format((rule_seconds - msvc_seconds) / iterations * 1e6))
+
+INPUT *RuleName="python_rule_engine_benchmark_noop", *Iterations="10000"
+OUTPUT ruleExecOut
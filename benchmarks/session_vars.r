@@ -0,0 +1,35 @@
+import time
+import session_vars
+
+def main(rule_args, callback, rei):
+    iterations = int(irods_rule_vars['*Iterations'][1:-1])
+
+    # Every section and field, as get_map built them before it became lazy.
+    start = time.perf_counter()
+    for _ in range(iterations):
+        session_vars._new_map(rei).to_dict()
+    full_seconds = time.perf_counter() - start
+
+    # The usual access pattern of a rule: one or two fields from a fresh map.
+    start = time.perf_counter()
+    for _ in range(iterations):
+        var_map = session_vars._new_map(rei)
+        var_map['client_user']['user_name']
+        var_map['plugin_instance_name']
+    lazy_seconds = time.perf_counter() - start
+
+    # The same fields again, from the map get_map keeps for this rei.
+    start = time.perf_counter()
+    for _ in range(iterations):
+        var_map = session_vars.get_map(rei)
+        var_map['client_user']['user_name']
+        var_map['plugin_instance_name']
+    memoized_seconds = time.perf_counter() - start
+
+    callback.writeLine('stdout', 'iterations:                 {}'.format(iterations))
+    callback.writeLine('stdout', 'full map (us):              {:.2f}'.format(full_seconds / iterations * 1e6))
+    callback.writeLine('stdout', 'lazy, two fields (us):      {:.2f}'.format(lazy_seconds / iterations * 1e6))
+    callback.writeLine('stdout', 'memoized, two fields (us):  {:.2f}'.format(memoized_seconds / iterations * 1e6))
+
+INPUT *Iterations="10000"
+OUTPUT ruleExecOut
@@ -0,0 +1,58 @@
+from plugin_wrappers import call_batch
+
+__all__ = ['Batch', 'call_batch']
+
+
+class Batch(object):
+    """Collects rule and microservice calls, and makes them through the callback in a single call into the plugin.
+
+    Calls are written as they would be through the callback object, and return the position of their
+    result in the list returned by run():
+
+        batch = Batch(callback)
+        for key, value in avus:
+            batch.msiAddKeyVal(kvp, key, value)
+        results = batch.run()
+
+    Each result is a (code, arguments, message) tuple. Failing calls do not raise exceptions; their
+    code is negative and message describes the error.
+
+    Used as a context manager, the calls are made when the block exits without an exception, and
+    the results are kept in the `results` attribute.
+
+    All arguments are converted before the first call is made, so a call cannot use a string
+    output of an earlier call in the same batch.
+
+    :param callback: The callback object passed to the rule.
+    :param stop_on_error: If True, calls following the first call that fails are not made, and
+                          no results are returned for them.
+    """
+
+    def __init__(self, callback, stop_on_error=False):
+        self.callback = callback
+        self.stop_on_error = stop_on_error
+        self.calls = []
+        self.results = None
+
+    def add(self, name, *arguments):
+        """Adds a call to the rule or microservice `name`, and returns the position of its result."""
+        self.calls.append((name, arguments))
+        return len(self.calls) - 1
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return lambda *arguments: self.add(name, *arguments)
+
+    def run(self):
+        """Makes the calls added so far, and returns their results."""
+        calls, self.calls = self.calls, []
+        self.results = call_batch(self.callback, calls, self.stop_on_error)
+        return self.results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.run()
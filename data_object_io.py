@@ -0,0 +1,195 @@
+import io
+import irods_types
+
+__all__ = [
+    "DataObjectIO",
+    "open_data_object",
+    "read_chunks",
+    "DEFAULT_BUFFER_SIZE",
+]
+
+# Bytes read ahead, and writes coalesced, by the buffered objects returned from open_data_object.
+DEFAULT_BUFFER_SIZE = 4 * 1024 * 1024
+
+# openFlags keyword value of msiDataObjOpen, and whether to seek to the end after opening, for each mode.
+_OPEN_FLAGS = {
+    'r':  ('O_RDONLY', False),
+    'r+': ('O_RDWR', False),
+    'w':  ('O_WRONLYO_CREATO_TRUNC', False),
+    'w+': ('O_RDWRO_CREATO_TRUNC', False),
+    'a':  ('O_WRONLYO_CREAT', True),
+    'a+': ('O_RDWRO_CREAT', True),
+}
+
+_WHENCE = {
+    io.SEEK_SET: 'SEEK_SET',
+    io.SEEK_CUR: 'SEEK_CUR',
+    io.SEEK_END: 'SEEK_END',
+}
+
+
+class DataObjectIO(io.RawIOBase):
+    """Unbuffered, file-like access to a data object through msiDataObjOpen, msiDataObjRead,
+    msiDataObjWrite, msiDataObjLseek and msiDataObjClose.
+
+    Every read, write and seek is one microservice call; wrap the object in one of the io.Buffered*
+    classes (as open_data_object does) to read ahead and to coalesce small writes.
+
+    The object must be closed, e.g. by using it in a with statement, before the rule that opened it
+    returns: the callback object is not valid after that.
+
+    :param callback: The callback object passed to the rule.
+    :param path: The logical path of the data object.
+    :param mode: One of 'r', 'r+', 'w', 'w+', 'a' and 'a+', with the same meaning as for open().
+                 A 'b' may be included, but data objects are always binary.
+    :param resource: If given, the resource holding (or to hold) the replica to be opened.
+    :param replica_number: If given, the number of the replica to be opened.
+    """
+
+    def __init__(self, callback, path, mode='r', resource=None, replica_number=None):
+        super(DataObjectIO, self).__init__()
+        flags, self._append = _OPEN_FLAGS.get(mode.replace('b', ''), (None, False))
+        if flags is None or 't' in mode:
+            raise ValueError('invalid mode: {!r}'.format(mode))
+
+        self._callback = callback
+        self._readable = mode[0] == 'r' or '+' in mode
+        self._writable = mode[0] != 'r' or '+' in mode
+        self.name = path
+        self.mode = mode
+
+        keywords = ['objPath=' + path]
+        if resource is not None:
+            keywords.append('rescName=' + resource)
+        if replica_number is not None:
+            keywords.append('replNum={}'.format(replica_number))
+        keywords.append('openFlags=' + flags)
+
+        self._descriptor = callback.msiDataObjOpen('++++'.join(keywords), 0)['arguments'][1]
+        if self._append:
+            self.seek(0, io.SEEK_END)
+
+    def readable(self):
+        return self._readable
+
+    def writable(self):
+        return self._writable
+
+    def seekable(self):
+        return True
+
+    def _read_buffer(self, size):
+        return self._callback.msiDataObjRead(self._descriptor, str(size), irods_types.BytesBuf())['arguments'][2]
+
+    def readinto(self, b):
+        self._check('reading', self._readable)
+        with memoryview(b) as view, view.cast('B') as target:
+            if not target.nbytes:
+                return 0
+            buf = self._read_buffer(target.nbytes)
+            try:
+                with memoryview(buf) as data:
+                    target[:data.nbytes] = data
+                    return data.nbytes
+            finally:
+                buf.clear_buffer()
+
+    def read(self, size=-1):
+        # Overridden to copy each read into the returned bytes only once.
+        if size is None or size < 0:
+            return self.readall()
+        self._check('reading', self._readable)
+        if not size:
+            return b''
+        buf = self._read_buffer(size)
+        try:
+            return bytes(buf)
+        finally:
+            buf.clear_buffer()
+
+    def write(self, b):
+        self._check('writing', self._writable)
+        if self._append:
+            self.seek(0, io.SEEK_END)
+        buf = irods_types.BorrowedBytesBuf(b)
+        try:
+            if not buf.len:
+                return 0
+            return self._callback.msiDataObjWrite(self._descriptor, buf, 0)['arguments'][2]
+        finally:
+            buf.clear_buffer()
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._check()
+        if whence not in _WHENCE:
+            raise ValueError('invalid whence ({}, should be 0, 1 or 2)'.format(whence))
+        result = self._callback.msiDataObjLseek(self._descriptor, str(offset), _WHENCE[whence], 0)
+        return result['arguments'][3].offset
+
+    def tell(self):
+        return self.seek(0, io.SEEK_CUR)
+
+    def close(self):
+        if not self.closed:
+            try:
+                self._callback.msiDataObjClose(self._descriptor, 0)
+            finally:
+                super(DataObjectIO, self).close()
+
+    def _check(self, operation=None, allowed=True):
+        if self.closed:
+            raise ValueError('I/O operation on closed data object')
+        if not allowed:
+            raise io.UnsupportedOperation('Data object not open for ' + operation)
+
+
+def open_data_object(callback, path, mode='r', buffer_size=DEFAULT_BUFFER_SIZE, resource=None, replica_number=None):
+    """Opens a data object, and returns a buffered, file-like object for it.
+
+    Reads are made buffer_size bytes at a time (reads of at least that size go directly to the data
+    object), and writes are collected until buffer_size bytes are pending, so that small reads and
+    writes do not each cost a microservice call. The result is an io.BufferedReader, io.BufferedWriter
+    or io.BufferedRandom depending on mode; with buffer_size=0, the unbuffered DataObjectIO is returned.
+
+    :param callback: The callback object passed to the rule.
+    :param path: The logical path of the data object.
+    :param mode: As for DataObjectIO.
+    :param buffer_size: The read-ahead and write coalescing size in bytes.
+    :param resource: If given, the resource holding (or to hold) the replica to be opened.
+    :param replica_number: If given, the number of the replica to be opened.
+    """
+    raw = DataObjectIO(callback, path, mode, resource=resource, replica_number=replica_number)
+    if not buffer_size:
+        return raw
+    try:
+        if raw.readable() and raw.writable():
+            return io.BufferedRandom(raw, buffer_size)
+        if raw.readable():
+            return io.BufferedReader(raw, buffer_size)
+        return io.BufferedWriter(raw, buffer_size)
+    except Exception:
+        raw.close()
+        raise
+
+
+def read_chunks(callback, path, chunk_size=DEFAULT_BUFFER_SIZE, offset=0, resource=None, replica_number=None):
+    """Generator which yields the content of a data object as bytes objects of up to chunk_size bytes.
+
+    Each chunk is read with a single msiDataObjRead call. The data object is closed when the generator
+    is exhausted or closed.
+
+    :param callback: The callback object passed to the rule.
+    :param path: The logical path of the data object.
+    :param chunk_size: The maximum number of bytes in each chunk.
+    :param offset: The offset in the data object at which to start reading.
+    :param resource: If given, the resource holding the replica to be read.
+    :param replica_number: If given, the number of the replica to be read.
+    """
+    with DataObjectIO(callback, path, 'r', resource=resource, replica_number=replica_number) as data_object:
+        if offset:
+            data_object.seek(offset)
+        while True:
+            chunk = data_object.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
@@ -0,0 +1,235 @@
+import collections
+import os
+import threading
+import time
+import traceback
+
+try:
+    from plugin_wrappers import call_as_rule as _call_as_rule
+except ImportError:
+    # Outside the plugin, e.g. in the offline benchmarks
+    def _call_as_rule(function):
+        return function()
+
+__all__ = [
+    "enqueue",
+    "configure",
+    "stats",
+    "drain",
+    "shutdown",
+    "DEFAULT_MAX_QUEUED",
+]
+
+# Number of work items which may be waiting at the same time, unless changed with configure().
+DEFAULT_MAX_QUEUED = 1024
+
+_NO_KEY = object()
+
+
+class _WorkQueue(object):
+
+    def __init__(self, max_queued):
+        self.max_queued = max_queued
+        self.condition = threading.Condition()
+        # key -> [function, args, kwargs, enqueue time]. Items without a key get a unique one.
+        self.items = collections.OrderedDict()
+        self.worker = None
+        # Held while an item runs, by the worker or by a thread calling drain()
+        self.run_lock = threading.Lock()
+        self.pid = os.getpid()
+        self.running = 0
+        self.stopping = False
+        self.counters = dict.fromkeys(
+            ('enqueued', 'coalesced', 'rejected', 'completed', 'failed', 'max_queued_seen'), 0)
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_error = None
+
+    def enqueue(self, key, function, args, kwargs):
+        with self.condition:
+            if self.stopping:
+                self.counters['rejected'] += 1
+                return False
+            item = self.items.get(key)
+            if item is not None:
+                # Keeps the position and enqueue time of the waiting item, with the latest arguments.
+                item[:3] = function, args, kwargs
+                self.counters['coalesced'] += 1
+                return True
+            if len(self.items) >= self.max_queued:
+                self.counters['rejected'] += 1
+                return False
+            self.items[key if key is not _NO_KEY else object()] = [function, args, kwargs, time.monotonic()]
+            self.counters['enqueued'] += 1
+            self.counters['max_queued_seen'] = max(self.counters['max_queued_seen'], len(self.items))
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._run, name='deferred_work', daemon=True)
+                self.worker.start()
+            self.condition.notify()
+            return True
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.items:
+                    if self.stopping:
+                        self.worker = None
+                        self.condition.notify_all()
+                        return
+                    self.condition.wait()
+            # Takes the plugin's lock (in serialized mode) before taking an item, so that a rule calling
+            # drain() while holding the lock runs the waiting items itself instead of waiting for this thread.
+            _call_as_rule(self._run_next)
+
+    def _run_next(self):
+        """Runs the first waiting item, if any. Returns False if there was none."""
+        with self.run_lock:
+            with self.condition:
+                if not self.items:
+                    return False
+                _, (function, args, kwargs, enqueued_at) = self.items.popitem(last=False)
+                self.running += 1
+
+            failed = False
+            try:
+                function(*args, **kwargs)
+            except Exception:
+                failed = True
+                error = traceback.format_exc()
+
+            latency = time.monotonic() - enqueued_at
+            with self.condition:
+                self.running -= 1
+                self.counters['failed' if failed else 'completed'] += 1
+                if failed:
+                    self.last_error = error
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+                self.condition.notify_all()
+            return True
+
+    def drain(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        # Runs the waiting items on this thread, as the worker may be waiting for the plugin's lock, which
+        # the caller may hold.
+        while deadline is None or time.monotonic() < deadline:
+            if not self._run_next():
+                break
+        with self.condition:
+            while self.items or self.running:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            return True
+
+    def shutdown(self, timeout):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        drained = self.drain(timeout)
+        with self.condition:
+            abandoned = len(self.items)
+            self.items.clear()
+            self.counters['rejected'] += abandoned
+        return drained
+
+    def stats(self):
+        with self.condition:
+            finished = self.counters['completed'] + self.counters['failed']
+            result = dict(self.counters)
+            result.update(
+                queued=len(self.items),
+                running=self.running,
+                max_queued=self.max_queued,
+                mean_latency=self.total_latency / finished if finished else 0.0,
+                max_latency=self.max_latency,
+                last_error=self.last_error,
+            )
+            return result
+
+
+_queue = _WorkQueue(DEFAULT_MAX_QUEUED)
+
+
+def _reset_after_fork():
+    # The worker thread does not exist in a forked child; its queue starts out empty.
+    global _queue
+    _queue = _WorkQueue(_queue.max_queued)
+
+
+def _current_queue():
+    # Python 3.6 has no os.register_at_fork, so a queue inherited from the parent of a forked process is
+    # only replaced when it is next used.
+    if _queue.pid != os.getpid():
+        _reset_after_fork()
+    return _queue
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def enqueue(function, *args, key=_NO_KEY, **kwargs):
+    """Queues function(*args, **kwargs) to be called by a background thread of the agent, after
+    the rule which queued it has returned. Returns False if the item was not queued because the
+    queue is full or being shut down.
+
+    Items run one at a time, in the order they were queued, as rules do: holding the plugin's
+    lock in its serialized execution mode. They run without the callback object or rei of the
+    rule that queued them, which are no longer valid by then. Anything they need from either
+    must be passed as arguments.
+
+    If key is given and an item with the same key is still waiting, that item is called with
+    the new function and arguments instead (keeping its place in the queue), and no item is
+    added. Without a key, identical calls (same function and arguments, if hashable) are
+    coalesced in the same way.
+
+    :param function: The callable to call.
+    :param key: A hashable value identifying items which replace each other, or None for an
+                item which never coalesces.
+    """
+    if key is _NO_KEY:
+        key = (function, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            key = _NO_KEY
+    elif key is None:
+        key = _NO_KEY
+    return _current_queue().enqueue(key, function, args, kwargs)
+
+
+def configure(max_queued=DEFAULT_MAX_QUEUED):
+    """Sets the maximum number of items which may be waiting at the same time.
+
+    :param max_queued: Further items are rejected by enqueue while this many are waiting.
+    """
+    queue = _current_queue()
+    with queue.condition:
+        queue.max_queued = max_queued
+
+
+def stats():
+    """Returns a dict of counters and the current state of the queue:
+
+    queued, running, max_queued: Items waiting, being called (0 or 1), and the bound on queued.
+    max_queued_seen: The largest number of items waiting at the same time.
+    enqueued, coalesced, rejected: Calls to enqueue which added, updated and did not add an item.
+    completed, failed: Items which returned, and which raised an exception.
+    mean_latency, max_latency: Seconds from enqueueing to the end of the call, for finished items.
+    last_error: The traceback of the last exception raised by an item, or None.
+    """
+    return _current_queue().stats()
+
+
+def drain(timeout=None):
+    """Runs the waiting items on the calling thread, then waits until no item is running. Returns
+    False if timeout seconds passed first."""
+    return _current_queue().drain(timeout)
+
+
+def shutdown(timeout=None):
+    """Rejects further items, and waits for the queued ones as drain() does. Items still waiting
+    when timeout seconds have passed are discarded. Called by the plugin when it stops."""
+    return _current_queue().shutdown(timeout)
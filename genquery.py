@@ -1,23 +1,45 @@
 import itertools
 import re
+import threading
+import time
 from collections import OrderedDict
 from enum import Enum
+import irods_log
 from irods_errors import END_OF_RESULTSET
 
+try:
+    from plugin_wrappers import CallbackWrapper as _CallbackWrapper, genquery2_fetch_rows as _genquery2_fetch_rows
+except ImportError:
+    _CallbackWrapper = _genquery2_fetch_rows = None
+
 def AUTO_CLOSE_QUERIES(): return True
 
 __all__ = [
     "Query",
     "row_iterator",
     "paged_iterator",
+    "keyset_iterator",
+    "key_ranges",
+    "QueryCache",
+    "query_cache",
+    "cached_query",
+    "PreparedQuery",
+    "prepare",
     "AS_DICT",
     "AS_LIST",
     "AS_TUPLE",
+    "AS_COLUMNS",
 ]
 
 MAX_SQL_ROWS = 256
 
-# An optimization for the GenQuery2 implementation.
+# Number of GenQuery2 rows fetched from the server agent at a time.
+GENQUERY2_ROWS_PER_BATCH = 1024
+
+# Number of PreparedQuery objects kept by prepare().
+PREPARED_QUERY_CACHE_SIZE = 128
+
+# Identifies END_OF_RESULTSET in the message of a RuntimeError without a code attribute.
 _END_OF_RESULTSET_ERROR_STRING_PART = f':{END_OF_RESULTSET}]'
 
 class Option(object):
@@ -40,6 +62,7 @@ class row_return_type (object):
 class AS_DICT  (row_return_type): pass
 class AS_LIST  (row_return_type): pass
 class AS_TUPLE (row_return_type): pass
+class AS_COLUMNS (row_return_type): pass
 
 class Parser(Enum):
     """Available GenQuery parsers."""
@@ -57,7 +80,7 @@ class Query(object):
     :param callback:       iRODS callback
     :param columns:        a list of SELECT column names, or columns as a comma-separated string.
     :param conditions:     (optional) where clause, as a string
-    :param output:         (optional) [default=AS_TUPLE] either AS_DICT/AS_LIST/AS_TUPLE
+    :param output:         (optional) [default=AS_TUPLE] either AS_DICT/AS_LIST/AS_TUPLE/AS_COLUMNS
     :param offset:         (optional) starting row (0-based), can be used for pagination
     :param limit:          (optional) maximum amount of results, can be used for pagination
     :param case_sensitive: (optional) set this to False to make the entire where-clause case insensitive
@@ -70,7 +93,8 @@ class Query(object):
       This is an experimental parser and may change in the future.
 
       When used, the following applies:
-        - The "output", "case_sensitive", and "options" constructor parameters are ignored
+        - The "case_sensitive" and "options" constructor parameters are ignored
+        - The "output" constructor parameter is ignored, unless it is AS_COLUMNS
         - The "total_rows()" member function always returns None
 
       Some features of GenQuery2 cannot be expressed via this interface (e.g. GROUP BY). If
@@ -87,6 +111,9 @@ class Query(object):
       AS_TUPLE produces a tuple, similar to AS_LIST, with the exception that
       for queries on single columns, each result is returned as a string
       instead of a 1-element tuple.
+      AS_COLUMNS produces one list per page of results (at most MAX_SQL_ROWS
+      rows), holding one list of values per column. Fetching a page this way
+      avoids building a Python object for each row.
 
     Examples:
 
@@ -104,6 +131,11 @@ class Query(object):
         # ... or get data object paths
         datas = ['{}/{}'.format(x, y) for x, y in Query(callback, 'COLL_NAME, DATA_NAME')]
 
+        # Sum data object sizes a page at a time.
+        total = 0
+        for sizes, in Query(callback, 'DATA_SIZE', output=AS_COLUMNS):
+            total += sum(map(int, sizes))
+
         # Print the first 200-299 of data objects ordered descending by data
         # name, owned by a username containing 'r' or 'R', in a collection
         # under (case-insensitive) '/TEMPzone/'.
@@ -159,7 +191,7 @@ class Query(object):
         # The conditions string used in query (possibly uppercased). Appears in SQL-ish str(self) but not repr(self)
         self.conditions_for_exec = conditions
 
-        if self.output not in (AS_TUPLE, AS_LIST, AS_DICT):
+        if self.output not in (AS_TUPLE, AS_LIST, AS_DICT, AS_COLUMNS):
             raise GenQuery_Row_Return_Type_Error()
 
         if case_sensitive:
@@ -174,6 +206,10 @@ class Query(object):
         # Filled when calling total_rows() on the Query.
         self._total = None
 
+        # (PreparedQuery, bound values) when made by PreparedQuery.query(). Its GenQueryInp is then
+        # taken from the PreparedQuery instead of being built by msiMakeGenQuery.
+        self._prepared = None
+
     def __repr__(self, **kw):
         return "Query(\n\t" + ",\n\t".join(
             name + "=" + ( repr(getattr(self,name)) if name != 'output' else self.output.__name__ )
@@ -219,9 +255,12 @@ class Query(object):
             # since query keywords are case insensitive as well.
             self.conditions_for_exec = self.conditions.upper()
         import irods_types
-        self.gqi = self.callback.msiMakeGenQuery(', '.join(self.columns),
-                                                 self.conditions_for_exec,
-                                                 irods_types.GenQueryInp())['arguments'][2]
+        if self._prepared is not None:
+            self.gqi = self._prepared[0]._acquire(self.callback, self._prepared[1])
+        else:
+            self.gqi = self.callback.msiMakeGenQuery(', '.join(self.columns),
+                                                     self.conditions_for_exec,
+                                                     irods_types.GenQueryInp())['arguments'][2]
         if self.offset > 0:
             self.gqi.rowOffset = self.offset
         else:
@@ -276,23 +315,14 @@ class Query(object):
         self.exec_if_not_yet_execed()
 
         if self.parser == Parser.GENQUERY2:
-            column_count = len(self.columns)
+            rows_per_batch = MAX_SQL_ROWS if self.output == AS_COLUMNS else GENQUERY2_ROWS_PER_BATCH
 
-            while True:
+            for rows in self._gq2_row_batches(rows_per_batch):
                 try:
-                    self.callback.msi_genquery2_next_row(self.gq2_handle)
-                except RuntimeError as e:
-                    if _END_OF_RESULTSET_ERROR_STRING_PART in str(e):
-                        break
-                    raise
-
-                row = []
-                for c in range(column_count):
-                    ret = self.callback.msi_genquery2_column(self.gq2_handle, str(c), '')
-                    row.append(ret['arguments'][2])
-
-                try:
-                    yield row
+                    if self.output == AS_COLUMNS:
+                        yield [list(column) for column in zip(*rows)]
+                    else:
+                        yield from rows
                 except GeneratorExit:
                     self._close()
                     return
@@ -304,21 +334,32 @@ class Query(object):
         # Iterate until all rows are fetched / the query is aborted.
         while True:
             try:
-                # Iterate over a set of rows.
-                for r in range(self.gqo.rowCnt):
-                    if self.limit is not None and row_i >= self.limit:
-                        self._close()
-                        return
-
-                    row = [self.gqo.sqlResult[c].row(r) for c in range(len(self.columns))]
-                    row_i += 1
+                # Iterate over a set of rows, all of which are fetched from the page in one call.
+                if self.output == AS_COLUMNS:
+                    page = self.gqo.columns()
+                    if self.limit is not None and row_i + self.gqo.rowCnt > self.limit:
+                        page = [column[:self.limit - row_i] for column in page]
+                    if page and page[0]:
+                        row_i += len(page[0])
+                        yield page
+                else:
+                    page = self.gqo.rows()
+                    if self.limit is not None:
+                        del page[self.limit - row_i:]
+                    row_i += len(page)
 
                     if self.output == AS_TUPLE:
-                        yield row[0] if len(self.columns) == 1 else tuple(row)
+                        if len(self.columns) == 1:
+                            for row in page:
+                                yield row[0]
+                        else:
+                            for row in page:
+                                yield tuple(row)
                     elif self.output == AS_LIST:
-                        yield row
+                        yield from page
                     else:
-                        yield OrderedDict(zip(self.columns, row))
+                        for row in page:
+                            yield OrderedDict(zip(self.columns, row))
 
             except GeneratorExit:
                 self._close()
@@ -330,6 +371,48 @@ class Query(object):
 
             self._fetch()
 
+    def _gq2_row_batches(self, rows_per_batch):
+        """Yields the GenQuery2 resultset as lists of up to rows_per_batch rows.
+
+        Rows are fetched by the plugin a batch at a time when possible, which avoids
+        a round trip through the callback object for every row and column.
+        """
+        column_count = len(self.columns)
+
+        if _genquery2_fetch_rows is not None and isinstance(self.callback, _CallbackWrapper):
+            fetch = lambda: _genquery2_fetch_rows(self.callback, self.gq2_handle, column_count, rows_per_batch)
+        else:
+            fetch = lambda: self._gq2_fetch_rows(column_count, rows_per_batch)
+
+        while True:
+            rows = fetch()
+            if rows:
+                yield rows
+            if len(rows) < rows_per_batch:
+                return
+
+    def _gq2_fetch_rows(self, column_count, max_rows):
+        """Fetches up to max_rows GenQuery2 rows through the callback object, one cell at a time."""
+        rows = []
+
+        while len(rows) < max_rows:
+            try:
+                self.callback.msi_genquery2_next_row(self.gq2_handle)
+            except RuntimeError as e:
+                # The plugin raises irods_errors.CallbackError, which carries the code; the message
+                # is only checked for callback objects that raise a plain RuntimeError.
+                if getattr(e, 'code', None) == END_OF_RESULTSET or _END_OF_RESULTSET_ERROR_STRING_PART in str(e):
+                    break
+                raise
+
+            row = []
+            for c in range(column_count):
+                ret = self.callback.msi_genquery2_column(self.gq2_handle, str(c), '')
+                row.append(ret['arguments'][2])
+            rows.append(row)
+
+        return rows
+
     def _fetch(self):
         """Fetch the next batch of results.
 
@@ -359,6 +442,7 @@ class Query(object):
             return
 
         if not self.cti:
+            self._release_prepared()
             return
 
         # msiCloseGenQuery fails with internal errors.
@@ -373,11 +457,19 @@ class Query(object):
             self.gqi.options |= Option.AUTO_CLOSE
             self._fetch()
 
+        self._release_prepared()
+
         # Mark self as closed.
         self.gqi = None
         self.gqo = None
         self.cti = None
 
+    def _release_prepared(self):
+        """Hands the GenQueryInp of a prepared query back to its PreparedQuery, once the query is done with it."""
+        if self._prepared is not None and self.gqi is not None:
+            self._prepared[0]._release(self.gqi)
+        self._prepared = None
+
     def close(self):
         """Close the query.
 
@@ -408,6 +500,551 @@ class Query(object):
         self._close()
 
 
+def _quote_value(value, parser):
+    """Returns str(value) as a quoted value for a condition of parser.
+
+    GenQuery1 has no way of escaping single quotes, so values holding one raise ValueError. With
+    GenQuery2, single quotes are doubled and backslashes hex-encoded.
+    """
+    value = str(value)
+    if parser == Parser.GENQUERY1:
+        if "'" in value:
+            raise ValueError('GenQuery1 values cannot contain single quotes: {!r}'.format(value))
+        return "'" + value + "'"
+    return "'" + value.replace('\\', '\\x5c').replace("'", "''") + "'"
+
+
+# ::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
+# :::::            keyset (seek) pagination iterator             :::::
+# ::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
+
+
+class keyset_iterator(object):
+    """Iterates over a query a page at a time, resuming each page after the last key seen.
+
+    Unlike paging with Query's offset parameter, which makes the catalog skip over all
+    preceding rows for every page, each page is a separate query restricted to the rows
+    whose key is greater than the last key of the previous page. The cost of a page
+    therefore does not grow with its position in the result set.
+
+    :param callback:      iRODS callback
+    :param columns:       a list of SELECT column names, or columns as a comma-separated string
+    :param key_column:    (optional) [default='DATA_ID'] column to page on. Its values must be unique
+                          among the rows of the result set, e.g. DATA_ID when no replica columns are selected
+    :param conditions:    (optional) where clause, as a string
+    :param output:        (optional) [default=AS_TUPLE] either AS_DICT/AS_LIST/AS_TUPLE/AS_COLUMNS
+    :param rows_per_page: (optional) number of rows requested by each query
+    :param key_range:     (optional) (after, upto) tuple restricting the keys to after < key <= upto.
+                          Either bound may be None. See key_ranges().
+    :param parser:        (optional) the GenQuery engine to use. Defaults to Parser.GENQUERY1
+
+    Rows are produced in ascending key order. The key column is selected whether or not it is
+    listed in columns, but only appears in the results if it is. The key of the last row of the
+    last page consumed in full is available as the last_key attribute, which can be passed as
+    the lower bound of key_range to resume an interrupted scan. Keys are quoted in the conditions
+    of each page as the values of a PreparedQuery are: with GenQuery1, a key holding a single
+    quote raises ValueError.
+
+    Example:
+
+        for coll_name, data_name in keyset_iterator(callback, 'COLL_NAME, DATA_NAME'):
+            pass
+    """
+
+    def __init__(self,
+                 callback,
+                 columns,
+                 key_column='DATA_ID',
+                 conditions='',
+                 output=AS_TUPLE,
+                 rows_per_page=1024,
+                 key_range=None,
+                 parser=Parser.GENQUERY1):
+
+        if isinstance(columns, str):
+            columns = [x.strip() for x in columns.split(',') if x.strip()]
+        else:
+            columns = list(columns)
+
+        if output not in (AS_TUPLE, AS_LIST, AS_DICT, AS_COLUMNS):
+            raise GenQuery_Row_Return_Type_Error()
+
+        self.callback      = callback
+        self.columns       = columns
+        self.key_column    = key_column
+        self.conditions    = conditions
+        self.output        = output
+        self.rows_per_page = max(1, int(rows_per_page))
+        self.parser        = parser
+        self.last_key, self.upto = key_range if key_range is not None else (None, None)
+
+        # The key column is selected (and, for GenQuery1, ordered on) in its position in
+        # columns if it is there, otherwise it is selected first and dropped from the results.
+        self._selected_columns = list(columns)
+        if key_column in columns:
+            self._key_index = columns.index(key_column)
+            self._result_columns = None
+        else:
+            self._selected_columns.insert(0, key_column)
+            self._key_index = 0
+            self._result_columns = slice(1, None)
+
+        if parser == Parser.GENQUERY1:
+            self._selected_columns[self._key_index] = 'ORDER({})'.format(key_column)
+
+    def __iter__(self):
+        after = self.last_key
+
+        while True:
+            page = self._next_page(after)
+            if not page:
+                return
+
+            after = page[-1][self._key_index]
+
+            if self._result_columns is not None:
+                page = [row[self._result_columns] for row in page]
+
+            if self.output == AS_COLUMNS:
+                yield [list(column) for column in zip(*page)]
+            elif self.output == AS_LIST:
+                yield from page
+            elif self.output == AS_DICT:
+                for row in page:
+                    yield OrderedDict(zip(self.columns, row))
+            elif len(self.columns) == 1:
+                for row in page:
+                    yield row[0]
+            else:
+                for row in page:
+                    yield tuple(row)
+
+            self.last_key = after
+
+            if len(page) < self.rows_per_page:
+                return
+
+    def _next_page(self, after):
+        conditions = [self.conditions] if self.conditions else []
+        if after is not None:
+            conditions.append('{} > {}'.format(self.key_column, _quote_value(after, self.parser)))
+        if self.upto is not None:
+            conditions.append('{} <= {}'.format(self.key_column, _quote_value(self.upto, self.parser)))
+
+        query = Query(self.callback,
+                      self._selected_columns,
+                      ' and '.join(conditions),
+                      output=AS_LIST,
+                      limit=self.rows_per_page,
+                      parser=self.parser,
+                      order_by=self.key_column if self.parser == Parser.GENQUERY2 else '')
+        try:
+            return list(query)
+        finally:
+            query.close()
+
+
+def key_ranges(callback, key_column='DATA_ID', conditions='', partitions=2, parser=Parser.GENQUERY1):
+    """Splits the values of an integer key column into contiguous ranges for keyset_iterator.
+
+    Returns a list of up to partitions (after, upto) tuples, to be passed as the key_range
+    argument of keyset_iterator, so that each range can be scanned independently (e.g. by
+    separate delay rules). The ranges are of equal width between the smallest and largest
+    key matching conditions. The first range has no lower bound and the last range no upper
+    bound, so rows added after the ranges were computed are not missed. Returns an empty
+    list if no rows match.
+    """
+    low, high = Query(callback,
+                      ['MIN({})'.format(key_column), 'MAX({})'.format(key_column)],
+                      conditions,
+                      output=AS_LIST,
+                      parser=parser).first() or ('', '')
+    if low == '' or high == '':
+        return []
+
+    after, upto = int(low) - 1, int(high)
+    partitions = max(1, min(int(partitions), upto - after))
+    width = -(-(upto - after) // partitions)
+
+    bounds = [after + i * width for i in range(1, partitions) if after + i * width < upto]
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+# ::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
+# :::::                    query result cache                    :::::
+# ::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
+
+
+class QueryCache(object):
+    """Size-bounded LRU cache of query results, with a time-to-live for each entry.
+
+    Meant for small lookups that rules repeat many times within an agent (e.g. resource
+    hierarchies or group membership), not for large result sets, as each entry holds all
+    rows of its query.
+
+    :param max_entries: (optional) maximum number of queries whose results are kept
+    :param ttl:         (optional) default number of seconds a result stays valid
+
+    Queries are identified by their columns, conditions (ignoring whitespace outside quoted
+    values), output type, offset, limit, case sensitivity, options, parser and order-by clause,
+    and by the client and proxy users (with their zones) of the session running them, as the
+    catalog returns different rows to different users. Results are therefore never shared
+    between users, even within one agent (e.g. the delay server running rules of several
+    users); the user identity must come from the rei of the rule making the query, see
+    session_user(). Results are returned as new lists, so callers may modify them freely.
+
+    Rules which modify the catalog can drop stale results with invalidate(), e.g. from a
+    metadata-modifying PEP:
+
+        def pep_api_mod_avu_metadata_post(rule_args, callback, rei):
+            genquery.query_cache.invalidate(prefix='META_')
+    """
+
+    __quoted_value = re.compile(r"('[^']*')")
+    __identifier = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+    def __init__(self, max_entries=256, ttl=60.0):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expiry time, referenced column names, rows)
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(('hits', 'misses', 'expirations', 'evictions', 'invalidations', 'uncached'), 0)
+
+    def fetch(self, query, user, ttl=None):
+        """Returns the results of query as a list, running it only if no valid result is cached.
+
+        :param query: a Query object. It is not iterated itself, a copy of it is.
+        :param user:  the users of the session running query, as returned by session_user(rei).
+                      If None, the query is run without the cache.
+        :param ttl:   (optional) number of seconds the result stays valid, instead of the cache's ttl
+        """
+        if query.output == AS_COLUMNS:
+            raise GenQuery_Row_Return_Type_Error('AS_COLUMNS results cannot be cached')
+
+        if user is None:
+            with self._lock:
+                self._stats['uncached'] += 1
+            return self._run(query)
+
+        key = (user, self._key(query))
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return self._format(query, entry[2])
+                del self._entries[key]
+                self._stats['expirations'] += 1
+            self._stats['misses'] += 1
+
+        rows = self._rows(query)
+
+        expiry = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expiry, self._referenced_columns(query), rows)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+        return self._format(query, rows)
+
+    @staticmethod
+    def session_user(rei):
+        """Returns the (client user, client zone, proxy user, proxy zone) of the session of rei.
+
+        Returns None if rei holds neither a client nor a proxy user.
+        """
+        def user(user_struct, rs_comm_attribute):
+            if user_struct is None and rei.rsComm is not None:
+                user_struct = getattr(rei.rsComm, rs_comm_attribute)
+            if user_struct is None:
+                return (None, None)
+            return (str(user_struct.userName), str(user_struct.rodsZone))
+
+        identity = user(rei.uoic, 'clientUser') + user(rei.uoip, 'proxyUser')
+        return identity if any(identity) else None
+
+    def invalidate(self, prefix=None, column=None):
+        """Drops cached results of queries referring to a column.
+
+        :param prefix: (optional) drop results of queries referring to any column starting with prefix
+        :param column: (optional) drop results of queries referring to this column
+
+        Columns referred to in conditions count as well as selected columns. With neither argument,
+        all cached results are dropped. Returns the number of results dropped.
+        """
+        def matches(names):
+            if prefix is None and column is None:
+                return True
+            return column in names or (prefix is not None and any(name.startswith(prefix) for name in names))
+
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if matches(entry[1])]
+            for key in keys:
+                del self._entries[key]
+            self._stats['invalidations'] += len(keys)
+
+        return len(keys)
+
+    def clear(self):
+        """Drops all cached results."""
+        return self.invalidate()
+
+    def stats(self):
+        """Returns a dict of the cache's hit, miss, expiration, eviction, invalidation and uncached counts and its size."""
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+    def _key(self, query):
+        conditions = ''.join(
+            part if i % 2 else ' '.join(part.split())
+            for i, part in enumerate(self.__quoted_value.split(query.conditions)))
+        return (tuple(column.strip() for column in query.columns),
+                conditions,
+                query.output,
+                query.offset,
+                query.limit,
+                query.case_sensitive,
+                query.options,
+                query.parser,
+                query.order_by)
+
+    def _referenced_columns(self, query):
+        names = set()
+        for column in query.columns:
+            names.update(self.__identifier.findall(column))
+        names.update(self.__identifier.findall(self.__quoted_value.sub('', query.conditions)))
+        return frozenset(names)
+
+    @staticmethod
+    def _rows(query):
+        q = query.copy(output=AS_LIST)
+        try:
+            return [tuple(row) for row in q]
+        finally:
+            q.close()
+
+    @classmethod
+    def _run(cls, query):
+        return cls._format(query, cls._rows(query))
+
+    @staticmethod
+    def _format(query, rows):
+        if query.output == AS_LIST:
+            return [list(row) for row in rows]
+        if query.output == AS_DICT:
+            return [OrderedDict(zip(query.columns, row)) for row in rows]
+        if len(query.columns) == 1:
+            return [row[0] for row in rows]
+        return list(rows)
+
+
+# Cache shared by all rules running in an agent. Its entries are keyed by user, so that
+# results are not shared between the users whose rules run in the agent.
+query_cache = QueryCache()
+
+
+def cached_query(callback, rei, columns, conditions='', ttl=None, **options):
+    """Returns the results of Query(callback, columns, conditions, **options) as a list, from query_cache.
+
+    rei is that of the rule making the query; its client and proxy users are part of the cache key.
+    """
+    return query_cache.fetch(Query(callback, columns, conditions, **options), QueryCache.session_user(rei), ttl)
+
+
+# ::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
+# :::::                     prepared queries                     :::::
+# ::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
+
+
+class PreparedQuery(object):
+    """A query whose conditions hold ? placeholders for values, to be run many times with different values.
+
+    :param columns:    a list of SELECT column names, or columns as a comma-separated string
+    :param conditions: (optional) where clause, as a string, with a ? in place of each quoted value
+    :param options:    (optional) other Query keyword arguments (output, offset, limit, case_sensitive,
+                       options, parser, order_by)
+
+    query(callback, *values) returns a Query for the values, which is used as any other Query. Each
+    value is converted with str() and quoted for the parser, so placeholders are written without quotes.
+
+    With GenQuery1, the GenQueryInp built by msiMakeGenQuery for the first execution is kept and
+    reused by later executions, with only the values of its conditions replaced. Values may not
+    contain single quotes, as GenQuery1 has no way of escaping them. With GenQuery2, single quotes in
+    values are escaped by doubling them, and backslashes are hex-encoded.
+
+    Use prepare() rather than this class directly, to share prepared queries between rules.
+
+    Example:
+
+        find_data = prepare('DATA_ID, DATA_SIZE', "COLL_NAME = ? and DATA_NAME = ?")
+        for coll_name, data_name in paths:
+            row = find_data.query(callback, coll_name, data_name).first()
+    """
+
+    # Quoted values (which may hold a '?'), or placeholders
+    __placeholder = re.compile(r"'(?:[^']|'')*'|\?")
+    # Options which may be changed for each execution, as they do not change the GenQueryInp
+    __execution_options = frozenset(('output', 'offset', 'limit'))
+    # Number of parsed GenQueryInp objects kept for reuse
+    __max_free = 4
+
+    def __init__(self, columns, conditions='', **options):
+        # Validates the arguments the way Query does
+        template = Query(None, columns, '', **options)
+
+        self.columns = template.columns
+        self.conditions = conditions
+        self.options = options
+        self.parser = template.parser
+        self._upper_case = bool(template.options & Option.UPPER_CASE_WHERE)
+
+        # The conditions around each placeholder
+        self._parts = ['']
+        end = 0
+        for match in self.__placeholder.finditer(conditions):
+            if match.group() == '?':
+                self._parts[-1] += conditions[end:match.start()]
+                self._parts.append('')
+                end = match.end()
+        self._parts[-1] += conditions[end:]
+
+        self._lock = threading.Lock()
+        self._free = []        # GenQueryInp objects not in use by a query
+        self._bindings = None  # (condition index, value template) for each condition holding a placeholder
+        self._stats = dict.fromkeys(('executions', 'parses'), 0)
+
+    @property
+    def placeholder_count(self):
+        return len(self._parts) - 1
+
+    def query(self, callback, *values, **options):
+        """Returns a Query with the values bound to the placeholders, in order.
+
+        :param options: (optional) output, offset or limit, overriding those of the PreparedQuery
+        """
+        if len(values) != len(self._parts) - 1:
+            raise ValueError('expected {} values, got {}'.format(len(self._parts) - 1, len(values)))
+        if options:
+            incorrect = [name for name in options if name not in self.__execution_options]
+            if incorrect:
+                raise GenQuery_Options_Spec_Error('Options which cannot be changed for a prepared query: ' +
+                                                  ', '.join(incorrect))
+            options = dict(self.options, **options)
+        else:
+            options = self.options
+
+        values = [str(value) for value in values]
+        if self.parser == Parser.GENQUERY1:
+            if self._upper_case:
+                values = [value.upper() for value in values]
+            quoted = [_quote_value(value, self.parser) for value in values]
+            q = Query(callback, self.columns, self._render(quoted), **options)
+            q._prepared = (self, values)
+        else:
+            q = Query(callback, self.columns, self._render([_quote_value(value, self.parser) for value in values]),
+                      **options)
+
+        with self._lock:
+            self._stats['executions'] += 1
+        return q
+
+    def stats(self):
+        """Returns a dict of the number of queries made, of the times msiMakeGenQuery was called for them,
+        and of the parsed GenQueryInp objects waiting to be reused."""
+        with self._lock:
+            return dict(self._stats, free=len(self._free))
+
+    def _render(self, quoted_values):
+        return ''.join(part + value for part, value in zip(self._parts, quoted_values)) + self._parts[-1]
+
+    @staticmethod
+    def _marker(n):
+        return '__PREPARED_VALUE_{}__'.format(n)
+
+    def _acquire(self, callback, values):
+        """Returns a GenQueryInp for the values, reusing one parsed earlier if there is one not in use."""
+        with self._lock:
+            gqi = self._free.pop() if self._free else None
+
+        if gqi is None:
+            import irods_types
+            conditions = self._render(["'{}'".format(self._marker(n)) for n in range(self.placeholder_count)])
+            if self._upper_case:
+                # As Query uppercases its whole condition string. The markers are upper case already, and
+                # the values bound to them are uppercased by query().
+                conditions = conditions.upper()
+            gqi = callback.msiMakeGenQuery(', '.join(self.columns), conditions,
+                                           irods_types.GenQueryInp())['arguments'][2]
+            bindings = self._find_bindings(gqi)
+            with self._lock:
+                self._bindings = bindings
+                self._stats['parses'] += 1
+
+        for index, template in self._bindings:
+            value = template
+            for n, bound in enumerate(values):
+                value = value.replace(self._marker(n), bound)
+            gqi.sqlCondInp.set_value(index, value)
+
+        # Reset what the previous execution may have changed
+        gqi.maxRows = MAX_SQL_ROWS
+        gqi.continueInx = 0
+        gqi.rowOffset = 0
+        gqi.options = 0
+        return gqi
+
+    def _find_bindings(self, gqi):
+        bindings = []
+        found = set()
+        for index in range(gqi.sqlCondInp.len):
+            template = str(gqi.sqlCondInp.value[index])
+            markers = [n for n in range(self.placeholder_count) if self._marker(n) in template]
+            if markers:
+                bindings.append((index, template))
+                found.update(markers)
+        if len(found) != self.placeholder_count:
+            raise GenQuery_Options_Spec_Error('Placeholders must stand for values in conditions: ' + self.conditions)
+        return bindings
+
+    def _release(self, gqi):
+        with self._lock:
+            if len(self._free) < self.__max_free:
+                self._free.append(gqi)
+
+
+_prepared_queries = OrderedDict()
+_prepared_queries_lock = threading.Lock()
+
+
+def prepare(columns, conditions='', **options):
+    """Returns a PreparedQuery for columns, conditions and options.
+
+    The PREPARED_QUERY_CACHE_SIZE most recently used prepared queries are kept for the lifetime of
+    the agent, so that rules running the same query shape share one PreparedQuery, and GenQuery1
+    queries are only parsed the first time.
+    """
+    key = (columns if isinstance(columns, str) else tuple(columns), conditions, tuple(sorted(options.items())))
+
+    with _prepared_queries_lock:
+        prepared = _prepared_queries.get(key)
+        if prepared is not None:
+            _prepared_queries.move_to_end(key)
+            return prepared
+
+    prepared = PreparedQuery(columns, conditions, **options)
+    with _prepared_queries_lock:
+        prepared = _prepared_queries.setdefault(key, prepared)
+        _prepared_queries.move_to_end(key)
+        while len(_prepared_queries) > PREPARED_QUERY_CACHE_SIZE:
+            _prepared_queries.popitem(last=False)
+    return prepared
+
+
 # ::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
 # :::::               row-at-a-time query iterator               :::::
 # ::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
@@ -489,9 +1126,7 @@ class paged_iterator (object):
             except StopIteration:
                 if j == 0: raise
             except Exception as e:
-                self.callback.writeLine('serverLog',
-                  '*** UNEXPECTED Exception in genquery.py paged iterate [next()]')
-                self.callback.writeLine('serverLog','***   {!r}'.format(e))
+                irods_log.error('unexpected exception in genquery.paged_iterator.next()', exception=repr(e))
                 raise
 
             # -- truncate list size to fit the generated results
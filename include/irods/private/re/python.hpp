@@ -1,8 +1,16 @@
 #ifndef IRODS_RE_PYTHON_HPP
 #define IRODS_RE_PYTHON_HPP
 
+#include <cstddef>
+#include <list>
+#include <memory>
 #include <type_traits>
+#include <typeindex>
 #include <functional>
+#include <optional>
+#include <string_view>
+#include <unordered_map>
+#include <vector>
 
 #include <boost/any.hpp>
 #include <boost/optional.hpp>
@@ -33,6 +41,7 @@
 #include "irods/private/re/python/irods_types.hpp"
 #include "irods/private/re/python/irods_errors.hpp"
 #include "irods/private/re/python/types/array_ref.hpp"
+#include "irods/private/re/python/types/irods/rodsDef.hpp"
 
 namespace bp = boost::python;
 
@@ -101,144 +110,174 @@ const char* getMsParamStringFromType<float>()
 
 namespace
 {
+	template <class T>
+	boost::python::object object_from_msParam_struct(msParam_t& msParam)
+	{
+		return boost::python::object{*static_cast<T*>(msParam.inOutStruct)};
+	}
+
+	boost::python::object object_from_msParam_buffer(msParam_t& msParam)
+	{
+		// clang-format off
+		return msParam.inpOutBuf
+		     ? irods::re::python::types::bytes_buf_to_python(*msParam.inpOutBuf)
+		     : boost::python::object{};
+		// clang-format on
+	}
+
 	boost::python::object object_from_msParam(msParam_t& msParam)
 	{
+		using converter_type = boost::python::object (*)(msParam_t&);
+
+		// clang-format off
+		static const std::unordered_map<std::string_view, converter_type> converters{
+			{GenQueryInp_MS_T,     &object_from_msParam_struct<genQueryInp_t>},
+			{GenQueryOut_MS_T,     &object_from_msParam_struct<genQueryOut_t>},
+			{KeyValPair_MS_T,      &object_from_msParam_struct<keyValPair_t>},
+			{DataObjLseekOut_MS_T, &object_from_msParam_struct<fileLseekOut_t>},
+			{RodsObjStat_MS_T,     &object_from_msParam_struct<rodsObjStat_t>},
+			{INT_MS_T,             &object_from_msParam_struct<int>},
+			{FLOAT_MS_T,           &object_from_msParam_struct<float>},
+			{BUF_LEN_MS_T,         &object_from_msParam_buffer}
+		};
+		// clang-format on
+
 		if (!msParam.inOutStruct) {
 			return {};
 		}
 		else if (!msParam.type) {
 			THROW(SYS_NOT_SUPPORTED, "msParam type is null");
 		}
-		else if (strcmp(msParam.type, GenQueryInp_MS_T) == 0) {
-			return boost::python::object{*static_cast<genQueryInp_t*>(msParam.inOutStruct)};
-		}
-		else if (strcmp(msParam.type, GenQueryOut_MS_T) == 0) {
-			return boost::python::object{*static_cast<genQueryOut_t*>(msParam.inOutStruct)};
-		}
-		else if (strcmp(msParam.type, KeyValPair_MS_T) == 0) {
-			return boost::python::object{*static_cast<keyValPair_t*>(msParam.inOutStruct)};
-		}
-		else if (strcmp(msParam.type, DataObjLseekOut_MS_T) == 0) {
-			return boost::python::object{*static_cast<fileLseekOut_t*>(msParam.inOutStruct)};
-		}
-		else if (strcmp(msParam.type, RodsObjStat_MS_T) == 0) {
-			return boost::python::object{*static_cast<rodsObjStat_t*>(msParam.inOutStruct)};
-		}
-		else if (strcmp(msParam.type, INT_MS_T) == 0) {
-			return boost::python::object{*static_cast<int*>(msParam.inOutStruct)};
-		}
-		else if (strcmp(msParam.type, FLOAT_MS_T) == 0) {
-			return boost::python::object{*static_cast<float*>(msParam.inOutStruct)};
-		}
-		else if (strcmp(msParam.type, BUF_LEN_MS_T) == 0) {
-			// clang-format off
-			return msParam.inpOutBuf
-			     ? boost::python::object{bytesBuf_t{msParam.inpOutBuf->len, msParam.inpOutBuf->buf}}
-			     : boost::python::object{};
-			// clang-format on
-		}
-		else {
+
+		const auto converter = converters.find(msParam.type);
+		if (converter == converters.end()) {
 			THROW(SYS_NOT_SUPPORTED, boost::format("Unknown type in msParam: [%s]") % msParam.type);
 		}
+		return converter->second(msParam);
 	}
 
+	// Each msParam_from_object_impl<T> returns an msParam_t for obj if obj contains a T, and nothing otherwise.
 	template <class T>
-	msParam_t msParam_from_object_impl(boost::python::object& obj)
+	std::optional<msParam_t> msParam_from_object_impl(boost::python::object& obj)
 	{
 		boost::python::extract<T&> extr{obj};
-		if (extr.check()) {
-			return {
-				.label = nullptr,
-				.type = strdup(getMsParamStringFromType<T>()),
-				.inOutStruct = &extr(),
-				.inpOutBuf = nullptr
-			};
-		}
-		else {
-			THROW(SYS_NOT_SUPPORTED, "Attempted to extract a boost::python::object containing a non-conforming type");
+		if (!extr.check()) {
+			return std::nullopt;
 		}
+		return msParam_t{
+			.label = nullptr,
+			.type = strdup(getMsParamStringFromType<T>()),
+			.inOutStruct = &extr(),
+			.inpOutBuf = nullptr
+		};
 	}
 
 	template <>
-	msParam_t msParam_from_object_impl<int>(boost::python::object& obj)
+	std::optional<msParam_t> msParam_from_object_impl<int>(boost::python::object& obj)
 	{
 		boost::python::extract<int> extr{obj};
-		if (extr.check()) {
-			return {
-				.label = nullptr,
-				.type = strdup(getMsParamStringFromType<int>()),
-				.inOutStruct = new int{extr()},
-				.inpOutBuf = nullptr
-			};
-		}
-		else {
-			THROW(SYS_NOT_SUPPORTED, "Attempted to extract a boost::python::object containing a non-conforming type");
+		if (!extr.check()) {
+			return std::nullopt;
 		}
+		return msParam_t{
+			.label = nullptr,
+			.type = strdup(getMsParamStringFromType<int>()),
+			.inOutStruct = new int{extr()},
+			.inpOutBuf = nullptr
+		};
 	}
 
 	template <>
-	msParam_t msParam_from_object_impl<float>(boost::python::object& obj)
+	std::optional<msParam_t> msParam_from_object_impl<float>(boost::python::object& obj)
 	{
 		boost::python::extract<float> extr{obj};
-		if (extr.check()) {
-			return {
-				.label = nullptr,
-				.type = strdup(getMsParamStringFromType<float>()),
-				.inOutStruct = new float{extr()},
-				.inpOutBuf = nullptr
-			};
-		}
-		else {
-			THROW(SYS_NOT_SUPPORTED, "Attempted to extract a boost::python::object containing a non-conforming type");
+		if (!extr.check()) {
+			return std::nullopt;
 		}
+		return msParam_t{
+			.label = nullptr,
+			.type = strdup(getMsParamStringFromType<float>()),
+			.inOutStruct = new float{extr()},
+			.inpOutBuf = nullptr
+		};
 	}
 
 	template <>
-	msParam_t msParam_from_object_impl<bytesBuf_t>(boost::python::object& obj)
+	std::optional<msParam_t> msParam_from_object_impl<bytesBuf_t>(boost::python::object& obj)
 	{
 		boost::python::extract<bytesBuf_t> extr{obj};
-		if (extr.check()) {
-			bytesBuf_t buf = extr();
-			return {
-				.label = nullptr,
-				.type = strdup(getMsParamStringFromType<bytesBuf_t>()),
-				.inOutStruct = new int{buf.len},
-				.inpOutBuf = new bytesBuf_t{buf}
-			};
-		}
-		else {
-			THROW(SYS_NOT_SUPPORTED, "Attempted to extract a boost::python::object containing a non-conforming type");
+		if (!extr.check()) {
+			return std::nullopt;
 		}
+		bytesBuf_t buf = extr();
+		return msParam_t{
+			.label = nullptr,
+			.type = strdup(getMsParamStringFromType<bytesBuf_t>()),
+			.inOutStruct = new int{buf.len},
+			.inpOutBuf = new bytesBuf_t{buf}
+		};
 	}
 
 	template <>
-	msParam_t msParam_from_object_impl<msParam_t>(boost::python::object& obj)
+	std::optional<msParam_t> msParam_from_object_impl<msParam_t>(boost::python::object& obj)
 	{
 		boost::python::extract<msParam_t&> extr{obj};
-		if (extr.check()) {
-			return extr();
-		}
-		else {
-			THROW(SYS_NOT_SUPPORTED, "Attempted to extract a boost::python::object containing a non-conforming type");
+		if (!extr.check()) {
+			return std::nullopt;
 		}
+		return extr();
 	}
-} //namespace
 
-template <class T>
-msParam_t msParam_from_object(boost::python::object& obj)
-{
-	return msParam_from_object_impl<T>(obj);
-}
+	// The Python type whose instances msParam_from_object_impl<T> always accepts, or nullptr if
+	// T has not been exposed to Python (yet).
+	template <class T>
+	const PyTypeObject* python_type_of()
+	{
+		return boost::python::converter::registered<T>::converters.m_class_object;
+	}
+
+	template <>
+	const PyTypeObject* python_type_of<int>()
+	{
+		return &PyLong_Type;
+	}
+
+	template <>
+	const PyTypeObject* python_type_of<float>()
+	{
+		return &PyFloat_Type;
+	}
+} //namespace
 
-template <class T1, class T2, class... Ts>
+// Converts a Python object to an msParam_t holding the first of Ts that the object contains.
+//
+// The conversion is looked up by the object's exact Python type. Objects of other types (e.g. subclasses)
+// are offered to each of Ts in order. Fails with SYS_NOT_SUPPORTED if none of Ts accept the object.
+template <class... Ts>
 msParam_t msParam_from_object(boost::python::object& obj)
 {
-	try {
-		return msParam_from_object_impl<T1>(obj);
+	using converter_type = std::optional<msParam_t> (*)(boost::python::object&);
+
+	static const auto converters = [] {
+		std::unordered_map<const PyTypeObject*, converter_type> converters;
+		// emplace keeps the first of Ts for a Python type, as probing in order would
+		(converters.emplace(python_type_of<Ts>(), &msParam_from_object_impl<Ts>), ...);
+		converters.erase(nullptr);
+		return converters;
+	}();
+
+	std::optional<msParam_t> msParam;
+	if (const auto converter = converters.find(Py_TYPE(obj.ptr())); converter != converters.end()) {
+		msParam = converter->second(obj);
+	}
+	if (!msParam) {
+		// Offer obj to each of Ts in order, stopping at the first which accepts it
+		static_cast<void>((... || (msParam = msParam_from_object_impl<Ts>(obj))));
 	}
-	catch (const irods::exception&) {
-		return msParam_from_object<T2, Ts...>(obj);
+	if (!msParam) {
+		THROW(SYS_NOT_SUPPORTED, "Attempted to extract a boost::python::object containing a non-conforming type");
 	}
+	return *msParam;
 }
 
 //for value types
@@ -438,4 +477,314 @@ boost::python::object object_from_any(boost::any& arg)
 	}
 }
 
+// Arguments of exec_rule which are passed by (non-const) pointer to a wrapped class are exposed to the
+// rule as proxies of the C++ objects, rather than as copies of them. A BytesBuf exposes its memory through
+// the buffer protocol, where a proxy cannot check that it is still valid, so it is copied as before.
+template <typename T>
+constexpr bool is_proxied_argument_v = std::is_class_v<T> && !std::is_const_v<T> &&
+                                       !std::is_same_v<T, std::string> && !std::is_same_v<T, bytesBuf_t>;
+
+// Shared by the proxies of the arguments of one rule, and by every proxy obtained through them
+struct argument_lifetime
+{
+	bool ended = false;
+}; // struct argument_lifetime
+
+// A Python object (plugin_wrappers.ArgumentProxy) which forwards attribute and item access, iteration,
+// calls and comparisons to a Boost.Python object referring to memory owned by the caller of a rule.
+//
+// Whatever it returns which may also refer to that memory, i.e. instances of wrapped classes (such as
+// the KeyValPair of rule_args[2].condInput, or the array_ref of a char array) and bound methods, is
+// returned as another proxy sharing the same lifetime. Once the rule has returned, using any of them
+// raises ReferenceError instead of reading memory which may have been freed.
+class argument_proxy
+{
+  public:
+	argument_proxy(boost::python::object _target, std::shared_ptr<const argument_lifetime> _lifetime)
+		: target_{std::move(_target)}
+		, lifetime_{std::move(_lifetime)}
+	{
+	}
+
+	// The proxied object; raises ReferenceError once the rule has returned
+	const boost::python::object& target() const
+	{
+		if (lifetime_->ended) {
+			PyErr_SetString(PyExc_ReferenceError, "rule argument used after the rule returned");
+			boost::python::throw_error_already_set();
+		}
+		return target_;
+	}
+
+	// Returns the object proxied by _object, if it is a proxy, and _object otherwise
+	static boost::python::object unwrap(const boost::python::object& _object)
+	{
+		const boost::python::extract<const argument_proxy&> proxy{_object};
+		return proxy.check() ? proxy().target() : _object;
+	}
+
+	static boost::python::object getattr(const argument_proxy& _self, const std::string& _name)
+	{
+		return _self.wrap(_self.target().attr(_name.c_str()));
+	}
+
+	static void setattr(const argument_proxy& _self, const std::string& _name, const boost::python::object& _value)
+	{
+		boost::python::setattr(_self.target(), _name.c_str(), unwrap(_value));
+	}
+
+	static boost::python::object getitem(const argument_proxy& _self, const boost::python::object& _key)
+	{
+		return _self.wrap(_self.target()[unwrap(_key)]);
+	}
+
+	static void setitem(const argument_proxy& _self,
+	                    const boost::python::object& _key,
+	                    const boost::python::object& _value)
+	{
+		boost::python::object target = _self.target();
+		target[unwrap(_key)] = unwrap(_value);
+	}
+
+	static Py_ssize_t len(const argument_proxy& _self)
+	{
+		return boost::python::len(_self.target());
+	}
+
+	static bool contains(const argument_proxy& _self, const boost::python::object& _value)
+	{
+		return _self.target().contains(unwrap(_value));
+	}
+
+	static bool to_bool(const argument_proxy& _self)
+	{
+		const int result = PyObject_IsTrue(_self.target().ptr());
+		if (result < 0) {
+			boost::python::throw_error_already_set();
+		}
+		return result;
+	}
+
+	// Iterators may yield references into the proxied object, so they are always proxied themselves
+	static boost::python::object iter(const argument_proxy& _self)
+	{
+		return boost::python::object{argument_proxy{
+			boost::python::object{boost::python::handle<>{PyObject_GetIter(_self.target().ptr())}}, _self.lifetime_}};
+	}
+
+	static boost::python::object next(const argument_proxy& _self)
+	{
+		PyObject* item = PyIter_Next(_self.target().ptr());
+		if (!item) {
+			if (!PyErr_Occurred()) {
+				PyErr_SetNone(PyExc_StopIteration);
+			}
+			boost::python::throw_error_already_set();
+		}
+		return _self.wrap(boost::python::object{boost::python::handle<>{item}});
+	}
+
+	static boost::python::object call(const boost::python::tuple& _args, const boost::python::dict& _kwargs)
+	{
+		const argument_proxy& self = boost::python::extract<const argument_proxy&>(_args[0]);
+
+		boost::python::list args;
+		for (Py_ssize_t i = 1; i < boost::python::len(_args); ++i) {
+			args.append(unwrap(_args[i]));
+		}
+		boost::python::dict kwargs;
+		const boost::python::list items = _kwargs.items();
+		for (Py_ssize_t i = 0; i < boost::python::len(items); ++i) {
+			kwargs[items[i][0]] = unwrap(items[i][1]);
+		}
+
+		return self.wrap(boost::python::object{boost::python::handle<>{
+			PyObject_Call(self.target().ptr(), boost::python::tuple{args}.ptr(), kwargs.ptr())}});
+	}
+
+	static boost::python::object eq(const argument_proxy& _self, const boost::python::object& _other)
+	{
+		return _self.target() == unwrap(_other);
+	}
+
+	static boost::python::object ne(const argument_proxy& _self, const boost::python::object& _other)
+	{
+		return _self.target() != unwrap(_other);
+	}
+
+	static Py_hash_t hash(const argument_proxy& _self)
+	{
+		const Py_hash_t result = PyObject_Hash(_self.target().ptr());
+		if (result == -1) {
+			boost::python::throw_error_already_set();
+		}
+		return result;
+	}
+
+	static boost::python::str str(const argument_proxy& _self)
+	{
+		return boost::python::str{_self.target()};
+	}
+
+	static boost::python::object repr(const argument_proxy& _self)
+	{
+		return boost::python::object{boost::python::handle<>{PyObject_Repr(_self.target().ptr())}};
+	}
+
+	static boost::python::object dir(const argument_proxy& _self)
+	{
+		return boost::python::object{boost::python::handle<>{PyObject_Dir(_self.target().ptr())}};
+	}
+
+	// Lets isinstance() and type checks against the wrapped classes see the class of the proxied object
+	static boost::python::object class_of(const argument_proxy& _self)
+	{
+		return boost::python::object{boost::python::handle<>{
+			boost::python::borrowed(reinterpret_cast<PyObject*>(Py_TYPE(_self.target().ptr())))}};
+	}
+
+  private:
+	// Returns _result as a proxy sharing this proxy's lifetime if it may refer to the proxied memory
+	boost::python::object wrap(boost::python::object _result) const
+	{
+		PyObject* result = _result.ptr();
+		const bool wrapped_instance =
+			PyObject_TypeCheck(reinterpret_cast<PyObject*>(Py_TYPE(result)),
+		                       boost::python::objects::class_metatype().get()) &&
+			!PyLong_Check(result) && !boost::python::extract<const argument_proxy&>{_result}.check();
+		if (wrapped_instance || PyMethod_Check(result)) {
+			return boost::python::object{argument_proxy{std::move(_result), lifetime_}};
+		}
+		return _result;
+	}
+
+	boost::python::object target_;
+	std::shared_ptr<const argument_lifetime> lifetime_;
+}; // class argument_proxy
+
+template <typename T,
+          typename std::enable_if_t<std::is_pointer<T>{}>* = nullptr,
+          typename std::enable_if_t<!std::is_pointer<std::remove_pointer_t<T>>{}>* = nullptr>
+T proxied_target(boost::any& arg)
+{
+	return boost::any_cast<T>(arg);
+}
+
+template <typename T,
+          typename std::enable_if_t<std::is_pointer<T>{}>* = nullptr,
+          typename std::enable_if_t<std::is_pointer<std::remove_pointer_t<T>>{}>* = nullptr>
+std::remove_pointer_t<T> proxied_target(boost::any& arg)
+{
+	T arg_extracted = boost::any_cast<T>(arg);
+	return arg_extracted ? *arg_extracted : nullptr;
+}
+
+// Returns a Python object referring to the C++ object arg points to, if it is not null
+template <typename T>
+std::optional<boost::python::object> referring_object_from_specific(boost::any& arg)
+{
+	if (auto* target = proxied_target<T>(arg)) {
+		return boost::python::object{boost::python::ptr(target)};
+	}
+	return std::nullopt;
+}
+
+template <typename... Ts>
+std::unordered_map<std::type_index, std::optional<boost::python::object> (*)(boost::any&)>
+generate_referring_object_from_any_function_map(const type_sequence<Ts...>&)
+{
+	std::unordered_map<std::type_index, std::optional<boost::python::object> (*)(boost::any&)> map;
+	(
+		[&map] {
+			if constexpr (is_proxied_argument_v<Ts>) {
+				map.emplace(std::type_index{typeid(Ts*)}, &referring_object_from_specific<Ts*>);
+				map.emplace(std::type_index{typeid(Ts**)}, &referring_object_from_specific<Ts**>);
+			}
+		}(),
+		...);
+	return map;
+}
+
+// Returns a Python object referring to the C++ object of arg if it is passed by reference to a rule, and is
+// not null
+std::optional<boost::python::object> referring_object_from_any(boost::any& arg)
+{
+	static const auto referring_object_from_any_function_map =
+		generate_referring_object_from_any_function_map(list_of_irods_types{});
+	if (const auto entry = referring_object_from_any_function_map.find(std::type_index{arg.type()});
+	    entry != referring_object_from_any_function_map.end())
+	{
+		try {
+			return entry->second(arg);
+		}
+		catch (const boost::bad_any_cast&) {
+			THROW(SYS_NOT_SUPPORTED, "Failed any_cast when creating boost:python::object from boost::any");
+		}
+	}
+	return std::nullopt;
+}
+
+// The arguments of a rule run by exec_rule, as a Python list.
+//
+// Arguments passed by non-const pointer to a wrapped class are argument_proxy objects for the C++ objects,
+// so rules which read a few fields of a large struct do not pay for copying it, and changes rules make to
+// them are made in place. Other arguments are converted by object_from_any, as before. After the rule,
+// update() writes back only the arguments which the rule replaced in the list.
+//
+// Destroying this object (with the GIL held) ends the lifetime of the proxies, and of every proxy obtained
+// through them, so none of them can reach the C++ objects once the rule has returned, even if the rule kept
+// them in a global or passed them to deferred work.
+class rule_arguments
+{
+  public:
+	explicit rule_arguments(std::list<boost::any>& _cpp_arguments)
+		: cpp_arguments{_cpp_arguments}
+		, lifetime{std::make_shared<argument_lifetime>()}
+	{
+		for (auto& cpp_argument : cpp_arguments) {
+			auto target = referring_object_from_any(cpp_argument);
+			const boost::python::object python_argument =
+				target ? boost::python::object{argument_proxy{std::move(*target), lifetime}}
+					   : object_from_any(cpp_argument);
+			python_arguments.append(python_argument);
+			originals.push_back(python_argument);
+		}
+	}
+
+	rule_arguments(const rule_arguments&) = delete;
+	rule_arguments& operator=(const rule_arguments&) = delete;
+
+	~rule_arguments()
+	{
+		lifetime->ended = true;
+	}
+
+	boost::python::list& python()
+	{
+		return python_arguments;
+	}
+
+	// Writes back the arguments which the rule replaced with other objects
+	void update()
+	{
+		Py_ssize_t i = 0;
+		for (auto& cpp_argument : cpp_arguments) {
+			if (i >= PyList_GET_SIZE(python_arguments.ptr())) {
+				break;
+			}
+			if (PyList_GET_ITEM(python_arguments.ptr(), i) != originals[i].ptr()) {
+				boost::python::object py_argument = argument_proxy::unwrap(python_arguments[i]);
+				update_argument(cpp_argument, py_argument);
+			}
+			++i;
+		}
+	}
+
+  private:
+	std::list<boost::any>& cpp_arguments;
+	std::shared_ptr<argument_lifetime> lifetime;
+	boost::python::list python_arguments;
+	std::vector<boost::python::object> originals;
+}; // class rule_arguments
+
 #endif // IRODS_RE_PYTHON_HPP
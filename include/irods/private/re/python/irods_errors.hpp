@@ -8,4 +8,17 @@
 
 extern "C" PyObject* PyInit_irods_errors();
 
+namespace irods::re::python
+{
+	// irods_errors.CallbackError, or nullptr if the irods_errors module has not been initialized
+	PyObject* callback_error_type();
+
+	// irods_errors.RuleTimeoutError, or nullptr if the irods_errors module has not been initialized
+	PyObject* rule_timeout_error_type();
+
+	// The iRODS error code returned for a rule interrupted after exceeding its time budget,
+	// irods_errors.RULE_TIMEOUT_ERROR: RE_RUNTIME_ERROR with the ETIMEDOUT sub-code
+	extern const int rule_timeout_error_code;
+} //namespace irods::re::python
+
 #endif // RE_PYTHON_IRODS_ERRORS_HPP
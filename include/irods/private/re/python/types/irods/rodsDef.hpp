@@ -1,8 +1,21 @@
 #ifndef RE_PYTHON_TYPES_IRODS_RODSDEF_HPP
 #define RE_PYTHON_TYPES_IRODS_RODSDEF_HPP
 
+#include <irods/rodsDef.h>
+
+#include <boost/python/object_fwd.hpp>
+
 namespace irods::re::python::types
 {
+	// Returns a Python object for a BytesBuf returned from a call. If its buffer is borrowed from a Python
+	// object by a live BorrowedBytesBuf, a BorrowedBytesBuf of that object is returned, which never frees
+	// the memory; otherwise, a BytesBuf.
+	boost::python::object bytes_buf_to_python(const bytesBuf_t& _buf);
+
+	// Whether _buf is memory borrowed from a Python object by a live BorrowedBytesBuf, which must never be
+	// freed or reallocated
+	bool is_borrowed_buffer(const void* _buf);
+
 	void export_irodsProt();
 	void export_BytesBuf();
 	void export_MsgHeader();
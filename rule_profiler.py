@@ -0,0 +1,121 @@
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+__all__ = ['RuleProfiler', 'FORMATS']
+
+FORMATS = ('pstats', 'collapsed')
+
+
+class RuleProfiler(object):
+    """Runs rules under a profiler and writes the results to files in a directory.
+
+    The plugin creates one of these when profile_rules is set in its configuration, and calls
+    profile_call for the invocations of matching rules which are selected for profiling.
+
+    In the 'pstats' format, each rule has a cProfile.Profile which accumulates all of its profiled
+    invocations. After each invocation, the accumulated statistics are written to
+    <directory>/<rule name>.<pid>.pstats, which can be read with the pstats module or tools such
+    as snakeviz.
+
+    In the 'collapsed' format, each profiled invocation appends a line "<stack> <microseconds>" to
+    <directory>/<rule name>.<pid>.collapsed for every distinct stack of Python functions, with the
+    time spent in the innermost function itself. The file is the input expected by flamegraph.pl.
+
+    When a file reaches max_file_bytes, it is renamed with a '.1' suffix (replacing any previous
+    one), and a new file is started. In the 'pstats' format, this also starts a new aggregate.
+
+    :param directory: The directory in which to write the files. It is created if needed.
+    :param output_format: One of FORMATS.
+    :param max_file_bytes: The size at which a file is rotated (0 = never).
+    """
+
+    def __init__(self, directory, output_format='pstats', max_file_bytes=64 * 1024 * 1024):
+        if output_format not in FORMATS:
+            raise ValueError('invalid profile format: {!r}'.format(output_format))
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.output_format = output_format
+        self.max_file_bytes = max_file_bytes
+        self._profiles = {}
+        # Held while a cProfile.Profile is enabled, as only one may be enabled at a time in
+        # Python 3.12 and later. Calls made while a thread already profiles a rule are not profiled
+        # again, but are part of the enclosing profile.
+        self._lock = threading.RLock()
+        self._active = threading.local()
+
+    def profile_call(self, rule_name, function, *args):
+        """Calls function(*args) under the profiler, records the result for rule_name, and returns
+        what function returned."""
+        if getattr(self._active, 'profiling', False):
+            return function(*args)
+        self._active.profiling = True
+        try:
+            if self.output_format == 'pstats':
+                return self._pstats_call(rule_name, function, args)
+            return self._collapsed_call(rule_name, function, args)
+        finally:
+            self._active.profiling = False
+
+    def _path(self, rule_name):
+        return os.path.join(self.directory, '{}.{}.{}'.format(rule_name, os.getpid(), self.output_format))
+
+    def _rotate(self, path):
+        # Returns True if path was rotated
+        try:
+            if not self.max_file_bytes or os.path.getsize(path) < self.max_file_bytes:
+                return False
+        except OSError:
+            return False
+        os.replace(path, path + '.1')
+        return True
+
+    def _pstats_call(self, rule_name, function, args):
+        with self._lock:
+            profile = self._profiles.get(rule_name)
+            if profile is None:
+                profile = self._profiles[rule_name] = cProfile.Profile()
+            try:
+                return profile.runcall(function, *args)
+            finally:
+                path = self._path(rule_name)
+                profile.dump_stats(path)
+                if self._rotate(path):
+                    del self._profiles[rule_name]
+
+    def _collapsed_call(self, rule_name, function, args):
+        # Each stack entry is [collapsed stack, start time, time spent in callees]
+        stack = []
+        self_times = Counter()
+        clock = time.perf_counter
+
+        def tracer(frame, event, arg):
+            if event == 'call' or event == 'c_call':
+                if event == 'call':
+                    code = frame.f_code
+                    filename = os.path.basename(code.co_filename)
+                    name = '{}:{}'.format(filename, getattr(code, 'co_qualname', code.co_name))
+                else:
+                    name = getattr(arg, '__qualname__', None) or repr(arg)
+                stack.append([stack[-1][0] + ';' + name if stack else name, clock(), 0.0])
+            elif stack and event in ('return', 'c_return', 'c_exception'):
+                path, start, callee_time = stack.pop()
+                elapsed = clock() - start
+                self_times[path] += elapsed - callee_time
+                if stack:
+                    stack[-1][2] += elapsed
+
+        previous = sys.getprofile()
+        sys.setprofile(tracer)
+        try:
+            return function(*args)
+        finally:
+            sys.setprofile(previous)
+            path = self._path(rule_name)
+            self._rotate(path)
+            with open(path, 'a') as f:
+                f.write(''.join('{} {}\n'.format(collapsed_stack, int(seconds * 1e6))
+                                for collapsed_stack, seconds in self_times.items() if seconds >= 1e-6))
@@ -1,75 +1,250 @@
+from functools import partial
+from operator import attrgetter
+
+
+class _pending(object):
+    __slots__ = ('getter',)
+
+    def __init__(self, getter):
+        self.getter = getter
+
+
+class LazyMap(dict):
+    """dict whose values are computed from the rei on first access, then kept.
+
+    Nested sections are LazyMaps as well. Every way of reading values (indexing, get, items,
+    values, dict(), json.dumps, comparison) sees the computed values, so a LazyMap can be used
+    wherever the dict returned by previous versions of get_map was.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, getters):
+        super(LazyMap, self).__init__((key, _pending(getter)) for key, getter in getters)
+
+    @classmethod
+    def of(cls, obj, fields):
+        return cls((key, partial(getter, obj)) for key, getter in fields)
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if type(value) is _pending:
+            value = value.getter()
+            dict.__setitem__(self, key, value)
+        return value
+
+    # Overriding __iter__ makes dict(), dict.update() and {**map} read values through keys() and
+    # __getitem__ instead of copying the stored (possibly pending) values directly.
+    def __iter__(self):
+        return dict.__iter__(self)
+
+    def _fill(self):
+        for key in list(dict.keys(self)):
+            self[key]
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        dict.__setitem__(self, key, default)
+        return default
+
+    def pop(self, key, *default):
+        if key in self:
+            self[key]
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        self._fill()
+        return dict.popitem(self)
+
+    def items(self):
+        self._fill()
+        return dict.items(self)
+
+    def values(self):
+        self._fill()
+        return dict.values(self)
+
+    def copy(self):
+        self._fill()
+        return dict.copy(self)
+
+    def __eq__(self, other):
+        self._fill()
+        if isinstance(other, LazyMap):
+            other._fill()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __or__(self, other):
+        self._fill()
+        return dict.__or__(self, other)
+
+    def __ror__(self, other):
+        self._fill()
+        return dict.__ror__(self, other)
+
+    def __repr__(self):
+        self._fill()
+        return dict.__repr__(self)
+
+    def __reduce_ex__(self, protocol):
+        # Copies and pickles are plain dicts, as they no longer have the rei to read from
+        return dict, (self.to_dict(),)
+
+    def to_dict(self):
+        """Returns the whole tree as plain dicts."""
+        return {key: value.to_dict() if isinstance(value, LazyMap) else value for key, value in self.items()}
+
+
+def _str(path):
+    get = attrgetter(path)
+    return lambda obj: str(get(obj))
+
+
+def _none(obj):
+    return None
+
+
+_AUTHENTICATION_INFO = (
+    ('authentication_scheme', _str('authScheme')),
+    ('privilege_level', attrgetter('authFlag')),
+    ('flag', attrgetter('flag')),
+    ('ppid', attrgetter('ppid')),
+    ('host', _str('host')),
+    ('authentication_string', _str('authStr')),
+)
+
+_USER = (
+    ('user_name', _str('userName')),
+    ('irods_zone', _str('rodsZone')),
+    ('user_type', _str('userType')),
+    ('system_uid', attrgetter('sysUid')),
+    ('authentication_info', lambda user: LazyMap.of(user.authInfo, _AUTHENTICATION_INFO)),
+    ('info', _str('userOtherInfo.userInfo')),
+    ('comments', _str('userOtherInfo.userComments')),
+    ('create_time', _str('userOtherInfo.userCreate')),
+    ('modify_time', _str('userOtherInfo.userModify')),
+)
+
+_CONNECTION = (
+    ('client_address', _str('clientAddr')),
+    ('connection_count', attrgetter('connectCnt')),
+    ('socket', attrgetter('sock')),
+    ('option', _str('option')),
+    ('status', attrgetter('status')),
+    ('api_number', attrgetter('apiInx')),
+)
+
+_DATA_OBJECT_INFO = (
+    ('object_path', _str('objPath')),
+    ('size', attrgetter('dataSize')),
+    ('type', _str('dataType')),
+    ('checksum', _str('chksum')),
+    ('file_path', _str('filePath')),
+    ('replica_number', attrgetter('replNum')),
+    ('replication_status', attrgetter('replStatus')),
+    ('write_flag', attrgetter('writeFlag')),
+    ('owner', _str('dataOwnerName')),
+    ('owner_zone', _str('dataOwnerZone')),
+    ('expiry', _str('dataExpiry')),
+    ('comments', _str('dataComments')),
+    ('create_time', _str('dataCreate')),
+    ('modify_time', _str('dataModify')),
+    ('access_time', _str('dataAccess')),
+    ('id', attrgetter('dataId')),
+    ('collection_id', attrgetter('collId')),
+    ('status_string', _str('statusString')),
+    ('destination_resource_name', _str('destRescName')),
+    ('backup_resource_name', _str('backupRescName')),
+    ('resource_name', _str('rescName')),
+)
+
+# Without a DataObjInfo, only the path and size are known (from the DataObjInp)
+_DATA_OBJECT_INPUT = _DATA_OBJECT_INFO[:2] + tuple((key, _none) for key, _ in _DATA_OBJECT_INFO[2:])
+
+_COLLECTION = (
+    ('id', attrgetter('collId')),
+    ('name', _str('collName')),
+    ('parent_collection_name', _str('collParentName')),
+    ('owner', _str('collOwnerName')),
+    ('expiry', _str('collExpiry')),
+    ('comments', _str('collComments')),
+    ('create_time', _str('collCreate')),
+    ('modify_time', _str('collModify')),
+    ('access_time', _str('collAccess')),
+    ('inheritance', _str('collInheritance')),
+)
+
+
+def _data_object(rei):
+    doi = rei.doi
+    if doi is not None:
+        return LazyMap.of(doi, _DATA_OBJECT_INFO)
+    doinp = rei.doinp
+    if doinp is not None:
+        return LazyMap.of(doinp, _DATA_OBJECT_INPUT)
+    return None
+
+
+def _user(user_struct, rs_comm_attribute, rei):
+    if user_struct is not None:
+        return LazyMap.of(user_struct, _USER)
+    if rei.rsComm is not None:
+        user_struct = getattr(rei.rsComm, rs_comm_attribute)
+        if user_struct is not None:
+            return LazyMap.of(user_struct, _USER)
+    return None
+
+
+def _key_value_pairs(rei):
+    kvp = rei.condInputData
+    if kvp is None:
+        return None
+    return dict((kvp.key[i], kvp.value[i]) for i in range(0, kvp.len))
+
+
+_SESSION = (
+    ('plugin_instance_name', _str('pluginInstanceName')),
+    ('status', attrgetter('status')),
+    ('operation_type', lambda rei: rei.doinp.oprType if rei.doinp is not None else None),
+    ('connection', lambda rei: LazyMap.of(rei.rsComm, _CONNECTION) if rei.rsComm is not None else None),
+    ('data_object', _data_object),
+    ('collection', lambda rei: LazyMap.of(rei.coi, _COLLECTION) if rei.coi is not None else None),
+    ('client_user', lambda rei: _user(rei.uoic, 'clientUser', rei)),
+    ('proxy_user', lambda rei: _user(rei.uoip, 'proxyUser', rei)),
+    ('other_user', lambda rei: LazyMap.of(rei.uoio, _USER) if rei.uoio is not None else None),
+    ('key_value_pairs', _key_value_pairs),
+)
+
+
+def _new_map(rei):
+    return LazyMap.of(rei, _SESSION)
+
+
 def get_map(rei):
+    """Returns the session variables of rei as a LazyMap (a dict) of sections and fields.
 
-    def get_map_for_user_struct(user_struct):
-        return {
-            'user_name': str(user_struct.userName),
-            'irods_zone': str(user_struct.rodsZone),
-            'user_type': str(user_struct.userType),
-            'system_uid': user_struct.sysUid,
-            'authentication_info': {
-                'authentication_scheme': str(user_struct.authInfo.authScheme),
-                'privilege_level': user_struct.authInfo.authFlag,
-                'flag': user_struct.authInfo.flag,
-                'ppid': user_struct.authInfo.ppid,
-                'host': str(user_struct.authInfo.host),
-                'authentication_string': str(user_struct.authInfo.authStr)
-                },
-            'info': str(user_struct.userOtherInfo.userInfo),
-            'comments': str(user_struct.userOtherInfo.userComments),
-            'create_time': str(user_struct.userOtherInfo.userCreate),
-            'modify_time': str(user_struct.userOtherInfo.userModify)
-            }
-
-    return {
-            'plugin_instance_name': str(rei.pluginInstanceName),
-            'status': rei.status,
-            'operation_type': rei.doinp.oprType if rei.doinp is not None else None,
-            'connection': {
-                'client_address': str(rei.rsComm.clientAddr),
-                'connection_count': rei.rsComm.connectCnt,
-                'socket': rei.rsComm.sock,
-                'option': str(rei.rsComm.option),
-                'status': rei.rsComm.status,
-                'api_number': rei.rsComm.apiInx
-                } if rei.rsComm is not None else None,
-            'data_object': {
-                'object_path': str(rei.doi.objPath) if rei.doi is not None else str(rei.doinp.objPath),
-                'size': rei.doi.dataSize if rei.doi is not None else rei.doinp.dataSize,
-                'type': str(rei.doi.dataType) if rei.doi is not None else None,
-                'checksum': str(rei.doi.chksum) if rei.doi is not None else None,
-                'file_path': str(rei.doi.filePath) if rei.doi is not None else None,
-                'replica_number': rei.doi.replNum if rei.doi is not None else None,
-                'replication_status': rei.doi.replStatus if rei.doi is not None else None,
-                'write_flag': rei.doi.writeFlag if rei.doi is not None else None,
-                'owner': str(rei.doi.dataOwnerName) if rei.doi is not None else None,
-                'owner_zone': str(rei.doi.dataOwnerZone) if rei.doi is not None else None,
-                'expiry': str(rei.doi.dataExpiry) if rei.doi is not None else None,
-                'comments': str(rei.doi.dataComments) if rei.doi is not None else None,
-                'create_time': str(rei.doi.dataCreate) if rei.doi is not None else None,
-                'modify_time': str(rei.doi.dataModify) if rei.doi is not None else None,
-                'access_time': str(rei.doi.dataAccess) if rei.doi is not None else None,
-                'id': rei.doi.dataId if rei.doi is not None else None,
-                'collection_id': rei.doi.collId if rei.doi is not None else None,
-                'status_string': str(rei.doi.statusString) if rei.doi is not None else None,
-                'destination_resource_name': str(rei.doi.destRescName) if rei.doi is not None else None,
-                'backup_resource_name': str(rei.doi.backupRescName) if rei.doi is not None else None,
-                'resource_name': str(rei.doi.rescName) if rei.doi is not None else None,
-            } if rei.doi is not None or rei.doinp is not None else None,
-            'collection': {
-                'id': rei.coi.collId,
-                'name': str(rei.coi.collName),
-                'parent_collection_name': str(rei.coi.collParentName),
-                'owner': str(rei.coi.collOwnerName),
-                'expiry': str(rei.coi.collExpiry),
-                'comments': str(rei.coi.collComments),
-                'create_time': str(rei.coi.collCreate),
-                'modify_time': str(rei.coi.collModify),
-                'access_time': str(rei.coi.collAccess),
-                'inheritance': str(rei.coi.collInheritance)
-                } if rei.coi is not None else None,
-            'client_user': get_map_for_user_struct(rei.uoic) if rei.uoic is not None else get_map_for_user_struct(rei.rsComm.clientUser) if rei.rsComm is not None and rei.rsComm.clientUser is not None else None,
-            'proxy_user': get_map_for_user_struct(rei.uoip) if rei.uoip is not None else get_map_for_user_struct(rei.rsComm.proxyUser) if rei.rsComm is not None and rei.rsComm.proxyUser is not None else None,
-            'other_user': get_map_for_user_struct(rei.uoio) if rei.uoio is not None else None,
-            'key_value_pairs': dict((rei.condInputData.key[i], rei.condInputData.value[i]) for i in range(0, rei.condInputData.len)) if rei.condInputData is not None else None
-            }
+    Fields are read from the rei when first accessed, and the same map is returned for
+    further calls with the same rei object. Values therefore reflect the rei as it was
+    when each field was first read.
+    """
+    try:
+        return rei._session_vars_map
+    except AttributeError:
+        pass
 
+    session_map = _new_map(rei)
+    try:
+        rei._session_vars_map = session_map
+    except (AttributeError, TypeError):
+        pass
+    return session_map
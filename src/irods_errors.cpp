@@ -1,6 +1,7 @@
 // include this first for defines and pyconfig
 #include "irods/private/re/python/types/config.hpp"
 
+#include <cerrno>
 #include <map>
 #include <string>
 
@@ -20,12 +21,30 @@
 #endif
 #include <boost/python/module.hpp>
 #include <boost/python/scope.hpp>
+#include <boost/python/dict.hpp>
+#include <boost/python/handle.hpp>
 #pragma GCC diagnostic pop
 
+#include "irods/private/re/python/irods_errors.hpp"
+
 namespace bp = boost::python;
 
 namespace
 {
+	PyObject* callback_error = nullptr;
+	PyObject* rule_timeout_error = nullptr;
+
+	constexpr const char* callback_error_doc =
+		"Raised when a rule or microservice called through the callback object fails.\n\n"
+		"The code attribute holds the iRODS error code. The message starts with\n"
+		"\"[iRods__Error__Code:<code>]\", as the message of the RuntimeError raised\n"
+		"by earlier versions of the plugin did.";
+
+	constexpr const char* rule_timeout_error_doc =
+		"Raised in a rule which has run for longer than its time budget.\n\n"
+		"The code attribute holds the iRODS error code returned for the rule,\n"
+		"RULE_TIMEOUT_ERROR (RE_RUNTIME_ERROR with the ETIMEDOUT sub-code).";
+
 	BOOST_PYTHON_MODULE(irods_errors)
 	{
 		std::map<std::string, int> irods_constants;
@@ -35,5 +54,40 @@ namespace
 		for (const auto& [k, v] : irods_constants) {
 			current.attr(k.c_str()) = v;
 		}
+
+		// A subclass of RuntimeError, so that existing "except RuntimeError" handlers still catch it
+		bp::dict attributes;
+		attributes["code"] = -1;
+		callback_error = PyErr_NewExceptionWithDoc(
+			"irods_errors.CallbackError", callback_error_doc, PyExc_RuntimeError, attributes.ptr());
+		if (!callback_error) {
+			bp::throw_error_already_set();
+		}
+		current.attr("CallbackError") = bp::object{bp::handle<>{bp::borrowed(callback_error)}};
+
+		// A subclass of BaseException, so that "except Exception" handlers in rules do not catch it
+		bp::dict timeout_attributes;
+		timeout_attributes["code"] = irods::re::python::rule_timeout_error_code;
+		rule_timeout_error = PyErr_NewExceptionWithDoc(
+			"irods_errors.RuleTimeoutError", rule_timeout_error_doc, PyExc_BaseException, timeout_attributes.ptr());
+		if (!rule_timeout_error) {
+			bp::throw_error_already_set();
+		}
+		current.attr("RuleTimeoutError") = bp::object{bp::handle<>{bp::borrowed(rule_timeout_error)}};
+		current.attr("RULE_TIMEOUT_ERROR") = irods::re::python::rule_timeout_error_code;
 	}
 } //namespace
+
+// Distinct from RE_RUNTIME_ERROR itself, which failing rules and microservices also return, while still
+// being reported by the server as an RE_RUNTIME_ERROR
+const int irods::re::python::rule_timeout_error_code = RE_RUNTIME_ERROR - ETIMEDOUT;
+
+PyObject* irods::re::python::callback_error_type()
+{
+	return callback_error;
+}
+
+PyObject* irods::re::python::rule_timeout_error_type()
+{
+	return rule_timeout_error;
+}
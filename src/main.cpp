@@ -1,15 +1,32 @@
 // include this first to fix macro redef warnings
 #include <pyconfig.h>
 
+#include <algorithm>
+#include <array>
+#include <atomic>
+#include <bit>
+#include <cctype>
+#include <chrono>
+#include <cmath>
+#include <condition_variable>
 #include <cstdint>
 #include <ctime>
 #include <fstream>
+#include <limits>
 #include <list>
 #include <string>
+#include <string_view>
+#include <thread>
+#include <unordered_map>
+#include <unordered_set>
+#include <utility>
 #include <vector>
 #include <map>
 #include <memory>
 #include <mutex>
+#include <optional>
+#include <random>
+#include <regex>
 
 #include <boost/version.hpp>
 #pragma GCC diagnostic push
@@ -93,6 +110,31 @@ const std::string STRING_TYPE = "STRING_TYPE";
 const std::string STRING_VALUE_KEY = "STRING_VALUE_KEY";
 const std::string IRODS_ERROR_PREFIX = "[iRods__Error__Code:";
 
+const std::string EXECUTION_MODE_KW = "execution_mode";
+const std::string EXECUTION_MODE_SERIALIZED = "serialized";
+const std::string EXECUTION_MODE_CONCURRENT = "concurrent";
+const std::string MAX_CONCURRENT_RULES_KW = "max_concurrent_rules";
+const std::string PERSISTENT_THREAD_STATES_KW = "persistent_thread_states";
+const std::string DERIVE_PEP_REGEXES_KW = "derive_pep_regexes_from_rulebase";
+const std::string DELAY_RULE_CODE_CACHE_SIZE_KW = "delay_rule_code_cache_size";
+const std::string IRULE_CODE_CACHE_SIZE_KW = "irule_code_cache_size";
+const std::string IRULE_CODE_CACHE_MAX_BYTES_KW = "irule_code_cache_max_bytes";
+const std::string INSTRUMENTATION_KW = "instrumentation";
+const std::string INSTRUMENTATION_LOG_INTERVAL_KW = "instrumentation_log_interval_in_seconds";
+const std::string PROFILE_RULES_KW = "profile_rules";
+const std::string PROFILE_SAMPLE_RATE_KW = "profile_sample_rate";
+const std::string PROFILE_DIRECTORY_KW = "profile_directory";
+const std::string PROFILE_FORMAT_KW = "profile_format";
+const std::string PROFILE_FORMAT_PSTATS = "pstats";
+const std::string PROFILE_FORMAT_COLLAPSED = "collapsed";
+const std::string PROFILE_MAX_FILE_BYTES_KW = "profile_max_file_bytes";
+const std::string WARM_UP_MODULES_KW = "warm_up_modules";
+const std::string PRECOMPILE_BYTECODE_KW = "precompile_bytecode";
+const std::string FREEZE_GC_AFTER_START_KW = "freeze_gc_after_start";
+const std::string DEFERRED_WORK_DRAIN_TIMEOUT_KW = "deferred_work_drain_timeout_in_seconds";
+const std::string RULE_TIME_BUDGET_KW = "rule_time_budget_in_seconds";
+const std::string RULE_TIME_BUDGETS_KW = "rule_time_budgets";
+
 const std::string STATIC_PEP_RULE_REGEX = "ac[^ ]*";
 const std::string DYNAMIC_PEP_RULE_REGEX = "[^ ]*pep_[^ ]*_(pre|post)";
 
@@ -117,7 +159,60 @@ namespace
 		static thread_local PyThreadState* ts_thread_old;
 		// Reference counter for nested python operations
 		static thread_local uint64_t ts_thread_refct = 0;
+		// Thread state saved while the GIL is released around a microservice call
+		static thread_local PyThreadState* ts_thread_released = nullptr;
+
+		// Long-lived thread states created in persistent thread state mode, not yet deleted
+		static std::mutex ts_persistent_mutex;
+		static std::unordered_set<PyThreadState*> ts_persistent;
+		// Incremented by stop() when it deletes the long-lived thread states
+		static std::atomic<std::uint64_t> ts_persistent_generation{0};
 	} //namespace python_state
+
+	// Settings read from the plugin_specific_configuration in start()
+	namespace plugin_config
+	{
+		// When true, rules are not serialized on python_mutex. Mutual exclusion is left to the GIL,
+		// which is released while microservices run so that other threads can execute Python.
+		static bool concurrent_execution = false;
+		// Maximum number of threads executing Python rules at the same time in concurrent mode (0 = unlimited).
+		// This caps the concurrency of the threads calling into the plugin; the plugin starts no threads.
+		static std::size_t max_concurrent_rules = 0;
+		// When true, each thread keeps its Python thread state between calls instead of
+		// creating and destroying one for every outermost call into the plugin.
+		static bool persistent_thread_states = false;
+		// Number of compiled delay rule bodies kept by exec_rule_expression (0 = no caching)
+		static std::size_t delay_rule_code_cache_size = 128;
+		// Number of compiled irule rule files kept by exec_rule_text (0 = no caching)
+		static std::size_t irule_code_cache_size = 32;
+		// Maximum total size of the irule rule files kept by exec_rule_text (0 = unlimited)
+		static std::size_t irule_code_cache_max_bytes = 4 * 1024 * 1024;
+		// When true, calls, errors and latencies are recorded per rule and per microservice
+		static bool instrumentation = false;
+		// Seconds between writes of the recorded statistics to the server log (0 = never)
+		static std::int64_t instrumentation_log_interval = 0;
+		// Rules whose invocations may be run under the rule_profiler module (unset = none)
+		static std::optional<std::regex> profile_rules;
+		// Fraction of the invocations of matching rules which are profiled
+		static double profile_sample_rate = 1.0;
+		// Directory, output format and rotation size of the files written by the rule_profiler module
+		static std::string profile_directory;
+		static std::string profile_format = PROFILE_FORMAT_PSTATS;
+		static std::size_t profile_max_file_bytes = 64 * 1024 * 1024;
+		// Modules imported by start() after the rulebase, so that the first rule of an agent does not import them
+		static std::vector<std::string> warm_up_modules{"genquery", "session_vars"};
+		// When true, start() writes missing or stale bytecode caches for the rulebase and warm_up_modules
+		static bool precompile_bytecode = true;
+		// When true, start() moves every object tracked by the garbage collector into the permanent
+		// generation (gc.freeze), so collections do not touch (and copy) the pages of objects made at startup
+		static bool freeze_gc_after_start = true;
+		// Seconds stop() waits for the work queued with the deferred_work module to finish
+		static double deferred_work_drain_timeout = 30;
+		// Seconds a rule called through exec_rule may run before it is interrupted (0 = unlimited)
+		static double rule_time_budget = 0;
+		// Time budgets of individual rules, overriding rule_time_budget
+		static std::unordered_map<std::string, double> rule_time_budgets;
+	} //namespace plugin_config
 }
 
 void register_regexes_from_array(const nlohmann::json& _array, const std::string& _instance_name)
@@ -146,133 +241,1784 @@ void register_regexes_from_array(const nlohmann::json& _array, const std::string
 				continue;
 			}
 		}
-	}
-	catch (const boost::bad_any_cast&) {
-		std::stringstream msg;
-		msg << "[" << _instance_name << "] failed to any_cast a std::vector<boost::any>&";
-		THROW(INVALID_ANY_CAST, msg.str());
-	}
-}
+	}
+	catch (const boost::bad_any_cast&) {
+		std::stringstream msg;
+		msg << "[" << _instance_name << "] failed to any_cast a std::vector<boost::any>&";
+		THROW(INVALID_ANY_CAST, msg.str());
+	}
+}
+
+void configure_execution_mode(const nlohmann::json& _plugin_spec_cfg, const std::string& _instance_name)
+{
+	if (_plugin_spec_cfg.count(EXECUTION_MODE_KW)) {
+		const auto& mode = _plugin_spec_cfg.at(EXECUTION_MODE_KW).get_ref<const std::string&>();
+		if (mode == EXECUTION_MODE_CONCURRENT) {
+			plugin_config::concurrent_execution = true;
+		}
+		else if (mode != EXECUTION_MODE_SERIALIZED) {
+			THROW(SYS_INVALID_INPUT_PARAM,
+			      fmt::format("[{}] invalid value for {}: [{}]. Expected \"{}\" or \"{}\".",
+			                  _instance_name,
+			                  EXECUTION_MODE_KW,
+			                  mode,
+			                  EXECUTION_MODE_SERIALIZED,
+			                  EXECUTION_MODE_CONCURRENT));
+		}
+	}
+
+	if (_plugin_spec_cfg.count(MAX_CONCURRENT_RULES_KW)) {
+		plugin_config::max_concurrent_rules = _plugin_spec_cfg.at(MAX_CONCURRENT_RULES_KW).get<std::size_t>();
+	}
+
+	if (_plugin_spec_cfg.count(PERSISTENT_THREAD_STATES_KW)) {
+		plugin_config::persistent_thread_states = _plugin_spec_cfg.at(PERSISTENT_THREAD_STATES_KW).get<bool>();
+	}
+
+	// clang-format off
+	log_re::debug({
+		{"rule_engine_plugin", rule_engine_name},
+		{"instance_name", _instance_name},
+		{"log_message", "configured rule execution mode"},
+		{"execution_mode", plugin_config::concurrent_execution ? EXECUTION_MODE_CONCURRENT : EXECUTION_MODE_SERIALIZED},
+		{"max_concurrent_rules", std::to_string(plugin_config::max_concurrent_rules)},
+		{"persistent_thread_states", plugin_config::persistent_thread_states ? "true" : "false"},
+	});
+	// clang-format on
+}
+
+void configure_code_caches(const nlohmann::json& _plugin_spec_cfg, const std::string& _instance_name)
+{
+	if (_plugin_spec_cfg.count(DELAY_RULE_CODE_CACHE_SIZE_KW)) {
+		plugin_config::delay_rule_code_cache_size = _plugin_spec_cfg.at(DELAY_RULE_CODE_CACHE_SIZE_KW).get<std::size_t>();
+	}
+
+	if (_plugin_spec_cfg.count(IRULE_CODE_CACHE_SIZE_KW)) {
+		plugin_config::irule_code_cache_size = _plugin_spec_cfg.at(IRULE_CODE_CACHE_SIZE_KW).get<std::size_t>();
+	}
+
+	if (_plugin_spec_cfg.count(IRULE_CODE_CACHE_MAX_BYTES_KW)) {
+		plugin_config::irule_code_cache_max_bytes = _plugin_spec_cfg.at(IRULE_CODE_CACHE_MAX_BYTES_KW).get<std::size_t>();
+	}
+
+	// clang-format off
+	log_re::debug({
+		{"rule_engine_plugin", rule_engine_name},
+		{"instance_name", _instance_name},
+		{"log_message", "configured compiled code caches"},
+		{"delay_rule_code_cache_size", std::to_string(plugin_config::delay_rule_code_cache_size)},
+		{"irule_code_cache_size", std::to_string(plugin_config::irule_code_cache_size)},
+		{"irule_code_cache_max_bytes", std::to_string(plugin_config::irule_code_cache_max_bytes)},
+	});
+	// clang-format on
+}
+
+void configure_instrumentation(const nlohmann::json& _plugin_spec_cfg, const std::string& _instance_name)
+{
+	if (_plugin_spec_cfg.count(INSTRUMENTATION_KW)) {
+		plugin_config::instrumentation = _plugin_spec_cfg.at(INSTRUMENTATION_KW).get<bool>();
+	}
+
+	if (_plugin_spec_cfg.count(INSTRUMENTATION_LOG_INTERVAL_KW)) {
+		plugin_config::instrumentation_log_interval =
+			_plugin_spec_cfg.at(INSTRUMENTATION_LOG_INTERVAL_KW).get<std::int64_t>();
+	}
+
+	// clang-format off
+	log_re::debug({
+		{"rule_engine_plugin", rule_engine_name},
+		{"instance_name", _instance_name},
+		{"log_message", "configured instrumentation"},
+		{"instrumentation", plugin_config::instrumentation ? "true" : "false"},
+		{"instrumentation_log_interval_in_seconds", std::to_string(plugin_config::instrumentation_log_interval)},
+	});
+	// clang-format on
+}
+
+void configure_profiling(const nlohmann::json& _plugin_spec_cfg, const std::string& _instance_name)
+{
+	if (!_plugin_spec_cfg.count(PROFILE_RULES_KW)) {
+		return;
+	}
+
+	// Each element is a rule name or a regex, matched against the whole rule name
+	std::string pattern;
+	for (const auto& elem : _plugin_spec_cfg.at(PROFILE_RULES_KW)) {
+		pattern += fmt::format("{}(?:{})", pattern.empty() ? "" : "|", elem.get_ref<const std::string&>());
+	}
+	if (pattern.empty()) {
+		return;
+	}
+
+	try {
+		plugin_config::profile_rules.emplace(pattern, std::regex::ECMAScript | std::regex::optimize);
+	}
+	catch (const std::regex_error& e) {
+		THROW(SYS_INVALID_INPUT_PARAM,
+		      fmt::format("[{}] invalid regex in {}: {}", _instance_name, PROFILE_RULES_KW, e.what()));
+	}
+
+	if (!_plugin_spec_cfg.count(PROFILE_DIRECTORY_KW)) {
+		THROW(SYS_INVALID_INPUT_PARAM,
+		      fmt::format("[{}] {} requires {}", _instance_name, PROFILE_RULES_KW, PROFILE_DIRECTORY_KW));
+	}
+	plugin_config::profile_directory = _plugin_spec_cfg.at(PROFILE_DIRECTORY_KW).get<std::string>();
+
+	if (_plugin_spec_cfg.count(PROFILE_SAMPLE_RATE_KW)) {
+		plugin_config::profile_sample_rate = _plugin_spec_cfg.at(PROFILE_SAMPLE_RATE_KW).get<double>();
+		if (!(plugin_config::profile_sample_rate >= 0 && plugin_config::profile_sample_rate <= 1)) {
+			THROW(SYS_INVALID_INPUT_PARAM,
+			      fmt::format("[{}] invalid value for {}: [{}]. Expected a number from 0 to 1.",
+			                  _instance_name,
+			                  PROFILE_SAMPLE_RATE_KW,
+			                  plugin_config::profile_sample_rate));
+		}
+	}
+
+	if (_plugin_spec_cfg.count(PROFILE_FORMAT_KW)) {
+		plugin_config::profile_format = _plugin_spec_cfg.at(PROFILE_FORMAT_KW).get<std::string>();
+		if (plugin_config::profile_format != PROFILE_FORMAT_PSTATS &&
+		    plugin_config::profile_format != PROFILE_FORMAT_COLLAPSED) {
+			THROW(SYS_INVALID_INPUT_PARAM,
+			      fmt::format("[{}] invalid value for {}: [{}]. Expected \"{}\" or \"{}\".",
+			                  _instance_name,
+			                  PROFILE_FORMAT_KW,
+			                  plugin_config::profile_format,
+			                  PROFILE_FORMAT_PSTATS,
+			                  PROFILE_FORMAT_COLLAPSED));
+		}
+	}
+
+	if (_plugin_spec_cfg.count(PROFILE_MAX_FILE_BYTES_KW)) {
+		plugin_config::profile_max_file_bytes = _plugin_spec_cfg.at(PROFILE_MAX_FILE_BYTES_KW).get<std::size_t>();
+	}
+
+	// clang-format off
+	log_re::info({
+		{"rule_engine_plugin", rule_engine_name},
+		{"instance_name", _instance_name},
+		{"log_message", "profiling rules"},
+		{"profile_rules", pattern},
+		{"profile_sample_rate", std::to_string(plugin_config::profile_sample_rate)},
+		{"profile_directory", plugin_config::profile_directory},
+		{"profile_format", plugin_config::profile_format},
+		{"profile_max_file_bytes", std::to_string(plugin_config::profile_max_file_bytes)},
+	});
+	// clang-format on
+}
+
+void configure_warm_up(const nlohmann::json& _plugin_spec_cfg, const std::string& _instance_name)
+{
+	if (_plugin_spec_cfg.count(WARM_UP_MODULES_KW)) {
+		plugin_config::warm_up_modules = _plugin_spec_cfg.at(WARM_UP_MODULES_KW).get<std::vector<std::string>>();
+	}
+
+	if (_plugin_spec_cfg.count(PRECOMPILE_BYTECODE_KW)) {
+		plugin_config::precompile_bytecode = _plugin_spec_cfg.at(PRECOMPILE_BYTECODE_KW).get<bool>();
+	}
+
+	if (_plugin_spec_cfg.count(FREEZE_GC_AFTER_START_KW)) {
+		plugin_config::freeze_gc_after_start = _plugin_spec_cfg.at(FREEZE_GC_AFTER_START_KW).get<bool>();
+	}
+
+	if (_plugin_spec_cfg.count(DEFERRED_WORK_DRAIN_TIMEOUT_KW)) {
+		plugin_config::deferred_work_drain_timeout = _plugin_spec_cfg.at(DEFERRED_WORK_DRAIN_TIMEOUT_KW).get<double>();
+	}
+
+	std::string modules;
+	for (const auto& name : plugin_config::warm_up_modules) {
+		modules += modules.empty() ? name : ", " + name;
+	}
+
+	// clang-format off
+	log_re::debug({
+		{"rule_engine_plugin", rule_engine_name},
+		{"instance_name", _instance_name},
+		{"log_message", "configured interpreter warm-up"},
+		{"warm_up_modules", modules},
+		{"precompile_bytecode", plugin_config::precompile_bytecode ? "true" : "false"},
+		{"freeze_gc_after_start", plugin_config::freeze_gc_after_start ? "true" : "false"},
+		{"deferred_work_drain_timeout_in_seconds", std::to_string(plugin_config::deferred_work_drain_timeout)},
+	});
+	// clang-format on
+}
+
+void configure_time_budgets(const nlohmann::json& _plugin_spec_cfg, const std::string& _instance_name)
+{
+	if (_plugin_spec_cfg.count(RULE_TIME_BUDGET_KW)) {
+		plugin_config::rule_time_budget = _plugin_spec_cfg.at(RULE_TIME_BUDGET_KW).get<double>();
+	}
+
+	if (_plugin_spec_cfg.count(RULE_TIME_BUDGETS_KW)) {
+		plugin_config::rule_time_budgets =
+			_plugin_spec_cfg.at(RULE_TIME_BUDGETS_KW).get<std::unordered_map<std::string, double>>();
+	}
+
+	if (plugin_config::rule_time_budget < 0) {
+		THROW(SYS_INVALID_INPUT_PARAM,
+		      fmt::format("[{}] invalid value for {}: [{}]. Expected a number of seconds, or 0 for no budget.",
+		                  _instance_name,
+		                  RULE_TIME_BUDGET_KW,
+		                  plugin_config::rule_time_budget));
+	}
+	for (const auto& [rule_name, budget] : plugin_config::rule_time_budgets) {
+		if (budget < 0) {
+			THROW(SYS_INVALID_INPUT_PARAM,
+			      fmt::format("[{}] invalid value for {} of rule [{}]: [{}]. Expected a number of seconds, or 0 "
+			                  "for no budget.",
+			                  _instance_name,
+			                  RULE_TIME_BUDGETS_KW,
+			                  rule_name,
+			                  budget));
+		}
+	}
+
+	// clang-format off
+	log_re::debug({
+		{"rule_engine_plugin", rule_engine_name},
+		{"instance_name", _instance_name},
+		{"log_message", "configured rule time budgets"},
+		{"rule_time_budget_in_seconds", std::to_string(plugin_config::rule_time_budget)},
+		{"rule_time_budgets", std::to_string(plugin_config::rule_time_budgets.size())},
+	});
+	// clang-format on
+}
+
+namespace
+{
+	irods::error to_irods_error_object(const bp::object& object)
+	{
+		if (bp::extract<int> result{object}; result.check()) {
+			const int ec = result();
+
+			if (ec < 0) {
+				return ERROR(ec, "");
+			}
+
+			return CODE(ec);
+		}
+
+		return SUCCESS();
+	}
+
+	// Returns the iRODS error code carried by a Python exception: the code attribute of an
+	// irods_errors.CallbackError or irods_errors.RuleTimeoutError, or else the code in an
+	// "[iRods__Error__Code:<code>]" prefix within the formatted exception (e.g. a RuntimeError raised
+	// by a rule with such a message). Returns -1 if there is neither.
+	int error_code_from_python_exception(PyObject* _value, const std::string& _formatted_exception)
+	{
+		for (PyObject* error_type :
+		     {irods::re::python::callback_error_type(), irods::re::python::rule_timeout_error_type()}) {
+			if (!_value || !error_type || !PyObject_TypeCheck(_value, reinterpret_cast<PyTypeObject*>(error_type))) {
+				continue;
+			}
+			bp::handle<> code{bp::allow_null(PyObject_GetAttrString(_value, "code"))};
+			const long error_code = code ? PyLong_AsLong(code.get()) : -1;
+			if (!PyErr_Occurred()) {
+				return static_cast<int>(error_code);
+			}
+			PyErr_Clear();
+		}
+
+		auto start_pos = _formatted_exception.find(IRODS_ERROR_PREFIX);
+		if (start_pos == std::string::npos) {
+			return -1;
+		}
+		start_pos += IRODS_ERROR_PREFIX.size();
+		auto end_pos = _formatted_exception.find_first_of("]", start_pos);
+		return boost::lexical_cast<int>(_formatted_exception.substr(start_pos, end_pos - start_pos));
+	}
+
+	// Fetches and clears the pending Python exception, and returns it formatted with its traceback.
+	// If _error_code is not null, it receives the error code carried by the exception (see
+	// error_code_from_python_exception).
+	std::string extract_python_exception(int* _error_code = nullptr)
+	{
+		PyObject *exc, *val, *tb;
+		PyErr_Fetch(&exc, &val, &tb);
+		PyErr_NormalizeException(&exc, &val, &tb);
+		bp::handle<> hexc(exc), hval(bp::allow_null(val)), htb(bp::allow_null(tb));
+
+		std::string formatted_exception;
+		if (!hval) {
+			formatted_exception = bp::extract<std::string>(bp::str(hexc));
+		}
+		else {
+			bp::object traceback(bp::import("traceback"));
+			bp::object format_exception(traceback.attr("format_exception"));
+			bp::object formatted_list(format_exception(hexc, hval, htb));
+			bp::object formatted(bp::str("").join(formatted_list));
+
+			formatted_exception = bp::extract<std::string>(formatted);
+		}
+
+		if (_error_code) {
+			*_error_code = error_code_from_python_exception(hval.get(), formatted_exception);
+		}
+		return formatted_exception;
+	}
+
+	namespace StringFromPythonUnicode
+	{
+		void* convertible(PyObject* py_obj)
+		{
+			if (PyUnicode_Check(py_obj)) {
+				return py_obj;
+			}
+
+			return nullptr;
+		}
+
+		void construct(PyObject* py_obj, boost::python::converter::rvalue_from_python_stage1_data* data)
+		{
+			bp::handle<> h_encoded(PyUnicode_AsUTF8String(py_obj));
+			void* storage = reinterpret_cast<boost::python::converter::rvalue_from_python_storage<std::string>*>(data)
+			                    ->storage.bytes;
+			new (storage) std::string(PyBytes_AsString(h_encoded.get()));
+			data->convertible = storage;
+		}
+
+		void register_converter()
+		{
+			bp::converter::registry::push_back(&convertible, &construct, bp::type_id<std::string>());
+		}
+	} // namespace StringFromPythonUnicode
+
+	ruleExecInfo_t* get_rei_from_effect_handler(irods::callback effect_handler)
+	{
+		ruleExecInfo_t* rei = nullptr;
+		irods::error err = effect_handler("unsafe_ms_ctx", &rei);
+
+		if (!err.ok()) {
+			// clang-format off
+			log_re::error({
+				{"rule_engine_plugin", rule_engine_name},
+				{"log_message", "Could not retrieve RuleExecInfo_t object from effect handler"},
+			});
+			// clang-format on
+			return nullptr;
+		}
+
+		if (!rei) {
+			// clang-format off
+			log_re::error({
+				{"rule_engine_plugin", rule_engine_name},
+				{"log_message", "RuleExecInfo object is NULL - cannot populate session vars"},
+			});
+			// clang-format on
+			return nullptr;
+		}
+
+		return rei;
+	}
+
+	// Owner of the long-lived thread state of an OS thread in persistent thread state mode.
+	//
+	// The thread state is created on first use and deleted when the thread exits. stop() deletes
+	// all thread states still registered in python_state::ts_persistent and bumps the generation,
+	// after which a thread creates a new thread state on its next call. Lock order is always
+	// ts_persistent_mutex before the GIL, so neither side waits for the GIL while holding the mutex.
+	class persistent_thread_state
+	{
+	  public:
+		persistent_thread_state() = default;
+
+		~persistent_thread_state()
+		{
+			if (!thread_state) {
+				return;
+			}
+
+			{
+				std::lock_guard<std::mutex> lock{python_state::ts_persistent_mutex};
+				if (generation != python_state::ts_persistent_generation.load() ||
+				    0 == python_state::ts_persistent.erase(thread_state))
+				{
+					// Already deleted by stop()
+					return;
+				}
+			}
+
+			PyEval_RestoreThread(thread_state);
+			PyThreadState_Clear(thread_state);
+			PyThreadState_DeleteCurrent();
+		}
+
+		persistent_thread_state(const persistent_thread_state&) = delete;
+
+		persistent_thread_state& operator=(const persistent_thread_state&) = delete;
+
+		// Returns the thread state of the calling thread, creating it if needed
+		PyThreadState* get()
+		{
+			const auto current_generation = python_state::ts_persistent_generation.load(std::memory_order_acquire);
+			if (!thread_state || generation != current_generation) {
+				thread_state = PyThreadState_New(python_state::ts_main->interp);
+				generation = current_generation;
+
+				std::lock_guard<std::mutex> lock{python_state::ts_persistent_mutex};
+				python_state::ts_persistent.insert(thread_state);
+			}
+			return thread_state;
+		}
+
+		// Deletes all thread states that have not been deleted by their threads yet.
+		// Must be called without holding the GIL.
+		static void delete_all()
+		{
+			std::unordered_set<PyThreadState*> thread_states;
+			{
+				std::lock_guard<std::mutex> lock{python_state::ts_persistent_mutex};
+				thread_states.swap(python_state::ts_persistent);
+				python_state::ts_persistent_generation.fetch_add(1, std::memory_order_release);
+			}
+
+			PyEval_RestoreThread(python_state::ts_main);
+			for (PyThreadState* thread_state : thread_states) {
+				PyThreadState_Clear(thread_state);
+				PyThreadState_Delete(thread_state);
+			}
+			PyEval_SaveThread();
+		}
+
+	  private:
+		PyThreadState* thread_state = nullptr;
+		std::uint64_t generation = 0;
+	}; // class persistent_thread_state
+
+	// Helper struct for managing python thread state
+	struct python_thread_state_scope
+	{
+		python_thread_state_scope()
+		{
+			if (0 == python_state::ts_thread_refct) {
+				if (plugin_config::persistent_thread_states) {
+					static thread_local persistent_thread_state ts_persistent;
+					python_state::ts_thread = ts_persistent.get();
+					PyEval_RestoreThread(python_state::ts_thread);
+				}
+				else {
+					python_state::ts_thread = PyThreadState_New(python_state::ts_main->interp);
+					PyEval_RestoreThread(python_state::ts_thread);
+					python_state::ts_thread_old = PyThreadState_Swap(python_state::ts_thread);
+				}
+			}
+			else if (python_state::ts_thread_released) {
+				// A microservice called by a rule on this thread has re-entered the plugin
+				// while the GIL was released for it, so take the GIL back for the nested call.
+				PyEval_RestoreThread(std::exchange(python_state::ts_thread_released, nullptr));
+				reacquired_gil = true;
+			}
+			python_state::ts_thread_refct++;
+		}
+
+		~python_thread_state_scope()
+		{
+			if (1 == python_state::ts_thread_refct) {
+				if (plugin_config::persistent_thread_states) {
+					PyEval_SaveThread();
+				}
+				else {
+					PyThreadState_Swap(python_state::ts_thread_old);
+					PyThreadState_Clear(python_state::ts_thread);
+					PyThreadState_DeleteCurrent();
+				}
+			}
+			else if (reacquired_gil) {
+				python_state::ts_thread_released = PyEval_SaveThread();
+			}
+			python_state::ts_thread_refct--;
+		}
+
+		python_thread_state_scope(const python_thread_state_scope&) = delete;
+
+		python_thread_state_scope& operator=(const python_thread_state_scope&) = delete;
+
+	  private:
+		bool reacquired_gil = false;
+	}; //struct python_thread_state_scope
+
+	// Helper struct for releasing the GIL while a rule waits on the effect handler.
+	// Only has an effect in concurrent execution mode; in serialized mode python_mutex
+	// is held anyway, so there is nobody to hand the interpreter to.
+	struct python_gil_release_scope
+	{
+		python_gil_release_scope()
+		{
+			if (plugin_config::concurrent_execution && !python_state::ts_thread_released) {
+				python_state::ts_thread_released = PyEval_SaveThread();
+				released = true;
+			}
+		}
+
+		~python_gil_release_scope()
+		{
+			if (released) {
+				PyEval_RestoreThread(std::exchange(python_state::ts_thread_released, nullptr));
+			}
+		}
+
+		python_gil_release_scope(const python_gil_release_scope&) = delete;
+
+		python_gil_release_scope& operator=(const python_gil_release_scope&) = delete;
+
+	  private:
+		bool released = false;
+	}; //struct python_gil_release_scope
+
+	// Helper class guarding entry into the Python interpreter from the plugin operations.
+	//
+	// In serialized mode (the default) this holds python_mutex for the whole operation, which
+	// is what every entry point did historically. In concurrent mode the mutex is only taken
+	// when _always_serialize is set (for operations that rebind globals in __main__, builtins or the
+	// rulebase); otherwise it only bounds the number of threads running rules at the same time.
+	class python_execution_guard
+	{
+	  public:
+		explicit python_execution_guard(bool _always_serialize = false)
+		{
+			if (!plugin_config::concurrent_execution || _always_serialize) {
+				python_mutex.lock();
+				holds_mutex = true;
+			}
+
+			if (plugin_config::concurrent_execution && 0 == depth++ && plugin_config::max_concurrent_rules > 0) {
+				std::unique_lock<std::mutex> lock{slot_mutex};
+				slot_available.wait(lock, [] { return slots_in_use < plugin_config::max_concurrent_rules; });
+				++slots_in_use;
+				holds_slot = true;
+			}
+		}
+
+		~python_execution_guard()
+		{
+			if (holds_slot) {
+				{
+					std::lock_guard<std::mutex> lock{slot_mutex};
+					--slots_in_use;
+				}
+				slot_available.notify_one();
+			}
+
+			if (plugin_config::concurrent_execution) {
+				--depth;
+			}
+
+			if (holds_mutex) {
+				python_mutex.unlock();
+			}
+		}
+
+		python_execution_guard(const python_execution_guard&) = delete;
+
+		python_execution_guard& operator=(const python_execution_guard&) = delete;
+
+	  private:
+		// Nesting depth of guards on this thread, so that re-entrant calls do not wait on a slot
+		static thread_local inline std::size_t depth = 0;
+
+		static inline std::mutex slot_mutex;
+		static inline std::condition_variable slot_available;
+		static inline std::size_t slots_in_use = 0;
+
+		bool holds_mutex = false;
+		bool holds_slot = false;
+	}; //class python_execution_guard
+
+	// Watchdog enforcing the time budgets of rules.
+	//
+	// Rules register a deadline with arm() before they run and remove it with disarm() when they are
+	// done. A thread, started by the first arm(), waits for the earliest deadline and, once it has
+	// passed, takes the GIL and raises irods_errors.RuleTimeoutError asynchronously in the thread
+	// running the rule. Python only checks for such exceptions between bytecode instructions, so a rule
+	// waiting on a microservice is interrupted when the microservice returns.
+	class rule_watchdog
+	{
+	  public:
+		using clock = std::chrono::steady_clock;
+
+		// Registers a deadline for the rule running on the thread with the Python thread identifier
+		// _thread_id. _fired is set when the exception has been raised. Returns the deadline's id.
+		std::uint64_t arm(clock::time_point _deadline, unsigned long _thread_id, std::atomic<bool>* _fired)
+		{
+			std::lock_guard<std::mutex> lock{mutex};
+			if (!thread.joinable()) {
+				thread = std::thread{[this] { run(); }};
+			}
+			const std::uint64_t id = ++last_id;
+			deadlines.emplace(id, deadline{_deadline, _thread_id, _fired});
+			wakeup.notify_one();
+			return id;
+		}
+
+		// Removes a deadline, and clears its exception if it was raised but not delivered yet (e.g.
+		// because the rule returned in the meantime). Must hold the GIL.
+		void disarm(std::uint64_t _id)
+		{
+			std::lock_guard<std::mutex> lock{mutex};
+			const auto iter = deadlines.find(_id);
+			if (iter == deadlines.end()) {
+				return;
+			}
+			if (iter->second.fired->load()) {
+				PyThreadState_SetAsyncExc(iter->second.thread_id, nullptr);
+			}
+			deadlines.erase(iter);
+		}
+
+		// Stops the watchdog thread. Must be called without holding the GIL.
+		void stop()
+		{
+			{
+				std::lock_guard<std::mutex> lock{mutex};
+				stopping = true;
+			}
+			wakeup.notify_one();
+			if (thread.joinable()) {
+				thread.join();
+			}
+			stopping = false;
+		}
+
+	  private:
+		struct deadline
+		{
+			clock::time_point time;
+			unsigned long thread_id;
+			std::atomic<bool>* fired;
+		}; // struct deadline
+
+		void run()
+		{
+			std::unique_lock<std::mutex> lock{mutex};
+			while (!stopping) {
+				const auto now = clock::now();
+				auto next = clock::time_point::max();
+				std::uint64_t expired_id = 0;
+				for (const auto& [id, entry] : deadlines) {
+					if (entry.fired->load()) {
+						continue;
+					}
+					if (entry.time <= now) {
+						expired_id = id;
+						break;
+					}
+					next = std::min(next, entry.time);
+				}
+
+				if (0 == expired_id) {
+					if (next == clock::time_point::max()) {
+						wakeup.wait(lock);
+					}
+					else {
+						wakeup.wait_until(lock, next);
+					}
+					continue;
+				}
+
+				// The mutex is never held while waiting for the GIL, as rules arm and disarm
+				// deadlines while holding the GIL.
+				lock.unlock();
+				const PyGILState_STATE gil_state = PyGILState_Ensure();
+				lock.lock();
+				if (const auto iter = deadlines.find(expired_id); iter != deadlines.end()) {
+					PyThreadState_SetAsyncExc(iter->second.thread_id, irods::re::python::rule_timeout_error_type());
+					iter->second.fired->store(true);
+				}
+				lock.unlock();
+				PyGILState_Release(gil_state);
+				lock.lock();
+			}
+		}
+
+		std::mutex mutex;
+		std::condition_variable wakeup;
+		std::thread thread;
+		bool stopping = false;
+		std::uint64_t last_id = 0;
+		std::unordered_map<std::uint64_t, deadline> deadlines;
+	}; // class rule_watchdog
+
+	rule_watchdog& watchdog()
+	{
+		static auto* instance = new rule_watchdog;
+		return *instance;
+	}
+
+	// Applies the time budget of a rule to the outermost rule run by the calling thread for the
+	// lifetime of the object. Rules called by that rule run within its budget. Must be created and
+	// disarmed while holding the GIL.
+	class rule_time_budget
+	{
+	  public:
+		using clock = rule_watchdog::clock;
+
+		explicit rule_time_budget(const std::string& _rule_name)
+		{
+			if (outermost) {
+				return;
+			}
+
+			const auto iter = plugin_config::rule_time_budgets.find(_rule_name);
+			seconds = iter != plugin_config::rule_time_budgets.end() ? iter->second : plugin_config::rule_time_budget;
+			if (seconds <= 0) {
+				return;
+			}
+
+			start = clock::now();
+			const auto budget = std::chrono::duration_cast<clock::duration>(std::chrono::duration<double>(seconds));
+			id = watchdog().arm(start + budget, PyThread_get_thread_ident(), &fired);
+			outermost = this;
+		}
+
+		~rule_time_budget()
+		{
+			disarm();
+		}
+
+		// Removes the deadline, if this object set one. Must hold the GIL.
+		void disarm()
+		{
+			if (outermost == this) {
+				watchdog().disarm(id);
+				outermost = nullptr;
+			}
+		}
+
+		// True if this object set the deadline, and the rule was interrupted
+		bool exceeded() const noexcept
+		{
+			return id && fired.load();
+		}
+
+		// True if the outermost rule of a nested rule was interrupted while the nested rule ran
+		bool outer_exceeded() const noexcept
+		{
+			return !id && outermost && outermost->fired.load();
+		}
+
+		double budget_in_seconds() const noexcept
+		{
+			return seconds;
+		}
+
+		double elapsed_in_seconds() const
+		{
+			return std::chrono::duration<double>(clock::now() - start).count();
+		}
+
+		rule_time_budget(const rule_time_budget&) = delete;
+
+		rule_time_budget& operator=(const rule_time_budget&) = delete;
+
+	  private:
+		static thread_local inline rule_time_budget* outermost = nullptr;
+
+		double seconds = 0;
+		clock::time_point start;
+		std::uint64_t id = 0;
+		std::atomic<bool> fired{false};
+	}; // class rule_time_budget
+
+	// Immutable set of the names bound to callables in the Python rulebase.
+	//
+	// rule_exists answers from the published set without taking python_mutex or the GIL. Sets are
+	// rebuilt by rulebase_cache whenever it notices that the rulebase changed, and a new set is
+	// published with a single atomic store only if it differs from the published one. Replaced sets
+	// are never freed because a reader may still be looking at one; there is one per change to the
+	// names of the callables in core.
+	//
+	// From Python 3.12, a dict watcher on core's namespace marks the set as stale as soon as a name
+	// in it is bound to or from a callable, so that the next rule_exists takes the GIL and rebuilds
+	// it. Otherwise, changes are noticed whenever rulebase_cache is used (by exec_rule, for example).
+	class rule_name_index
+	{
+	  public:
+		using name_set = std::unordered_set<std::string>;
+
+		// Returns the published set of rule names, or nullptr if the rulebase has not been indexed
+		// or has changed since
+		static const name_set* current() noexcept
+		{
+			if (stale.load(std::memory_order_acquire)) {
+				return nullptr;
+			}
+			return published.load(std::memory_order_acquire);
+		}
+
+		// Marks the published set as out of date until the next rebuild. Must hold the GIL.
+		static void invalidate() noexcept
+		{
+			stale.store(true, std::memory_order_release);
+		}
+
+		// Builds a set from the callables in _namespace and publishes it, unless it holds the same
+		// names as the published set. Must hold the GIL.
+		static void rebuild(PyObject* _namespace)
+		{
+			auto names = std::make_unique<name_set>();
+
+			PyObject* key = nullptr;
+			PyObject* value = nullptr;
+			Py_ssize_t pos = 0;
+			while (PyDict_Next(_namespace, &pos, &key, &value)) {
+				if (!PyUnicode_Check(key) || !PyCallable_Check(value)) {
+					continue;
+				}
+				const char* name = PyUnicode_AsUTF8(key);
+				if (!name) {
+					bp::throw_error_already_set();
+				}
+				names->emplace(name);
+			}
+
+			std::lock_guard<std::mutex> lock{built_mutex};
+			if (const auto* previous = published.load(std::memory_order_acquire); !previous || *previous != *names) {
+				built.push_back(std::move(names));
+				published.store(built.back().get(), std::memory_order_release);
+			}
+			stale.store(false, std::memory_order_release);
+		}
+
+	  private:
+		static inline std::atomic<const name_set*> published{nullptr};
+		static inline std::atomic<bool> stale{false};
+		static inline std::mutex built_mutex;
+		static inline std::vector<std::unique_ptr<const name_set>> built;
+	}; // class rule_name_index
+
+	// Helper class holding resolved handles into the Python rulebase (core.py).
+	//
+	// The core module, its namespace and the rule functions looked up in it are cached so that
+	// exec_rule does not have to go through the import machinery and a string attribute lookup
+	// on every PEP. The cache is rebuilt when sys.modules['core'] is no longer the module it was
+	// built from, and a cached function is refreshed when core's namespace binds the rule name to
+	// a different object (e.g. after importlib.reload). The rule_name_index is rebuilt along with
+	// the cache and whenever core's namespace changes: from Python 3.12 when a dict watcher has
+	// invalidated it, and before that when the version tag of the namespace dict differs from the
+	// one it was indexed at. Must only be used while holding the GIL.
+	//
+	// A module replacing core in sys.modules is noticed the next time the cache is used.
+	class rulebase_cache
+	{
+	  public:
+		// Returns the core module, importing it first if needed
+		bp::object module()
+		{
+			refresh();
+			return bp::object{core_module};
+		}
+
+		// Returns the namespace (__dict__) of the core module
+		bp::object namespace_dict()
+		{
+			refresh();
+			return bp::object{core_namespace};
+		}
+
+		// Returns the callable bound to _rule_name in the core module
+		bp::object function(const std::string& _rule_name)
+		{
+			refresh();
+
+			if (const auto entry = functions.find(_rule_name); entry != functions.end()) {
+				const auto& [name, function] = entry->second;
+				PyObject* current = PyDict_GetItemWithError(core_namespace.get(), name.get());
+				if (current == function.get()) {
+					return bp::object{function};
+				}
+				if (!current && PyErr_Occurred()) {
+					bp::throw_error_already_set();
+				}
+				functions.erase(entry);
+			}
+
+			// Resolve through the module (not its namespace) so that errors and
+			// module-level __getattr__ behave exactly as an attribute access would.
+			bp::object function = bp::object{core_module}.attr(_rule_name.c_str());
+			bp::handle<> name{PyUnicode_InternFromString(_rule_name.c_str())};
+			functions.insert_or_assign(_rule_name, std::make_pair(name, bp::handle<>{bp::borrowed(function.ptr())}));
+			return function;
+		}
+
+		// Drops all references into the interpreter
+		void clear()
+		{
+#if PY_VERSION_HEX >= 0x030C0000
+			if (core_namespace) {
+				PyDict_Unwatch(watcher_id(), core_namespace.get());
+			}
+#else
+			indexed_namespace_version = 0;
+#endif
+			functions.clear();
+			core_namespace.reset();
+			core_module.reset();
+		}
+
+	  private:
+		void refresh()
+		{
+			// TODO Enable non core.py Python rulebases
+			if (core_module && PyDict_GetItemString(PyImport_GetModuleDict(), "core") == core_module.get()) {
+				if (namespace_changed()) {
+					index_rule_names();
+				}
+				return;
+			}
+
+			clear();
+
+			bp::object core = bp::import("core");
+			bp::object core_dict = core.attr("__dict__");
+			core_dict["irods_types"] = bp::import("irods_types");
+			core_dict["irods_errors"] = bp::import("irods_errors");
+
+#if PY_VERSION_HEX >= 0x030C0000
+			if (PyDict_Watch(watcher_id(), core_dict.ptr()) < 0) {
+				bp::throw_error_already_set();
+			}
+#endif
+			core_module = bp::handle<>{bp::borrowed(core.ptr())};
+			core_namespace = bp::handle<>{bp::borrowed(core_dict.ptr())};
+			index_rule_names();
+		}
+
+		void index_rule_names()
+		{
+			rule_name_index::rebuild(core_namespace.get());
+#if PY_VERSION_HEX < 0x030C0000
+			indexed_namespace_version = reinterpret_cast<PyDictObject*>(core_namespace.get())->ma_version_tag;
+#endif
+		}
+
+#if PY_VERSION_HEX >= 0x030C0000
+		bool namespace_changed() const
+		{
+			return rule_name_index::current() == nullptr;
+		}
+
+		// Invalidates the rule_name_index when core's namespace binds a name to or from a callable.
+		// Called by the interpreter before each change.
+		static int on_change(PyDict_WatchEvent _event, PyObject* _dict, PyObject* _key, PyObject* _new_value)
+		{
+			switch (_event) {
+				case PyDict_EVENT_ADDED:
+					if (PyCallable_Check(_new_value)) {
+						rule_name_index::invalidate();
+					}
+					break;
+				case PyDict_EVENT_MODIFIED:
+				case PyDict_EVENT_DELETED: {
+					PyObject* old_value = PyDict_GetItem(_dict, _key);
+					const bool was_callable = old_value && PyCallable_Check(old_value);
+					const bool is_callable = _new_value && PyCallable_Check(_new_value);
+					if (was_callable != is_callable) {
+						rule_name_index::invalidate();
+					}
+					break;
+				}
+				default:
+					// Cleared, cloned or deallocated
+					rule_name_index::invalidate();
+					break;
+			}
+			return 0;
+		}
+
+		static int watcher_id()
+		{
+			static const int id = PyDict_AddWatcher(&on_change);
+			return id;
+		}
+#else
+		bool namespace_changed() const
+		{
+			return reinterpret_cast<PyDictObject*>(core_namespace.get())->ma_version_tag != indexed_namespace_version;
+		}
+
+		// Version tag of core's namespace when the rule_name_index was last rebuilt
+		std::uint64_t indexed_namespace_version = 0;
+#endif
+
+		bp::handle<> core_module;
+		bp::handle<> core_namespace;
+		// rule name -> (interned Python name, function)
+		std::unordered_map<std::string, std::pair<bp::handle<>, bp::handle<>>> functions;
+	}; // class rulebase_cache
+
+	rulebase_cache& rulebase()
+	{
+		// Intentionally leaked, its contents are released in stop() while the GIL is held
+		static auto* cache = new rulebase_cache;
+		return *cache;
+	}
+
+	// Imports the rulebase so that rule_exists can be answered from the rule_name_index.
+	// Failures are logged but not fatal, the import is retried the first time a rule is needed.
+	void load_rulebase(const std::string& _instance_name)
+	{
+		python_execution_guard guard{true};
+		python_thread_state_scope tstate;
+		// tstate (and therefore also guard) needs to stay in scope for extract_python_exception
+		try {
+			rulebase().module();
+		}
+		catch (const bp::error_already_set&) {
+			const std::string formatted_python_exception = extract_python_exception();
+			// clang-format off
+			log_re::warn({
+				{"rule_engine_plugin", rule_engine_name},
+				{"instance_name", _instance_name},
+				{"log_message", "failed to load Python rulebase at startup"},
+				{"python_exception", formatted_python_exception},
+			});
+			// clang-format on
+		}
+	}
+
+	// Imports the warm_up_modules, writes bytecode caches and freezes the garbage collector as configured,
+	// after load_rulebase. Modules which fail to import are logged and skipped.
+	void warm_up_interpreter(const std::string& _instance_name)
+	{
+		python_execution_guard guard{true};
+		python_thread_state_scope tstate;
+		// tstate (and therefore also guard) needs to stay in scope for extract_python_exception
+		const auto log_python_exception = [&_instance_name](const std::string& _message, const std::string& _module) {
+			const std::string formatted_python_exception = extract_python_exception();
+			// clang-format off
+			log_re::warn({
+				{"rule_engine_plugin", rule_engine_name},
+				{"instance_name", _instance_name},
+				{"log_message", _message},
+				{"module", _module},
+				{"python_exception", formatted_python_exception},
+			});
+			// clang-format on
+		};
+
+		std::vector<bp::object> modules;
+		if (const auto core = PyDict_GetItemString(PyImport_GetModuleDict(), "core")) {
+			modules.emplace_back(bp::handle<>{bp::borrowed(core)});
+		}
+		for (const auto& name : plugin_config::warm_up_modules) {
+			try {
+				modules.push_back(bp::import(name.c_str()));
+			}
+			catch (const bp::error_already_set&) {
+				log_python_exception("failed to import module during warm-up", name);
+			}
+		}
+
+		if (plugin_config::precompile_bytecode) {
+			for (const auto& module : modules) {
+				try {
+					// Only compiles the source if the cached bytecode is missing or stale. Files which
+					// cannot be written (e.g. in a read-only directory) are skipped quietly.
+					bp::object file = bp::getattr(module, "__file__", bp::object{});
+					if (!file.is_none() && bp::extract<std::string>(file)().ends_with(".py")) {
+						bp::import("compileall").attr("compile_file")(file, bp::object{}, false, bp::object{}, 2);
+					}
+				}
+				catch (const bp::error_already_set&) {
+					log_python_exception("failed to precompile module during warm-up",
+					                     bp::extract<std::string>(module.attr("__name__")));
+				}
+			}
+		}
+
+		if (plugin_config::freeze_gc_after_start) {
+			try {
+				bp::object gc = bp::import("gc");
+				gc.attr("collect")();
+				gc.attr("freeze")();
+			}
+			catch (const bp::error_already_set&) {
+				log_python_exception("failed to freeze the garbage collector", "gc");
+			}
+		}
+	}
+
+	// Waits for the work queued by rules with the deferred_work module, if a rule imported it, for up to
+	// deferred_work_drain_timeout seconds. Must be called while holding the GIL.
+	void drain_deferred_work()
+	{
+		PyObject* deferred_work = PyDict_GetItemString(PyImport_GetModuleDict(), "deferred_work");
+		if (!deferred_work) {
+			return;
+		}
+
+		try {
+			const bp::object module{bp::handle<>{bp::borrowed(deferred_work)}};
+			const long queued = bp::extract<long>(module.attr("stats")()["queued"]);
+			const bool drained = bp::extract<bool>(module.attr("shutdown")(plugin_config::deferred_work_drain_timeout));
+			if (!drained) {
+				// clang-format off
+				log_re::warn({
+					{"rule_engine_plugin", rule_engine_name},
+					{"log_message", "deferred work discarded at shutdown"},
+					{"queued_at_shutdown", std::to_string(queued)},
+					{"deferred_work_drain_timeout_in_seconds", std::to_string(plugin_config::deferred_work_drain_timeout)},
+				});
+				// clang-format on
+			}
+		}
+		catch (const bp::error_already_set&) {
+			const std::string formatted_python_exception = extract_python_exception();
+			// clang-format off
+			log_re::error({
+				{"rule_engine_plugin", rule_engine_name},
+				{"log_message", "failed to drain deferred work"},
+				{"python_exception", formatted_python_exception},
+			});
+			// clang-format on
+		}
+	}
+
+	// Registers one exact-match regex per name in the rule_name_index, so that the server only
+	// asks this plugin about rules the rulebase defines. Returns false if there is no index.
+	bool register_regexes_from_rule_names(const std::string& _instance_name)
+	{
+		const auto* names = rule_name_index::current();
+		if (!names) {
+			return false;
+		}
+
+		for (const auto& name : *names) {
+			std::string regex;
+			regex.reserve(name.size());
+			for (const char c : name) {
+				if (!std::isalnum(static_cast<unsigned char>(c)) && c != '_') {
+					regex += '\\';
+				}
+				regex += c;
+			}
+			RuleExistsHelper::Instance()->registerRuleRegex(regex);
+		}
+
+		// clang-format off
+		log_re::debug({
+			{"rule_engine_plugin", rule_engine_name},
+			{"instance_name", _instance_name},
+			{"log_message", "registered regexes derived from the Python rulebase"},
+			{"regex_count", std::to_string(names->size())},
+		});
+		// clang-format on
+		return true;
+	}
+
+	// LRU cache of code objects compiled from rule text, keyed by the text they were compiled from.
+	//
+	// Holds at most max_entries code objects whose keys take up at most max_key_bytes in total
+	// (0 = unlimited). Lookups hash the full key, and a hit is only reported for an identical key,
+	// so distinct rule texts can never share a code object. Must only be used while holding the GIL.
+	class compiled_code_cache
+	{
+	  public:
+		compiled_code_cache(std::string _filename, std::size_t _max_entries, std::size_t _max_key_bytes = 0)
+			: filename{std::move(_filename)}
+			, max_entries{_max_entries}
+			, max_key_bytes{_max_key_bytes}
+		{
+		}
+
+		// Returns the code object for _key, compiling the source returned by _make_source on a miss
+		template <typename SourceFunction>
+		bp::object get(const std::string& _key, SourceFunction&& _make_source)
+		{
+			if (const auto entry = index.find(_key); entry != index.end()) {
+				++hits;
+				entries.splice(entries.begin(), entries, entry->second);
+				return bp::object{entry->second->code};
+			}
+
+			++misses;
+			const std::string source = _make_source();
+			bp::handle<> code{Py_CompileString(source.c_str(), filename.c_str(), Py_file_input)};
+
+			// In concurrent mode, another thread may have cached the same text while this one was compiling,
+			// if compiling ran Python code (e.g. finalizers run by the garbage collector)
+			if (const auto entry = index.find(_key); entry != index.end()) {
+				return bp::object{entry->second->code};
+			}
+
+			if (max_entries > 0 && (max_key_bytes == 0 || _key.size() <= max_key_bytes)) {
+				while (entries.size() >= max_entries ||
+				       (max_key_bytes > 0 && key_bytes + _key.size() > max_key_bytes))
+				{
+					key_bytes -= entries.back().key.size();
+					index.erase(entries.back().key);
+					entries.pop_back();
+					++evictions;
+				}
+				entries.push_front(cache_entry{_key, code});
+				index.emplace(entries.front().key, entries.begin());
+				key_bytes += _key.size();
+			}
+
+			// clang-format off
+			log_re::trace({
+				{"rule_engine_plugin", rule_engine_name},
+				{"log_message", "compiled rule text"},
+				{"filename", filename},
+				{"cache_entries", std::to_string(entries.size())},
+				{"cache_bytes", std::to_string(key_bytes)},
+				{"cache_hits", std::to_string(hits)},
+				{"cache_misses", std::to_string(misses)},
+				{"cache_evictions", std::to_string(evictions)},
+			});
+			// clang-format on
+
+			return bp::object{code};
+		}
+
+		// Drops all references into the interpreter
+		void clear()
+		{
+			index.clear();
+			entries.clear();
+			key_bytes = 0;
+		}
+
+	  private:
+		struct cache_entry
+		{
+			std::string key;
+			bp::handle<> code;
+		};
+
+		const std::string filename;
+		const std::size_t max_entries;
+		const std::size_t max_key_bytes;
+
+		// Most recently used entry first. The index refers to the keys stored in the list nodes.
+		std::list<cache_entry> entries;
+		std::unordered_map<std::string_view, std::list<cache_entry>::iterator> index;
+
+		std::size_t key_bytes = 0;
+		std::size_t hits = 0;
+		std::size_t misses = 0;
+		std::size_t evictions = 0;
+	}; // class compiled_code_cache
+
+	compiled_code_cache& delay_rule_code_cache()
+	{
+		// Intentionally leaked, its contents are released in stop() while the GIL is held
+		static auto* cache = new compiled_code_cache{"<delay rule>", plugin_config::delay_rule_code_cache_size};
+		return *cache;
+	}
+
+	compiled_code_cache& irule_code_cache()
+	{
+		// Intentionally leaked, its contents are released in stop() while the GIL is held
+		static auto* cache = new compiled_code_cache{
+			"<irule>", plugin_config::irule_code_cache_size, plugin_config::irule_code_cache_max_bytes};
+		return *cache;
+	}
+
+	// Call counts and latencies per rule or microservice name, recorded when instrumentation is enabled.
+	//
+	// Histogram bucket k counts the calls which took less than 2^k microseconds (and, for k > 0, at least
+	// 2^(k-1)); the last bucket counts all slower calls. Only a mutex is taken, never the GIL, so calls may
+	// be recorded while the GIL is released.
+	class latency_statistics
+	{
+	  public:
+		static constexpr std::size_t bucket_count = 25;
+
+		struct entry
+		{
+			std::uint64_t calls = 0;
+			std::uint64_t errors = 0;
+			std::chrono::nanoseconds total_time{};
+			std::chrono::nanoseconds max_time{};
+			std::chrono::nanoseconds lock_wait_time{};
+			std::array<std::uint64_t, bucket_count> histogram{};
+		}; // struct entry
+
+		void record(const std::string& _name,
+		            std::chrono::nanoseconds _time,
+		            std::chrono::nanoseconds _lock_wait_time,
+		            bool _error)
+		{
+			const auto microseconds =
+				static_cast<std::uint64_t>(std::chrono::duration_cast<std::chrono::microseconds>(_time).count());
+			const auto bucket = std::min<std::size_t>(std::bit_width(microseconds), bucket_count - 1);
+
+			std::lock_guard<std::mutex> lock{mutex};
+			auto& e = entries[_name];
+			++e.calls;
+			e.errors += _error ? 1 : 0;
+			e.total_time += _time;
+			e.max_time = std::max(e.max_time, _time);
+			e.lock_wait_time += _lock_wait_time;
+			++e.histogram[bucket];
+		}
+
+		// Returns a copy of the entries, ordered by name
+		std::map<std::string, entry> snapshot() const
+		{
+			std::lock_guard<std::mutex> lock{mutex};
+			return {entries.begin(), entries.end()};
+		}
+
+		void reset()
+		{
+			std::lock_guard<std::mutex> lock{mutex};
+			entries.clear();
+		}
+
+	  private:
+		mutable std::mutex mutex;
+		std::unordered_map<std::string, entry> entries;
+	}; // class latency_statistics
+
+	latency_statistics& rule_statistics()
+	{
+		// Intentionally leaked, like the code caches
+		static auto* statistics = new latency_statistics;
+		return *statistics;
+	}
+
+	latency_statistics& microservice_statistics()
+	{
+		// Intentionally leaked, like the code caches
+		static auto* statistics = new latency_statistics;
+		return *statistics;
+	}
+
+	void log_statistics(const latency_statistics& _statistics, const std::string& _kind)
+	{
+		const auto to_microseconds = [](std::chrono::nanoseconds _time) {
+			return std::to_string(std::chrono::duration_cast<std::chrono::microseconds>(_time).count());
+		};
+
+		for (const auto& [name, entry] : _statistics.snapshot()) {
+			// Non-empty buckets, as "<upper bound in microseconds>:<count>" (the unbounded bucket as "inf:<count>")
+			std::string histogram;
+			for (std::size_t k = 0; k < entry.histogram.size(); ++k) {
+				if (entry.histogram[k] > 0) {
+					const auto bound = k + 1 < entry.histogram.size() ? std::to_string(std::uint64_t{1} << k) : "inf";
+					histogram += fmt::format("{}{}:{}", histogram.empty() ? "" : ",", bound, entry.histogram[k]);
+				}
+			}
+
+			// clang-format off
+			log_re::info({
+				{"rule_engine_plugin", rule_engine_name},
+				{"log_message", _kind + " statistics"},
+				{_kind + "_name", name},
+				{"calls", std::to_string(entry.calls)},
+				{"errors", std::to_string(entry.errors)},
+				{"total_time_in_microseconds", to_microseconds(entry.total_time)},
+				{"max_time_in_microseconds", to_microseconds(entry.max_time)},
+				{"lock_wait_time_in_microseconds", to_microseconds(entry.lock_wait_time)},
+				{"histogram_in_microseconds", histogram},
+			});
+			// clang-format on
+		}
+	}
+
+	// Writes the recorded statistics to the server log if instrumentation_log_interval seconds have passed
+	// since they were last written (or since the first call). Only one thread writes them for each interval.
+	void log_statistics_if_due()
+	{
+		if (plugin_config::instrumentation_log_interval <= 0) {
+			return;
+		}
+
+		static std::atomic<std::int64_t> next_log_time{0};
+
+		const auto now =
+			std::chrono::duration_cast<std::chrono::seconds>(std::chrono::steady_clock::now().time_since_epoch())
+				.count();
+		auto due = next_log_time.load();
+		if (0 == due) {
+			next_log_time.compare_exchange_strong(due, now + plugin_config::instrumentation_log_interval);
+			return;
+		}
+		if (now < due || !next_log_time.compare_exchange_strong(due, now + plugin_config::instrumentation_log_interval))
+		{
+			return;
+		}
+
+		log_statistics(rule_statistics(), "rule");
+		log_statistics(microservice_statistics(), "microservice");
+	}
+
+	// Returns the entries of _statistics as a dict of dicts, with times in seconds
+	bp::dict statistics_to_python(const latency_statistics& _statistics)
+	{
+		const auto to_seconds = [](std::chrono::nanoseconds _time) {
+			return std::chrono::duration<double>(_time).count();
+		};
+
+		bp::dict ret;
+		for (const auto& [name, entry] : _statistics.snapshot()) {
+			bp::list histogram;
+			for (const auto count : entry.histogram) {
+				histogram.append(count);
+			}
+
+			bp::dict entry_python;
+			entry_python["calls"] = entry.calls;
+			entry_python["errors"] = entry.errors;
+			entry_python["total_time"] = to_seconds(entry.total_time);
+			entry_python["max_time"] = to_seconds(entry.max_time);
+			entry_python["lock_wait_time"] = to_seconds(entry.lock_wait_time);
+			entry_python["histogram"] = histogram;
+			ret[name] = entry_python;
+		}
+		return ret;
+	}
+
+	bool instrumentation_enabled()
+	{
+		return plugin_config::instrumentation;
+	}
+
+	bp::dict rule_statistics_to_python()
+	{
+		return statistics_to_python(rule_statistics());
+	}
+
+	bp::dict microservice_statistics_to_python()
+	{
+		return statistics_to_python(microservice_statistics());
+	}
+
+	void reset_statistics()
+	{
+		rule_statistics().reset();
+		microservice_statistics().reset();
+	}
+
+	BOOST_PYTHON_MODULE(plugin_statistics)
+	{
+		bp::def("enabled", &instrumentation_enabled);
+		bp::def("rules", &rule_statistics_to_python);
+		bp::def("microservices", &microservice_statistics_to_python);
+		bp::def("reset", &reset_statistics);
+
+		// Upper bounds in seconds of the buckets in each histogram
+		bp::list histogram_bounds;
+		for (std::size_t k = 0; k + 1 < latency_statistics::bucket_count; ++k) {
+			histogram_bounds.append(std::ldexp(1e-6, static_cast<int>(k)));
+		}
+		histogram_bounds.append(std::numeric_limits<double>::infinity());
+		bp::scope().attr("histogram_bounds") = bp::tuple{histogram_bounds};
+	}
+
+	// Functions of the irods_log module, which writes to the server log (rule_engine category) without
+	// going through the effect handler as callback.writeLine('serverLog', ...) does.
+	namespace python_logging
+	{
+		using level = irods::experimental::log::level;
+
+		// The level of the rule_engine category in server_config.json, read when the module is first imported
+		level configured_level()
+		{
+			static const level configured = [] {
+				try {
+					return irods::experimental::log::get_level_from_config(irods::KW_CFG_LOG_LEVEL_CATEGORY_RULE_ENGINE);
+				}
+				catch (...) {
+					return level::info;
+				}
+			}();
+			return configured;
+		}
+
+		bool enabled(level _level)
+		{
+			return static_cast<int>(_level) >= static_cast<int>(configured_level());
+		}
+
+		// irods_log.is_enabled(level), where level is one of the module's level constants
+		bool is_enabled(int _level)
+		{
+			if (_level < static_cast<int>(level::trace) || _level > static_cast<int>(level::critical)) {
+				PyErr_SetString(PyExc_ValueError, "invalid log level");
+				bp::throw_error_already_set();
+			}
+			return enabled(static_cast<level>(_level));
+		}
 
-namespace
-{
-	irods::error to_irods_error_object(const bp::object& object)
-	{
-		if (bp::extract<int> result{object}; result.check()) {
-			const int ec = result();
+		// irods_log.<level>(message, *args, **fields)
+		//
+		// Nothing is converted or formatted unless the level is enabled. The message is then formatted as
+		// message % args if there are args, or called if it is callable. Each keyword argument is added to
+		// the log entry as a field, converted with str().
+		template <level Level>
+		bp::object write(bp::tuple _args, bp::dict _kwargs)
+		{
+			if (!enabled(Level)) {
+				return bp::object{};
+			}
 
-			if (ec < 0) {
-				return ERROR(ec, "");
+			bp::object message = _args[0];
+			if (bp::len(_args) > 1) {
+				message = bp::str{message} % _args.slice(1, bp::_);
+			}
+			else if (PyCallable_Check(message.ptr())) {
+				message = message();
 			}
 
-			return CODE(ec);
+			std::vector<irods::experimental::log::key_value> entry;
+			entry.emplace_back("rule_engine_plugin", rule_engine_name);
+			entry.emplace_back("log_message", bp::extract<std::string>(bp::str{message})());
+
+			const bp::list fields = _kwargs.items();
+			for (bp::ssize_t i = 0, n = bp::len(fields); i < n; ++i) {
+				std::string key = bp::extract<std::string>(fields[i][0]);
+				if (key == "rule_engine_plugin" || key == "log_message") {
+					PyErr_SetString(PyExc_ValueError, ("reserved log field: " + key).c_str());
+					bp::throw_error_already_set();
+				}
+				entry.emplace_back(std::move(key), bp::extract<std::string>(bp::str{fields[i][1]})());
+			}
+
+			if constexpr (Level == level::trace) {
+				log_re::trace(entry);
+			}
+			else if constexpr (Level == level::debug) {
+				log_re::debug(entry);
+			}
+			else if constexpr (Level == level::info) {
+				log_re::info(entry);
+			}
+			else if constexpr (Level == level::warn) {
+				log_re::warn(entry);
+			}
+			else if constexpr (Level == level::error) {
+				log_re::error(entry);
+			}
+			else {
+				log_re::critical(entry);
+			}
+			return bp::object{};
 		}
+	} // namespace python_logging
 
-		return SUCCESS();
+	BOOST_PYTHON_MODULE(irods_log)
+	{
+		using level = python_logging::level;
+
+		bp::def("trace", bp::raw_function(&python_logging::write<level::trace>, 1));
+		bp::def("debug", bp::raw_function(&python_logging::write<level::debug>, 1));
+		bp::def("info", bp::raw_function(&python_logging::write<level::info>, 1));
+		bp::def("warn", bp::raw_function(&python_logging::write<level::warn>, 1));
+		bp::def("warning", bp::raw_function(&python_logging::write<level::warn>, 1));
+		bp::def("error", bp::raw_function(&python_logging::write<level::error>, 1));
+		bp::def("critical", bp::raw_function(&python_logging::write<level::critical>, 1));
+		bp::def("is_enabled", &python_logging::is_enabled);
+
+		bp::scope current;
+		current.attr("TRACE") = static_cast<int>(level::trace);
+		current.attr("DEBUG") = static_cast<int>(level::debug);
+		current.attr("INFO") = static_cast<int>(level::info);
+		current.attr("WARN") = static_cast<int>(level::warn);
+		current.attr("ERROR") = static_cast<int>(level::error);
+		current.attr("CRITICAL") = static_cast<int>(level::critical);
 	}
 
-	std::string extract_python_exception(void)
+	// Selects the invocations of exec_rule to run under the profiler in the rule_profiler module,
+	// and holds the RuleProfiler object used for them.
+	class rule_profiler
 	{
-		PyObject *exc, *val, *tb;
-		PyErr_Fetch(&exc, &val, &tb);
-		PyErr_NormalizeException(&exc, &val, &tb);
-		bp::handle<> hexc(exc), hval(bp::allow_null(val)), htb(bp::allow_null(tb));
+	  public:
+		// Returns true if this invocation of _rule_name is to be profiled. Without profile_rules,
+		// this is a single branch. Whether a rule name matches is only worked out once per name.
+		bool selected(const std::string& _rule_name)
+		{
+			if (!plugin_config::profile_rules || !matches(_rule_name)) {
+				return false;
+			}
 
-		if (!hval) {
-			return bp::extract<std::string>(bp::str(hexc));
-		}
-		else {
-			bp::object traceback(bp::import("traceback"));
-			bp::object format_exception(traceback.attr("format_exception"));
-			bp::object formatted_list(format_exception(hexc, hval, htb));
-			bp::object formatted(bp::str("").join(formatted_list));
+			if (plugin_config::profile_sample_rate >= 1) {
+				return true;
+			}
 
-			return bp::extract<std::string>(formatted);
+			static thread_local std::minstd_rand engine{std::random_device{}()};
+			return std::uniform_real_distribution<double>{}(engine) < plugin_config::profile_sample_rate;
 		}
-	}
 
-	namespace StringFromPythonUnicode
-	{
-		void* convertible(PyObject* py_obj)
+		// Calls _function(_args...) through RuleProfiler.profile_call, creating the RuleProfiler first if
+		// needed. Must only be used while holding the GIL.
+		template <typename... Args>
+		bp::object call(const std::string& _rule_name, const bp::object& _function, Args&&... _args)
 		{
-			if (PyUnicode_Check(py_obj)) {
-				return py_obj;
+			if (!profiler) {
+				bp::object rule_profiler_type = bp::import("rule_profiler").attr("RuleProfiler");
+				bp::object new_profiler = rule_profiler_type(
+					plugin_config::profile_directory, plugin_config::profile_format, plugin_config::profile_max_file_bytes);
+				profiler = bp::handle<>{bp::borrowed(new_profiler.ptr())};
 			}
 
-			return nullptr;
+			return bp::object{profiler}.attr("profile_call")(_rule_name, _function, std::forward<Args>(_args)...);
 		}
 
-		void construct(PyObject* py_obj, boost::python::converter::rvalue_from_python_stage1_data* data)
+		// Drops all references into the interpreter
+		void clear()
 		{
-			bp::handle<> h_encoded(PyUnicode_AsUTF8String(py_obj));
-			void* storage = reinterpret_cast<boost::python::converter::rvalue_from_python_storage<std::string>*>(data)
-			                    ->storage.bytes;
-			new (storage) std::string(PyBytes_AsString(h_encoded.get()));
-			data->convertible = storage;
+			profiler.reset();
 		}
 
-		void register_converter()
+	  private:
+		bool matches(const std::string& _rule_name)
 		{
-			bp::converter::registry::push_back(&convertible, &construct, bp::type_id<std::string>());
+			std::lock_guard<std::mutex> lock{matches_mutex};
+			auto [entry, inserted] = matches_by_name.try_emplace(_rule_name, false);
+			if (inserted) {
+				entry->second = std::regex_match(_rule_name, *plugin_config::profile_rules);
+			}
+			return entry->second;
 		}
-	} // namespace StringFromPythonUnicode
 
-	ruleExecInfo_t* get_rei_from_effect_handler(irods::callback effect_handler)
+		std::mutex matches_mutex;
+		std::unordered_map<std::string, bool> matches_by_name;
+		bp::handle<> profiler;
+	}; // class rule_profiler
+
+	rule_profiler& profiler()
 	{
-		ruleExecInfo_t* rei = nullptr;
-		irods::error err = effect_handler("unsafe_ms_ctx", &rei);
+		// Intentionally leaked, its contents are released in stop() while the GIL is held
+		static auto* profiler = new rule_profiler;
+		return *profiler;
+	}
 
-		if (!err.ok()) {
-			// clang-format off
-			log_re::error({
-				{"rule_engine_plugin", rule_engine_name},
-				{"log_message", "Could not retrieve RuleExecInfo_t object from effect handler"},
-			});
-			// clang-format on
-			return nullptr;
+	// Returns a new namespace for running rule text in, isolated from __main__ and other rules.
+	//
+	// Rule text used to run in __main__ itself, so the namespace starts out as a copy of its dict, holding
+	// the names start() defined there (such as sys). _rule_vars is bound to irods_rule_vars in the namespace, so that rules running at the same time in
+	// concurrent mode each see their own. In serialized mode it is also bound in builtins, as before, where
+	// functions defined elsewhere (e.g. in core.py) can see it.
+	bp::dict make_rule_namespace(const bp::object& _rule_vars)
+	{
+		bp::dict rule_namespace{bp::import("__main__").attr("__dict__")};
+		rule_namespace["__builtins__"] = bp::import("builtins");
+		rule_namespace["__name__"] = "__main__";
+
+		rule_namespace["irods_rule_vars"] = _rule_vars;
+		if (!plugin_config::concurrent_execution) {
+			bp::import("builtins").attr("irods_rule_vars") = _rule_vars;
 		}
 
-		if (!rei) {
-			// clang-format off
-			log_re::error({
-				{"rule_engine_plugin", rule_engine_name},
-				{"log_message", "RuleExecInfo object is NULL - cannot populate session vars"},
-			});
-			// clang-format on
-			return nullptr;
+		// deprecated alias for irods_rule_vars
+		rule_namespace["global_vars"] = _rule_vars;
+
+		// Import global constants
+		rule_namespace["irods_types"] = bp::import("irods_types");
+		rule_namespace["irods_errors"] = bp::import("irods_errors");
+
+		return rule_namespace;
+	}
+
+	// Raises an irods_errors.CallbackError (a RuntimeError) describing _err, as returned by a call through the
+	// effect handler. Its code attribute is _err.code(), so that handlers need not parse the message.
+	void throw_callback_error(const irods::error& _err)
+	{
+		std::string returnString =
+			IRODS_ERROR_PREFIX + boost::lexical_cast<std::string>(_err.code()) + "] " + _err.result().c_str();
+
+		PyObject* error_type = irods::re::python::callback_error_type();
+		if (!error_type) {
+			PyErr_SetString(PyExc_RuntimeError, returnString.c_str());
+			bp::throw_error_already_set();
 		}
 
-		return rei;
+		bp::object error{bp::handle<>{PyObject_CallFunction(error_type, "s", returnString.c_str())}};
+		error.attr("code") = _err.code();
+		PyErr_SetObject(error_type, error.ptr());
+		bp::throw_error_already_set();
 	}
 
-	// Helper struct for managing python thread state
-	struct python_thread_state_scope
+	// Whether _err, as returned by a call through the effect handler, should be reported as an error
+	bool is_callback_error(const irods::error& _err)
 	{
-		python_thread_state_scope()
+		return !_err.ok() && _err.code() != CAT_NO_ROWS_FOUND;
+	}
+
+	// The arguments of one call through the effect handler, converted from Python objects.
+	//
+	// str arguments are passed as std::string*, and anything else as an msParam_t*. Once the call has
+	// been made, to_python converts them back, in order, into the values returned to Python.
+	class callback_arguments
+	{
+	  public:
+		explicit callback_arguments(const bp::object& _arguments)
 		{
-			if (0 == python_state::ts_thread_refct) {
-				python_state::ts_thread = PyThreadState_New(python_state::ts_main->interp);
-				PyEval_RestoreThread(python_state::ts_thread);
-				python_state::ts_thread_old = PyThreadState_Swap(python_state::ts_thread);
+			for (auto&& item : _arguments) {
+				// Proxies of rule arguments are passed as the objects they refer to
+				bp::object argument = argument_proxy::unwrap(bp::object{item});
+				bp::extract<std::string> s{argument};
+				if (s.check()) {
+					strings_.push_back(s());
+					arguments_.emplace_back(&strings_.back());
+				}
+				else {
+					msParams_.push_back(msParam_from_object<genQueryInp_t,
+					                                        genQueryOut_t,
+					                                        keyValPair_t,
+					                                        fileLseekOut_t,
+					                                        rodsObjStat_t,
+					                                        bytesBuf_t,
+					                                        int,
+					                                        float>(argument));
+					arguments_.emplace_back(&msParams_.back());
+				}
 			}
-			python_state::ts_thread_refct++;
 		}
 
-		~python_thread_state_scope()
+		callback_arguments(const callback_arguments&) = delete;
+		callback_arguments& operator=(const callback_arguments&) = delete;
+
+		std::list<boost::any>& arguments()
 		{
-			if (1 == python_state::ts_thread_refct) {
-				PyThreadState_Swap(python_state::ts_thread_old);
-				PyThreadState_Clear(python_state::ts_thread);
-				PyThreadState_DeleteCurrent();
-			}
-			python_state::ts_thread_refct--;
+			return arguments_;
 		}
 
-		python_thread_state_scope(const python_thread_state_scope&) = delete;
+		// Converts the arguments back into Python objects, consuming them. The msParam_t arguments are
+		// cleared unless the call failed.
+		bp::list to_python(bool _error_occurred)
+		{
+			bp::list ret_list{};
+			while (!arguments_.empty()) {
+				auto& argument = arguments_.front();
 
-		python_thread_state_scope& operator=(const python_thread_state_scope&) = delete;
+				if (argument.type() == typeid(std::string*)) {
+					ret_list.append(strings_.front());
+					strings_.pop_front();
+				}
+				else {
+					auto& msParam = msParams_.front();
+					ret_list.append(object_from_msParam(msParam));
+
+					if (!_error_occurred) {
+						// The inpOutBuf made by msParam_from_object shares the buffer of the rule's BytesBuf,
+						// which may be memory borrowed from a Python object. Depending on the server version,
+						// clearMsParam may free it along with inpOutBuf, so a borrowed buffer is detached
+						// first; the object returned above holds its own reference to the memory's owner.
+						if (msParam.inpOutBuf && irods::re::python::types::is_borrowed_buffer(msParam.inpOutBuf->buf)) {
+							msParam.inpOutBuf->buf = nullptr;
+							msParam.inpOutBuf->len = 0;
+						}
+						clearMsParam(&msParam, 1);
+					}
 
-	}; //struct python_thread_state_scope
+					msParams_.pop_front();
+				}
+
+				arguments_.pop_front();
+			}
+			return ret_list;
+		}
+
+	  private:
+		std::list<boost::any> arguments_;
+		std::list<msParam_t> msParams_;
+		std::list<std::string> strings_;
+	}; // class callback_arguments
 
 	struct RuleCallWrapper
 	{
@@ -289,60 +2035,36 @@ namespace
 		{
 			RuleCallWrapper& self = bp::extract<RuleCallWrapper&>(args[0]);
 
-			bp::tuple rule_args_python = bp::extract<bp::tuple>(args[bp::slice(1, bp::len(args))]);
-			std::list<boost::any> rule_args_cpp;
-			std::list<msParam_t> msParams;
-			std::list<std::string> strings;
+			callback_arguments rule_args{args[bp::slice(1, bp::len(args))]};
 
-			for (auto&& rule_arg_python : rule_args_python) {
-				bp::extract<std::string> s{rule_arg_python};
-				if (s.check()) {
-					strings.push_back(s());
-					rule_args_cpp.emplace_back(&strings.back());
-				}
-				else {
-					msParams.push_back(msParam_from_object<genQueryInp_t,
-					                                       genQueryOut_t,
-					                                       keyValPair_t,
-					                                       fileLseekOut_t,
-					                                       rodsObjStat_t,
-					                                       bytesBuf_t,
-					                                       int,
-					                                       float>(rule_arg_python));
-					rule_args_cpp.emplace_back(&msParams.back());
-				}
+			// Only read when instrumentation is enabled
+			std::chrono::steady_clock::time_point start;
+			std::chrono::steady_clock::time_point returned;
+			if (plugin_config::instrumentation) {
+				start = std::chrono::steady_clock::now();
 			}
 
-			const auto err = self.effect_handler(self.rule_name, irods::unpack(rule_args_cpp));
-
-			const auto error_occurred = !err.ok() && err.code() != CAT_NO_ROWS_FOUND;
-
-			bp::list ret_list{};
-			while (!rule_args_cpp.empty()) {
-				auto& rule_arg_cpp = rule_args_cpp.front();
-
-				if (rule_arg_cpp.type() == typeid(std::string*)) {
-					ret_list.append(strings.front());
-					strings.pop_front();
+			const auto err = [&self, &rule_args, &returned] {
+				python_gil_release_scope release_gil;
+				auto err = self.effect_handler(self.rule_name, irods::unpack(rule_args.arguments()));
+				if (plugin_config::instrumentation) {
+					returned = std::chrono::steady_clock::now();
 				}
-				else {
-					ret_list.append(object_from_msParam(msParams.front()));
-
-					if (!error_occurred) {
-						clearMsParam(&msParams.front(), 1);
-					}
+				return err;
+			}();
 
-					msParams.pop_front();
-				}
+			const auto error_occurred = is_callback_error(err);
 
-				rule_args_cpp.pop_front();
+			if (plugin_config::instrumentation) {
+				// The time taken to reacquire the GIL counts as lock wait time
+				const auto now = std::chrono::steady_clock::now();
+				microservice_statistics().record(self.rule_name, now - start, now - returned, error_occurred);
 			}
 
+			bp::list ret_list = rule_args.to_python(error_occurred);
+
 			if (error_occurred) {
-				std::string returnString =
-					IRODS_ERROR_PREFIX + boost::lexical_cast<std::string>(err.code()) + "] " + err.result().c_str();
-				PyErr_SetString(PyExc_RuntimeError, returnString.c_str());
-				bp::throw_error_already_set();
+				throw_callback_error(err);
 			}
 
 			bp::dict ret;
@@ -362,19 +2084,186 @@ namespace
 
 		irods::callback& effect_handler;
 
-		RuleCallWrapper getAttribute(const std::string& rule_name)
+		// RuleCallWrapper objects already handed out, so that calling the same rule or microservice
+		// repeatedly (e.g. in a loop) does not create a new one for every call.
+		std::unordered_map<std::string, bp::object> rule_call_wrappers;
+
+		bp::object getAttribute(const std::string& rule_name)
 		{
-			return RuleCallWrapper{effect_handler, rule_name};
+			auto [wrapper, inserted] = rule_call_wrappers.try_emplace(rule_name);
+			if (inserted) {
+				wrapper->second = bp::object{RuleCallWrapper{effect_handler, rule_name}};
+			}
+			return wrapper->second;
 		}
 	}; // struct CallbackWrapper
 
+	// Calls each of _calls, a sequence of (name, arguments) pairs, through the effect handler.
+	//
+	// All arguments are converted before the first call, and the GIL is released once for the whole
+	// sequence instead of once per call. Errors do not raise an exception: the result of each call is a
+	// (code, arguments, message) tuple, where message is empty unless the call failed. If _stop_on_error
+	// is set, no calls are made after the first which fails, and fewer results are returned.
+	bp::list call_batch(CallbackWrapper& _callback, const bp::object& _calls, bool _stop_on_error)
+	{
+		std::vector<std::string> names;
+		std::list<callback_arguments> arguments;
+		for (auto&& call : _calls) {
+			names.push_back(bp::extract<std::string>(call[0]));
+			arguments.emplace_back(call[1]);
+		}
+
+		std::vector<irods::error> errors;
+		errors.reserve(names.size());
+		{
+			python_gil_release_scope release_gil;
+
+			// Only read when instrumentation is enabled
+			std::chrono::steady_clock::time_point start;
+			if (plugin_config::instrumentation) {
+				start = std::chrono::steady_clock::now();
+			}
+
+			auto call_arguments = arguments.begin();
+			for (const auto& name : names) {
+				const auto& err =
+					errors.emplace_back(_callback.effect_handler(name, irods::unpack(call_arguments->arguments())));
+				if (plugin_config::instrumentation) {
+					const auto now = std::chrono::steady_clock::now();
+					microservice_statistics().record(name, now - start, {}, is_callback_error(err));
+					start = now;
+				}
+				if (_stop_on_error && is_callback_error(err)) {
+					break;
+				}
+				++call_arguments;
+			}
+		}
+
+		bp::list ret;
+		auto call_arguments = arguments.begin();
+		for (const auto& err : errors) {
+			const auto error_occurred = is_callback_error(err);
+			ret.append(bp::make_tuple(err.code(),
+			                          bp::tuple{call_arguments->to_python(error_occurred)},
+			                          error_occurred ? err.result() : std::string{}));
+			++call_arguments;
+		}
+		// Calls skipped by _stop_on_error
+		for (; call_arguments != arguments.end(); ++call_arguments) {
+			call_arguments->to_python(false);
+		}
+		return ret;
+	}
+
+	// Fetches up to _max_rows rows from the GenQuery2 resultset identified by _handle.
+	//
+	// msi_genquery2_next_row and msi_genquery2_column are called through the effect handler from
+	// here rather than from Python, so a batch of rows costs one call into the plugin instead of
+	// one per cell. Fewer than _max_rows rows are returned only at the end of the resultset.
+	bp::list genquery2_fetch_rows(CallbackWrapper& _callback, std::string _handle, int _column_count, int _max_rows)
+	{
+		std::vector<std::string> column_indexes;
+		for (int c = 0; c < _column_count; ++c) {
+			column_indexes.push_back(std::to_string(c));
+		}
+
+		std::vector<std::vector<std::string>> rows;
+		irods::error err = SUCCESS();
+		{
+			python_gil_release_scope release_gil;
+
+			while (static_cast<int>(rows.size()) < _max_rows) {
+				std::list<boost::any> next_row_args{&_handle};
+				err = _callback.effect_handler("msi_genquery2_next_row", irods::unpack(next_row_args));
+				if (!err.ok()) {
+					break;
+				}
+
+				auto& row = rows.emplace_back(column_indexes.size());
+				for (std::size_t c = 0; c < column_indexes.size() && err.ok(); ++c) {
+					std::list<boost::any> column_args{&_handle, &column_indexes[c], &row[c]};
+					err = _callback.effect_handler("msi_genquery2_column", irods::unpack(column_args));
+				}
+				if (!err.ok()) {
+					break;
+				}
+			}
+		}
+
+		if (!err.ok() && err.code() != END_OF_RESULTSET) {
+			throw_callback_error(err);
+		}
+
+		bp::list ret;
+		for (const auto& row : rows) {
+			bp::list row_python;
+			for (const auto& value : row) {
+				row_python.append(value);
+			}
+			ret.append(row_python);
+		}
+		return ret;
+	}
+
+	// Calls _function as the plugin's operations run rules: holding python_mutex in serialized mode, and
+	// counting towards max_concurrent_rules in concurrent mode. Used by the worker thread of the
+	// deferred_work module, so that its work never runs interleaved with rules in serialized mode.
+	bp::object call_as_rule(const bp::object& _function)
+	{
+		std::optional<python_execution_guard> guard;
+		{
+			// A rule holding python_mutex may need the GIL to finish
+			PyThreadState* ts = PyEval_SaveThread();
+			guard.emplace();
+			PyEval_RestoreThread(ts);
+		}
+		return _function();
+	}
+
 	BOOST_PYTHON_MODULE(plugin_wrappers)
 	{
 		bp::class_<RuleCallWrapper>("RuleCallWrapper", bp::no_init)
 			.def("__call__", bp::raw_function(&RuleCallWrapper::call, 1));
 
+		const bp::object argument_proxy_class = bp::class_<argument_proxy>("ArgumentProxy", bp::no_init)
+			.def("__getattr__", &argument_proxy::getattr)
+			.def("__setattr__", &argument_proxy::setattr)
+			.def("__getitem__", &argument_proxy::getitem)
+			.def("__setitem__", &argument_proxy::setitem)
+			.def("__len__", &argument_proxy::len)
+			.def("__contains__", &argument_proxy::contains)
+			.def("__bool__", &argument_proxy::to_bool)
+			.def("__iter__", &argument_proxy::iter)
+			.def("__next__", &argument_proxy::next)
+			.def("__call__", bp::raw_function(&argument_proxy::call, 1))
+			.def("__eq__", &argument_proxy::eq)
+			.def("__ne__", &argument_proxy::ne)
+			.def("__hash__", &argument_proxy::hash)
+			.def("__str__", &argument_proxy::str)
+			.def("__repr__", &argument_proxy::repr)
+			.def("__dir__", &argument_proxy::dir);
+		// Set in the dict of the class, since setting it as an attribute would change the class of the class
+		auto* argument_proxy_type = reinterpret_cast<PyTypeObject*>(argument_proxy_class.ptr());
+		const bp::object class_property =
+			bp::import("builtins").attr("property")(bp::make_function(&argument_proxy::class_of));
+		if (PyDict_SetItemString(argument_proxy_type->tp_dict, "__class__", class_property.ptr()) < 0) {
+			bp::throw_error_already_set();
+		}
+		PyType_Modified(argument_proxy_type);
+
 		bp::class_<CallbackWrapper>("CallbackWrapper", bp::no_init)
 			.def("__getattribute__", &CallbackWrapper::getAttribute);
+
+		bp::def("call_batch",
+		        &call_batch,
+		        (bp::arg("callback"), bp::arg("calls"), bp::arg("stop_on_error") = false));
+
+		bp::def("call_as_rule", &call_as_rule, (bp::arg("function")));
+
+		bp::def("genquery2_fetch_rows",
+		        &genquery2_fetch_rows,
+		        (bp::arg("callback"), bp::arg("handle"), bp::arg("column_count"), bp::arg("max_rows")));
 	}
 } // anonymous namespace
 
@@ -397,6 +2286,8 @@ static irods::error start(irods::default_re_ctx&, const std::string& _instance_n
 		// hence the weird nesting here
 		try {
 			PyImport_AppendInittab("plugin_wrappers", &PyInit_plugin_wrappers);
+			PyImport_AppendInittab("plugin_statistics", &PyInit_plugin_statistics);
+			PyImport_AppendInittab("irods_log", &PyInit_irods_log);
 			PyImport_AppendInittab("irods_types", &PyInit_irods_types);
 			PyImport_AppendInittab("irods_errors", &PyInit_irods_errors);
 			Py_InitializeEx(0);
@@ -458,10 +2349,22 @@ static irods::error start(irods::default_re_ctx&, const std::string& _instance_n
 
 				// TODO Enable non core.py Python rulebases
 
+				configure_execution_mode(plugin_spec_cfg, _instance_name);
+				configure_code_caches(plugin_spec_cfg, _instance_name);
+				configure_instrumentation(plugin_spec_cfg, _instance_name);
+				configure_profiling(plugin_spec_cfg, _instance_name);
+				configure_warm_up(plugin_spec_cfg, _instance_name);
+				configure_time_budgets(plugin_spec_cfg, _instance_name);
+
+				load_rulebase(_instance_name);
+				warm_up_interpreter(_instance_name);
+				const bool derive_pep_regexes =
+					plugin_spec_cfg.count(DERIVE_PEP_REGEXES_KW) && plugin_spec_cfg.at(DERIVE_PEP_REGEXES_KW).get<bool>();
+
 				if (plugin_spec_cfg.count(irods::KW_CFG_RE_PEP_REGEX_SET)) {
 					register_regexes_from_array(plugin_spec_cfg.at(irods::KW_CFG_RE_PEP_REGEX_SET), _instance_name);
 				}
-				else {
+				else if (!derive_pep_regexes || !register_regexes_from_rule_names(_instance_name)) {
 					RuleExistsHelper::Instance()->registerRuleRegex(STATIC_PEP_RULE_REGEX);
 					RuleExistsHelper::Instance()->registerRuleRegex(DYNAMIC_PEP_RULE_REGEX);
 
@@ -489,6 +2392,9 @@ static irods::error start(irods::default_re_ctx&, const std::string& _instance_n
 	catch (const std::out_of_range& e) {
 		return ERROR(KEY_NOT_FOUND, e.what());
 	}
+	catch (const nlohmann::json::exception& e) {
+		return ERROR(SYS_INVALID_INPUT_PARAM, e.what());
+	}
 
 	// clang-format off
 	log_re::error({
@@ -504,7 +2410,14 @@ static irods::error start(irods::default_re_ctx&, const std::string& _instance_n
 
 static irods::error stop(irods::default_re_ctx&, const std::string&)
 {
+	watchdog().stop();
+	persistent_thread_state::delete_all();
 	PyEval_RestoreThread(python_state::ts_main);
+	drain_deferred_work();
+	rulebase().clear();
+	delay_rule_code_cache().clear();
+	irule_code_cache().clear();
+	profiler().clear();
 	// Boost.Python's documentation advises not to call Py_Finalize
 	// https://www.boost.org/doc/libs/1_78_0/libs/python/doc/html/tutorial/tutorial/embedding.html
 	//Py_Finalize();
@@ -513,12 +2426,16 @@ static irods::error stop(irods::default_re_ctx&, const std::string&)
 
 static irods::error rule_exists(const irods::default_re_ctx&, const std::string& rule_name, bool& _return)
 {
+	if (const auto* names = rule_name_index::current()) {
+		_return = names->contains(rule_name);
+		return SUCCESS();
+	}
+
 	_return = false;
-	std::lock_guard<std::recursive_mutex> lock{python_mutex};
+	python_execution_guard guard;
 	python_thread_state_scope tstate;
 	try {
-		// TODO Enable non core.py Python rulebases
-		bp::object core_module = bp::import("core");
+		bp::object core_module = rulebase().module();
 		_return = PyObject_HasAttrString(core_module.ptr(), rule_name.c_str());
 	}
 	catch (const bp::error_already_set&) {
@@ -535,7 +2452,7 @@ static irods::error rule_exists(const irods::default_re_ctx&, const std::string&
 		return ERROR(RULE_ENGINE_ERROR, err_msg);
 	}
 	// NOTE: If adding more catch blocks, nest this try/catch in another try block
-	// along with the lock and tstate definitions. They need to stay in-scope for extract_python_exception,
+	// along with the guard and tstate definitions. They need to stay in-scope for extract_python_exception,
 	// but should be out of scope for other exception handlers.
 
 	return SUCCESS();
@@ -544,13 +2461,12 @@ static irods::error rule_exists(const irods::default_re_ctx&, const std::string&
 static irods::error list_rules(const irods::default_re_ctx&, std::vector<std::string>& rule_vec)
 {
 	try {
-		std::lock_guard<std::recursive_mutex> lock{python_mutex};
+		python_execution_guard guard;
 		python_thread_state_scope tstate;
-		// tstate (and therefore also lock) needs to stay in scope for extract_python_exception
+		// tstate (and therefore also guard) needs to stay in scope for extract_python_exception
 		// hence the nested exception handling
 		try {
-			bp::object core_module = bp::import("core");
-			bp::object core_namespace = core_module.attr("__dict__");
+			bp::object core_namespace = rulebase().namespace_dict();
 
 			bp::exec("import inspect\n"
 			         "import sys\n"
@@ -568,7 +2484,8 @@ static irods::error list_rules(const irods::default_re_ctx&, std::vector<std::st
 			}
 		}
 		catch (const bp::error_already_set&) {
-			const std::string formatted_python_exception = extract_python_exception();
+			int error_code_int = -1;
+			const std::string formatted_python_exception = extract_python_exception(&error_code_int);
 			// clang-format off
 			log_re::error({
 				{"rule_engine_plugin", rule_engine_name},
@@ -576,14 +2493,6 @@ static irods::error list_rules(const irods::default_re_ctx&, std::vector<std::st
 				{"python_exception", formatted_python_exception},
 			});
 			// clang-format on
-			auto start_pos = formatted_python_exception.find(IRODS_ERROR_PREFIX);
-			int error_code_int = -1;
-			if (start_pos != std::string::npos) {
-				start_pos += IRODS_ERROR_PREFIX.size();
-				auto end_pos = formatted_python_exception.find_first_of("]", start_pos);
-				std::string error_code = formatted_python_exception.substr(start_pos, end_pos - start_pos);
-				error_code_int = boost::lexical_cast<int>(error_code);
-			}
 			std::string err_msg = std::string("irods_rule_engine_plugin_python::") + __PRETTY_FUNCTION__ +
 			                      " Caught Python exception.\n" + formatted_python_exception;
 			return ERROR(error_code_int, err_msg);
@@ -605,47 +2514,66 @@ static irods::error list_rules(const irods::default_re_ctx&, std::vector<std::st
 	return SUCCESS();
 }
 
-static irods::error exec_rule(const irods::default_re_ctx&,
-                              const std::string& rule_name,
-                              std::list<boost::any>& rule_arguments_cpp,
-                              irods::callback effect_handler)
+// Runs the Python rule rule_name for exec_rule. If _lock_wait_time is not null, the time spent waiting
+// for python_mutex (or an execution slot) and the GIL is stored there.
+static irods::error exec_python_rule(const std::string& rule_name,
+                                     std::list<boost::any>& rule_arguments_cpp,
+                                     irods::callback effect_handler,
+                                     std::chrono::nanoseconds* _lock_wait_time)
 {
 	try {
-		std::lock_guard<std::recursive_mutex> lock{python_mutex};
+		std::chrono::steady_clock::time_point wait_start;
+		if (_lock_wait_time) {
+			wait_start = std::chrono::steady_clock::now();
+		}
+		python_execution_guard guard;
 		python_thread_state_scope tstate;
-		// tstate (and therefore also lock) needs to stay in scope for extract_python_exception
+		if (_lock_wait_time) {
+			*_lock_wait_time = std::chrono::steady_clock::now() - wait_start;
+		}
+		rule_time_budget time_budget{rule_name};
+		// tstate (and therefore also guard) needs to stay in scope for extract_python_exception
 		// hence the nested exception handling
 		try {
-			// TODO Enable non core.py Python rulebases
-			bp::object core_module = bp::import("core");
-			bp::object core_namespace = core_module.attr("__dict__");
-			bp::object irods_types = bp::import("irods_types");
-			bp::object irods_errors = bp::import("irods_errors");
-
-			core_namespace["irods_types"] = irods_types;
-			core_namespace["irods_errors"] = irods_errors;
-
-			bp::object rule_function = core_module.attr(rule_name.c_str());
+			bp::object rule_function = rulebase().function(rule_name);
 
 			const auto rei = get_rei_from_effect_handler(effect_handler);
-			bp::list rule_arguments_python{};
-			for (auto& cpp_argument : rule_arguments_cpp) {
-				rule_arguments_python.append(object_from_any(cpp_argument));
-			}
+			rule_arguments arguments{rule_arguments_cpp};
 
-			const bp::object ec = rule_function(rule_arguments_python, CallbackWrapper{effect_handler}, rei);
+			const bp::object ec =
+				profiler().selected(rule_name)
+					? profiler().call(rule_name, rule_function, arguments.python(), CallbackWrapper{effect_handler}, rei)
+					: rule_function(arguments.python(), CallbackWrapper{effect_handler}, rei);
 
-			int i = 0;
-			for (auto& cpp_argument : rule_arguments_cpp) {
-				bp::object py_argument = rule_arguments_python[i];
-				update_argument(cpp_argument, py_argument);
-				++i;
-			}
+			arguments.update();
+			time_budget.disarm();
 
 			return to_irods_error_object(ec);
 		}
 		catch (const bp::error_already_set&) {
-			const std::string formatted_python_exception = extract_python_exception();
+			// Disarmed first, so that a pending RuleTimeoutError is not raised while the exception is formatted
+			time_budget.disarm();
+			int error_code_int = -1;
+			const std::string formatted_python_exception = extract_python_exception(&error_code_int);
+			if (time_budget.exceeded()) {
+				// The rule may have caught the RuleTimeoutError and raised another exception
+				error_code_int = irods::re::python::rule_timeout_error_code;
+				// clang-format off
+				log_re::warn({
+					{"rule_engine_plugin", rule_engine_name},
+					{"log_message", "rule interrupted after exceeding its time budget"},
+					{"rule_name", rule_name},
+					{"error_code", std::to_string(error_code_int)},
+					{"time_budget_in_seconds", std::to_string(time_budget.budget_in_seconds())},
+					{"elapsed_in_seconds", std::to_string(time_budget.elapsed_in_seconds())},
+				});
+				// clang-format on
+			}
+			else if (time_budget.outer_exceeded()) {
+				// The RuleTimeoutError meant for the calling rule was raised in this one. Raise it again,
+				// so that the calling rule is interrupted once this one returns to it.
+				PyThreadState_SetAsyncExc(PyThread_get_thread_ident(), irods::re::python::rule_timeout_error_type());
+			}
 			// clang-format off
 			log_re::error({
 				{"rule_engine_plugin", rule_engine_name},
@@ -653,14 +2581,6 @@ static irods::error exec_rule(const irods::default_re_ctx&,
 				{"python_exception", formatted_python_exception},
 			});
 			// clang-format on
-			auto start_pos = formatted_python_exception.find(IRODS_ERROR_PREFIX);
-			int error_code_int = -1;
-			if (start_pos != std::string::npos) {
-				start_pos += IRODS_ERROR_PREFIX.size();
-				auto end_pos = formatted_python_exception.find_first_of("]", start_pos);
-				std::string error_code = formatted_python_exception.substr(start_pos, end_pos - start_pos);
-				error_code_int = boost::lexical_cast<int>(error_code);
-			}
 			std::string err_msg = std::string("irods_rule_engine_plugin_python::") + __PRETTY_FUNCTION__ +
 			                      " Caught Python exception.\n" + formatted_python_exception;
 			return ERROR(error_code_int, err_msg);
@@ -691,6 +2611,23 @@ static irods::error exec_rule(const irods::default_re_ctx&,
 	return SUCCESS();
 }
 
+static irods::error exec_rule(const irods::default_re_ctx&,
+                              const std::string& rule_name,
+                              std::list<boost::any>& rule_arguments_cpp,
+                              irods::callback effect_handler)
+{
+	if (!plugin_config::instrumentation) {
+		return exec_python_rule(rule_name, rule_arguments_cpp, effect_handler, nullptr);
+	}
+
+	std::chrono::nanoseconds lock_wait_time{};
+	const auto start = std::chrono::steady_clock::now();
+	irods::error result = exec_python_rule(rule_name, rule_arguments_cpp, effect_handler, &lock_wait_time);
+	rule_statistics().record(rule_name, std::chrono::steady_clock::now() - start, lock_wait_time, !result.ok());
+	log_statistics_if_due();
+	return result;
+}
+
 //irule
 static irods::error exec_rule_text(const irods::default_re_ctx&,
                                    const std::string& rule_text,
@@ -737,10 +2674,14 @@ static irods::error exec_rule_text(const irods::default_re_ctx&,
 		return ERROR(SYS_NO_API_PRIV, "Insufficient privileges to run irule in Python rule engine plugin");
 	}
 
+	// Rule files run in namespaces of their own, but rules from core.py see irods_rule_vars and global_vars
+	// through builtins and the rulebase, which are shared
+	const bool runs_rulebase_rule = strncmp(rule_text.c_str(), "@external rule", 14) == 0;
+
 	try {
-		std::lock_guard<std::recursive_mutex> lock{python_mutex};
+		python_execution_guard guard{runs_rulebase_rule};
 		python_thread_state_scope tstate;
-		// tstate (and therefore also lock) needs to stay in scope for extract_python_exception
+		// tstate (and therefore also guard) needs to stay in scope for extract_python_exception
 		// hence the nested exception handling
 		try {
 			execCmdOut_t* myExecCmdOut = (execCmdOut_t*) malloc(sizeof(*myExecCmdOut));
@@ -782,34 +2723,23 @@ static irods::error exec_rule_text(const irods::default_re_ctx&,
 				// If rule_text begins with "@external\n", call is of form
 				//  irule -F inputFile ...
 
-				// Import rule INPUT and OUTPUT variables
-				bp::object builtin_module = bp::import("builtins");
-				builtin_module.attr("irods_rule_vars") = rule_vars_python;
-
-				bp::object main_module = bp::import("__main__");
-				bp::object main_namespace = main_module.attr("__dict__");
-				bp::object irods_types = bp::import("irods_types");
-				bp::object irods_errors = bp::import("irods_errors");
-
-				// deprecated alias for irods_rule_vars
-				main_namespace["global_vars"] = rule_vars_python;
-
-				// Import global constants
-				main_namespace["irods_types"] = irods_types;
-				main_namespace["irods_errors"] = irods_errors;
-
 				// Parse input rule_text into useable Python fcns
 				// Delete first line ("@external")
 				std::string trimmed_rule = rule_text.substr(rule_text.find_first_of('\n') + 1);
 
-				bp::exec(trimmed_rule.c_str(), main_namespace, main_namespace);
-				bp::object rule_function = main_module.attr("main");
+				// The same rule files tend to be submitted over and over, so the compiled code is
+				// cached. Each submission runs in a namespace of its own rather than in __main__.
+				bp::object code = irule_code_cache().get(trimmed_rule, [&trimmed_rule] { return trimmed_rule; });
+
+				bp::dict rule_namespace = make_rule_namespace(rule_vars_python);
+				bp::handle<> defined{PyEval_EvalCode(code.ptr(), rule_namespace.ptr(), rule_namespace.ptr())};
+				bp::object rule_function = rule_namespace["main"];
 
 				bp::list rule_arguments_python{};
 				return to_irods_error_object(
 					rule_function(rule_arguments_python, CallbackWrapper{effect_handler}, rei));
 			}
-			else if (strncmp(rule_text.c_str(), "@external rule", 14) == 0) {
+			else if (runs_rulebase_rule) {
 				// If rule_text begins with "@external ", call is of form
 				//  irule rule ...
 
@@ -817,9 +2747,7 @@ static irods::error exec_rule_text(const irods::default_re_ctx&,
 				bp::object builtin_module = bp::import("builtins");
 				builtin_module.attr("irods_rule_vars") = rule_vars_python;
 
-				// TODO Enable non core.py Python rulebases
-				bp::object core_module = bp::import("core");
-				bp::object core_namespace = core_module.attr("__dict__");
+				bp::object core_namespace = rulebase().namespace_dict();
 
 				// deprecated alias for irods_rule_vars
 				core_namespace["global_vars"] = rule_vars_python;
@@ -830,7 +2758,7 @@ static irods::error exec_rule_text(const irods::default_re_ctx&,
 				// Extract rule name ("@external rule { RULE_NAME }")
 				std::string rule_name = trimmed_rule.substr(0, trimmed_rule.find_first_of(' '));
 
-				bp::object rule_function = core_module.attr(rule_name.c_str());
+				bp::object rule_function = rulebase().function(rule_name);
 
 				bp::list rule_arguments_python{};
 				return to_irods_error_object(
@@ -892,9 +2820,9 @@ static irods::error exec_rule_expression(irods::default_re_ctx&,
                                          irods::callback effect_handler)
 {
 	try {
-		std::lock_guard<std::recursive_mutex> lock{python_mutex};
+		python_execution_guard guard;
 		python_thread_state_scope tstate;
-		// tstate (and therefore also lock) needs to stay in scope for extract_python_exception
+		// tstate (and therefore also guard) needs to stay in scope for extract_python_exception
 		// hence the nested exception handling
 		try {
 			bp::dict rule_vars_python;
@@ -929,30 +2857,21 @@ static irods::error exec_rule_expression(irods::default_re_ctx&,
 				}
 			}
 
-			// Import rule INPUT and OUTPUT variables
-			bp::object builtin_module = bp::import("builtins");
-			builtin_module.attr("irods_rule_vars") = rule_vars_python;
-
 			// Parse input rule_text into useable Python fcns
-			bp::object main_module = bp::import("__main__");
-			bp::object irods_types = bp::import("irods_types");
-			bp::object irods_errors = bp::import("irods_errors");
-			bp::object main_namespace = main_module.attr("__dict__");
-
-			// deprecated alias for irods_rule_vars
-			main_namespace["global_vars"] = rule_vars_python;
-
-			// Import globals
-			main_namespace["irods_types"] = irods_types;
-			main_namespace["irods_errors"] = irods_errors;
-
-			// Add def expressionFcn(rule_args, callback):\n to start of rule text
+			// The delay server runs many rules generated from the same text, so the compiled
+			// code is cached. Each rule defines its function in a namespace of its own.
 			std::string rule_name = "expressionFcn";
-			std::string fcn_text = "def " + rule_name + "(rule_args, callback, rei):\n" + rule_text;
-			// Replace every '\n' with '\n '
-			boost::replace_all(fcn_text, "\n", "\n ");
-			bp::exec(fcn_text.c_str(), main_namespace, main_namespace);
-			bp::object rule_function = main_module.attr(rule_name.c_str());
+			bp::object code = delay_rule_code_cache().get(rule_text, [&rule_name, &rule_text] {
+				// Add def expressionFcn(rule_args, callback):\n to start of rule text
+				std::string fcn_text = "def " + rule_name + "(rule_args, callback, rei):\n" + rule_text;
+				// Replace every '\n' with '\n '
+				boost::replace_all(fcn_text, "\n", "\n ");
+				return fcn_text;
+			});
+
+			bp::dict rule_namespace = make_rule_namespace(rule_vars_python);
+			bp::handle<> defined{PyEval_EvalCode(code.ptr(), rule_namespace.ptr(), rule_namespace.ptr())};
+			bp::object rule_function = rule_namespace[rule_name];
 
 			const auto rei = get_rei_from_effect_handler(effect_handler);
 			bp::list rule_arguments_python{};
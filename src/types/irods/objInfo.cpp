@@ -22,10 +22,33 @@
 #pragma GCC diagnostic pop
 #include <boost/format.hpp>
 
+#include <cstdlib>
+#include <cstring>
+#include <new>
+#include <string>
+
 namespace bp = boost::python;
 
 namespace irods::re::python::types
 {
+	namespace
+	{
+		// Replaces value _index of an InxValPair (e.g. the condition of a GenQueryInp) with a copy of _value
+		void set_value(inxValPair_t* _pair, int _index, const std::string& _value)
+		{
+			if (_index < 0 || _index >= _pair->len) {
+				PyErr_SetString(PyExc_IndexError, "InxValPair index out of range");
+				bp::throw_error_already_set();
+			}
+			char* copy = strdup(_value.c_str());
+			if (!copy) {
+				throw std::bad_alloc{};
+			}
+			std::free(_pair->value[_index]);
+			_pair->value[_index] = copy;
+		}
+	} //namespace
+
 	__attribute__((visibility("hidden"))) void export_specCollClass()
 	{
 		// clang-format off
@@ -262,6 +285,7 @@ namespace irods::re::python::types
 			.add_property("len", &inxValPair_t::len)
 			.add_property("inx", +[](inxValPair_t *s) { return array_ref<int>{s->inx, static_cast<std::size_t>(s->len)}; })
 			.add_property("value", +[](inxValPair_t *s) { return array_ref<array_ref<char, true>>{s->value, static_cast<std::size_t>(s->len)}; })
+			.def("set_value", &set_value)
 			;
 		// clang-format on
 	}
@@ -23,28 +23,190 @@
 #include <boost/python/list.hpp>
 #pragma GCC diagnostic pop
 
+#include <algorithm>
+#include <cstring>
+#include <limits>
+#include <unordered_map>
+
 namespace bp = boost::python;
 
 namespace irods::re::python::types
 {
 	namespace
 	{
+		// The Python objects whose memory is currently borrowed by a BorrowedBytesBuf, by address of the memory.
+		// BytesBufs whose buffer is one of these never free or reallocate it.
+		std::unordered_multimap<const void*, PyObject*>& borrowed_buffers()
+		{
+			static auto* buffers = new std::unordered_multimap<const void*, PyObject*>;
+			return *buffers;
+		}
+
+		bool is_borrowed(const void* _buf)
+		{
+			return _buf && borrowed_buffers().count(_buf) != 0;
+		}
+
+		// The len of a bytesBuf_t is an int. Raises OverflowError for a longer buffer, rather than truncating
+		// its length, releasing _view first if given.
+		int checked_length(Py_ssize_t _len, Py_buffer* _view = nullptr)
+		{
+			if (_len > std::numeric_limits<int>::max()) {
+				if (_view) {
+					PyBuffer_Release(_view);
+				}
+				PyErr_SetString(PyExc_OverflowError, "BytesBuf length cannot exceed INT_MAX bytes");
+				bp::throw_error_already_set();
+			}
+			return static_cast<int>(_len);
+		}
+
+		// A BytesBuf whose buffer is borrowed from a Python object supporting the buffer protocol (e.g. bytes),
+		// instead of being allocated. The borrowed object is kept alive, and cannot be resized, until the
+		// BorrowedBytesBuf is destroyed or cleared.
+		struct borrowed_bytes_buf : bytesBuf_t
+		{
+			explicit borrowed_bytes_buf(const bp::object& _exporter)
+				: bytesBuf_t{}
+			{
+				if (PyObject_GetBuffer(_exporter.ptr(), &view, PyBUF_SIMPLE) < 0) {
+					bp::throw_error_already_set();
+				}
+				len = checked_length(view.len, &view);
+				buf = view.buf;
+				if (buf) {
+					borrowed_buffers().emplace(buf, view.obj);
+				}
+			}
+
+			borrowed_bytes_buf(const borrowed_bytes_buf&) = delete;
+			borrowed_bytes_buf& operator=(const borrowed_bytes_buf&) = delete;
+
+			~borrowed_bytes_buf()
+			{
+				release();
+			}
+
+			void release()
+			{
+				if (view.obj) {
+					auto [first, last] = borrowed_buffers().equal_range(view.buf);
+					if (auto b = std::find_if(first, last, [this](auto& _b) { return _b.second == view.obj; }); b != last) {
+						borrowed_buffers().erase(b);
+					}
+					PyBuffer_Release(&view);
+				}
+				len = 0;
+				buf = nullptr;
+			}
+
+			Py_buffer view{};
+		}; // struct borrowed_bytes_buf
+
+		// The number of buffer exports (e.g. memoryviews) of each BytesBuf that currently has any. While a
+		// BytesBuf is exported, its buffer cannot be reallocated or freed.
+		std::unordered_map<const bytesBuf_t*, int>& bytes_buf_exports()
+		{
+			static auto* exports = new std::unordered_map<const bytesBuf_t*, int>;
+			return *exports;
+		}
+
+		void throw_if_exported(const bytesBuf_t* self)
+		{
+			if (bytes_buf_exports().count(self) != 0) {
+				PyErr_SetString(PyExc_BufferError, "Existing exports of data: BytesBuf cannot be re-sized");
+				bp::throw_error_already_set();
+			}
+		}
+
+		int get_buffer(PyObject* obj, Py_buffer* view, int flags)
+		{
+			auto* self = static_cast<bytesBuf_t*>(
+				bp::converter::get_lvalue_from_python(obj, bp::converter::registered<bytesBuf_t>::converters));
+			if (!self) {
+				PyErr_SetString(PyExc_BufferError, "BytesBuf buffer is not available");
+				view->obj = nullptr;
+				return -1;
+			}
+
+			auto* borrowed = static_cast<borrowed_bytes_buf*>(
+				bp::converter::get_lvalue_from_python(obj, bp::converter::registered<borrowed_bytes_buf>::converters));
+			const int readonly = borrowed && borrowed->view.obj ? borrowed->view.readonly : 0;
+
+			if (PyBuffer_FillInfo(view, obj, self->buf, self->buf ? self->len : 0, readonly, flags) < 0) {
+				return -1;
+			}
+			++bytes_buf_exports()[self];
+			return 0;
+		}
+
+		void release_buffer(PyObject* obj, Py_buffer*)
+		{
+			auto* self = static_cast<bytesBuf_t*>(
+				bp::converter::get_lvalue_from_python(obj, bp::converter::registered<bytesBuf_t>::converters));
+			auto& exports = bytes_buf_exports();
+			if (const auto count = exports.find(self); count != exports.end() && --count->second == 0) {
+				exports.erase(count);
+			}
+		}
+
+		PyBufferProcs bytes_buf_buffer_procs{&get_buffer, &release_buffer};
+
+		// Resizes the buffer of self to _len bytes. A borrowed buffer is replaced rather than reallocated.
+		static inline void resize_buffer(bytesBuf_t* self, int _len)
+		{
+			void* buf = realloc(is_borrowed(self->buf) ? nullptr : self->buf, _len);
+			if (!buf && _len > 0) {
+				PyErr_NoMemory();
+				bp::throw_error_already_set();
+			}
+			self->buf = buf;
+			self->len = _len;
+		}
+
 		static inline void set_buffer_2argument_form_(bytesBuf_t* self, PyObject* c, int L)
 		{
+			throw_if_exported(self);
+
+			// Anything supporting the buffer protocol (bytes, bytearray, memoryview, ...) is copied in one go
+			if (PyObject_CheckBuffer(c)) {
+				Py_buffer view;
+				if (PyObject_GetBuffer(c, &view, PyBUF_SIMPLE) < 0) {
+					bp::throw_error_already_set();
+				}
+				if (L < 0) {
+					L = checked_length(view.len, &view);
+				}
+				if (L > view.len) {
+					PyBuffer_Release(&view);
+					PyErr_SetString(PyExc_IndexError, "BytesBuf length exceeds the length of the source buffer");
+					bp::throw_error_already_set();
+				}
+				try {
+					resize_buffer(self, L);
+				}
+				catch (const bp::error_already_set&) {
+					PyBuffer_Release(&view);
+					throw;
+				}
+				if (L > 0) {
+					std::memcpy(self->buf, view.buf, L);
+				}
+				PyBuffer_Release(&view);
+				return;
+			}
+
 			// The PyObject*c will be "borrowed" in the context of this function, meaning
 			// we increment its reference count until the handle goes out of scope.
 			bp::handle<> handle{bp::borrowed(c)};
 			bp::object obj{handle};
 			if (L < 0) {
-				L = bp::len(obj);
+				L = checked_length(bp::len(obj));
 			}
-			self->buf = realloc(self->buf, L);
-			if (self->buf) {
-				self->len = L;
-				auto* buf_dest = reinterpret_cast<unsigned char*>(self->buf);
-				for (int i = 0; i < L; i++) {
-					*buf_dest++ = bp::extract<unsigned char>{obj[i]};
-				}
+			resize_buffer(self, L);
+			auto* buf_dest = reinterpret_cast<unsigned char*>(self->buf);
+			for (int i = 0; i < L; i++) {
+				*buf_dest++ = bp::extract<unsigned char>{obj[i]};
 			}
 		}
 
@@ -52,8 +214,58 @@ namespace irods::re::python::types
 		{
 			set_buffer_2argument_form_(self, c, -1);
 		}
+
+		static inline int clear_buffer(bytesBuf_t* self)
+		{
+			throw_if_exported(self);
+			if (is_borrowed(self->buf)) {
+				// Only detach memory owned by a Python object
+				self->buf = nullptr;
+				self->len = 0;
+				return 0;
+			}
+			return clearBBuf(self);
+		}
+
+		static inline void clear_borrowed_buffer(borrowed_bytes_buf* self)
+		{
+			throw_if_exported(self);
+			self->release();
+		}
+
+		static inline void set_borrowed_buffer_2argument_form_(borrowed_bytes_buf*, PyObject*, int)
+		{
+			PyErr_SetString(PyExc_TypeError, "The buffer of a BorrowedBytesBuf cannot be set");
+			bp::throw_error_already_set();
+		}
+
+		static inline void set_borrowed_buffer(borrowed_bytes_buf* self, PyObject* c)
+		{
+			set_borrowed_buffer_2argument_form_(self, c, -1);
+		}
 	} //namespace
 
+	bool is_borrowed_buffer(const void* _buf)
+	{
+		return is_borrowed(_buf);
+	}
+
+	bp::object bytes_buf_to_python(const bytesBuf_t& _buf)
+	{
+		const auto borrowed = borrowed_buffers().find(_buf.buf);
+		if (!_buf.buf || borrowed == borrowed_buffers().end()) {
+			return bp::object{_buf};
+		}
+
+		// Share the memory again, holding the object which owns it, rather than pointing at it unowned
+		auto* borrowed_type = bp::converter::registered<borrowed_bytes_buf>::converters.get_class_object();
+		bp::object result = bp::object{bp::handle<>{bp::borrowed(borrowed_type)}}(
+			bp::object{bp::handle<>{bp::borrowed(borrowed->second)}});
+		auto& result_buf = bp::extract<borrowed_bytes_buf&>{result}();
+		result_buf.len = std::clamp(_buf.len, 0, result_buf.len);
+		return result;
+	}
+
 	__attribute__((visibility("hidden"))) void export_irodsProt()
 	{
 		// clang-format off
@@ -67,7 +279,7 @@ namespace irods::re::python::types
 	__attribute__((visibility("hidden"))) void export_BytesBuf()
 	{
 		// clang-format off
-		bp::class_<bytesBuf_t>("BytesBuf", bp::no_init)
+		bp::object bytes_buf = bp::class_<bytesBuf_t>("BytesBuf", bp::no_init)
 			.def("__init__", make_init_function<bytesBuf_t>(
 					&bytesBuf_t::len,
 					&bytesBuf_t::buf))
@@ -79,23 +291,34 @@ namespace irods::re::python::types
 					return static_cast<char*>(s->buf)[n];
 				})
 			.def("get_bytes", +[]( bytesBuf_t* s) {
-					bp::object None;
-					bp::list a{};
-					a.append(None);   // construct a list of length 1 and expand it...
-					a *= s->len;      // ... to the desired length.
+					const auto len = s->buf ? s->len : 0;
+					bp::object a{bp::handle<>{PyList_New(len)}};
 					auto buf_src = static_cast<unsigned char*>(s->buf);
-					for (int j=0; j<s->len; j++) {
-						a[j]=*buf_src++;
+					for (int j=0; j<len; j++) {
+						PyList_SET_ITEM(a.ptr(), j, PyLong_FromLong(*buf_src++));
 					}
 					return a;
 				})
-			.def("clear_buffer", clearBBuf)
+			.def("clear_buffer", clear_buffer)
 			.def("set_buffer",set_buffer)
 			.def("set_buffer",set_buffer_2argument_form_)
 			.add_property("len", &bytesBuf_t::len)
 			.add_property("buf", +[](bytesBuf_t *s) { return s->buf ? bp::object{array_ref<char>{static_cast<char*>(s->buf), static_cast<std::size_t>(s->len)}} : bp::object{}; })
 			;
 		// clang-format on
+
+		// Expose the buffer directly, e.g. to memoryview(), bytes() and file.write(), without copying it to a list
+		reinterpret_cast<PyTypeObject*>(bytes_buf.ptr())->tp_as_buffer = &bytes_buf_buffer_procs;
+		PyType_Modified(reinterpret_cast<PyTypeObject*>(bytes_buf.ptr()));
+
+		// Subclasses copy tp_as_buffer from BytesBuf when created, so this must follow the assignment above
+		// clang-format off
+		bp::class_<borrowed_bytes_buf, bp::bases<bytesBuf_t>, boost::noncopyable>("BorrowedBytesBuf", bp::init<bp::object>())
+			.def("clear_buffer", clear_borrowed_buffer)
+			.def("set_buffer", set_borrowed_buffer)
+			.def("set_buffer", set_borrowed_buffer_2argument_form_)
+			;
+		// clang-format on
 	}
 
 	__attribute__((visibility("hidden"))) void export_MsgHeader()
@@ -19,8 +19,12 @@
 #  pragma GCC diagnostic ignored "-Wdeprecated-declarations"
 #endif
 #include <boost/python/class.hpp>
+#include <boost/python/list.hpp>
 #pragma GCC diagnostic pop
 
+#include <algorithm>
+#include <cstring>
+
 namespace bp = boost::python;
 
 bool operator==([[maybe_unused]] const sqlResult_t& s1, [[maybe_unused]] const sqlResult_t& s2)
@@ -30,6 +34,78 @@ bool operator==([[maybe_unused]] const sqlResult_t& s1, [[maybe_unused]] const s
 
 namespace irods::re::python::types
 {
+	namespace
+	{
+		// Returns a new Python string holding the value of row _row of _result
+		static inline PyObject* cell_value(const sqlResult_t& _result, std::size_t _row)
+		{
+			const char* value = &_result.value[_row * _result.len];
+			return bp::expect_non_null(PyUnicode_FromStringAndSize(value, strnlen(value, _result.len)));
+		}
+
+		// Returns a new list holding the first _row_count values of _result.
+		// Lists are built directly through the C API, as a page can hold thousands of cells.
+		static inline bp::handle<> column_values(const sqlResult_t& _result, std::size_t _row_count)
+		{
+			bp::handle<> values{PyList_New(_row_count)};
+			for (std::size_t r = 0; r < _row_count; ++r) {
+				PyList_SET_ITEM(values.get(), r, cell_value(_result, r));
+			}
+			return values;
+		}
+
+		static inline std::size_t column_count(const genQueryOut_t& _out)
+		{
+			return std::clamp(_out.attriCnt, 0, MAX_SQL_ATTR);
+		}
+
+		static inline std::size_t row_count(const genQueryOut_t& _out)
+		{
+			return std::max(_out.rowCnt, 0);
+		}
+
+		// Returns all values of the page as a list of columns, each a list of strings
+		static inline bp::object columns(genQueryOut_t* self)
+		{
+			const auto n_columns = column_count(*self);
+			const auto n_rows = row_count(*self);
+
+			bp::handle<> columns{PyList_New(n_columns)};
+			for (std::size_t c = 0; c < n_columns; ++c) {
+				PyList_SET_ITEM(columns.get(), c, column_values(self->sqlResult[c], n_rows).release());
+			}
+			return bp::object{columns};
+		}
+
+		// Returns the values of column _index of the page as a list of strings.
+		// The number of rows is taken from the page, as a sqlResult_t does not hold it.
+		static inline bp::object column(genQueryOut_t* self, int _index)
+		{
+			if (_index < 0 || static_cast<std::size_t>(_index) >= column_count(*self)) {
+				PyErr_SetString(PyExc_IndexError, "column index out of range");
+				bp::throw_error_already_set();
+			}
+			return bp::object{column_values(self->sqlResult[_index], row_count(*self))};
+		}
+
+		// Returns all values of the page as a list of rows, each a list of strings
+		static inline bp::object rows(genQueryOut_t* self)
+		{
+			const auto n_columns = column_count(*self);
+			const auto n_rows = row_count(*self);
+
+			bp::handle<> rows{PyList_New(n_rows)};
+			for (std::size_t r = 0; r < n_rows; ++r) {
+				bp::handle<> row{PyList_New(n_columns)};
+				for (std::size_t c = 0; c < n_columns; ++c) {
+					PyList_SET_ITEM(row.get(), c, cell_value(self->sqlResult[c], r));
+				}
+				PyList_SET_ITEM(rows.get(), r, row.release());
+			}
+			return bp::object{rows};
+		}
+	} //namespace
+
 	__attribute__((visibility("hidden"))) void export_GenQueryInp()
 	{
 		// clang-format off
@@ -96,6 +172,9 @@ namespace irods::re::python::types
 			.add_property("continueInx", &genQueryOut_t::continueInx)
 			.add_property("totalRowCount", &genQueryOut_t::totalRowCount)
 			.add_property("sqlResult", +[](genQueryOut_t *s) { return array_ref<sqlResult_t>{s->sqlResult}; })
+			.def("rows", &rows)
+			.def("column", &column)
+			.def("columns", &columns)
 			;
 		// clang-format on
 	}